@@ -33,11 +33,11 @@ def register_blueprints(app: Flask) -> None:
         app.register_blueprint(bp)
 
 
-def create_app(config_name: str | None = None) -> Flask:
+def create_app(config_name: str | None = None, overrides: dict | None = None) -> Flask:
     """Create and configure the Flask application.
 
     Order:
-    1. Load config
+    1. Load config (then `overrides`, e.g. the parent app's config in background worker processes)
     2. Init extensions
     3. Register blueprints
     """
@@ -53,6 +53,8 @@ def create_app(config_name: str | None = None) -> Flask:
 
     app = Flask(__name__)
     app.config.from_object(config_obj)
+    if overrides:
+        app.config.update(overrides)
 
     init_extensions(app)
     # Import models so that migrations can discover them
@@ -63,6 +65,16 @@ def create_app(config_name: str | None = None) -> Flask:
     # Register error handlers after extensions
     register_error_handlers(app)
     register_blueprints(app)
+    # Keep per-user vector indexes in sync with Image deletes / status changes
+    from .services.index_store import register_index_hooks
+
+    register_index_hooks()
+    # Keep the OCR full-text index in sync with OCRText upserts / deletes
+    from .services.ocr_search import register_ocr_search_hooks
+    from .services.ocr_fuzzy import register_ocr_fuzzy_hooks
+
+    register_ocr_search_hooks()
+    register_ocr_fuzzy_hooks()
 
     # Developer-friendly root & favicon handlers to avoid confusing 404 logs
     @app.route("/")
@@ -4,10 +4,36 @@ from importlib.util import find_spec
 from flask import Blueprint, jsonify, current_app
 
 from app.utils.errors import AppError
-from app.services.clip_pipeline import get_embedding_dim
+from app.services.clip_pipeline import get_batching_stats, get_embedding_dim
+from app.services.index_store import get_cache_stats
+from app.services.text_cache import get_text_cache_stats
+from app.services.ocr_prefilter import get_prefilter_stats
+from app.services.ocr_fuzzy import get_fuzzy_cache_stats
+from app.services.result_reuse import get_reuse_stats
+from app.tasks import get_task_stats
 
 core_bp = Blueprint("core", __name__, url_prefix="/api/v1")
 
+# (key, callable) reported by /health; the counters stay None until first used in this worker
+_HEALTH_STATS = [
+    # configured embedding backend (without forcing model load)
+    ("embedding_dim", get_embedding_dim),
+    # per-user index cache (first search)
+    ("index_cache", get_cache_stats),
+    # CLIP micro-batching (model loaded)
+    ("clip_batching", get_batching_stats),
+    # text-query embedding cache (first text query)
+    ("text_embedding_cache", get_text_cache_stats),
+    # OCR prefilter: images checked / skipped
+    ("ocr_prefilter", get_prefilter_stats),
+    # fuzzy OCR search: per-user trigram index cache (first fuzzy search)
+    ("ocr_fuzzy_cache", get_fuzzy_cache_stats),
+    # embedding / OCR reuse across identical files: hits, misses, hit rate (first lookup)
+    ("result_reuse", get_reuse_stats),
+    # local task queue (first enqueue)
+    ("tasks", get_task_stats),
+]
+
 
 @core_bp.get("/")
 def index():
@@ -40,11 +66,12 @@ def health():
         info["numpy_version"] = _np.__version__
     except Exception:
         info["numpy_version"] = None
-    # Report configured embedding backend (without forcing model load)
-    try:
-        info["embedding_dim"] = get_embedding_dim()
-    except Exception:
-        pass
+    # Runtime stats; one failing source only leaves its key out
+    for name, stats in _HEALTH_STATS:
+        try:
+            info[name] = stats()
+        except Exception:
+            pass
     return jsonify(info)
 
 
@@ -1,39 +1,48 @@
 from __future__ import annotations
 import os
-import uuid
 import hashlib
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app.extensions import db
-from app.models import Image, Embedding, OCRText
-from app.services.clip_pipeline import embed_image_path
-from app.services.ocr_pipeline import ocr_extract_from_image_path
-from app.services.embedding_io import l2_normalize, to_bytes
-from app.services.index_store import push_vector_id_pairs
+from app.models import Image, Embedding, OCRText, ImageTag
+from app.tasks import enqueue
+from app.tasks.jobs import process_image, task_failed
+from app.services.image_decode import DecodedImage
+from app.services.storage import ensure_blob, local_path, put_blob, release_blob
 from app.utils.responses import ok, error
 
 files_bp = Blueprint("files", __name__, url_prefix="/api/v1/files")
 
 
-def _ensure_upload_dir(path: str) -> None:
-    os.makedirs(path, exist_ok=True)
+def _result_flags(image_id: int) -> tuple[bool, bool]:
+    """(has_embedding, has_ocr_text) of an image from its stored rows."""
+    has_embedding = db.session.query(Embedding.id).filter_by(image_id=image_id).first() is not None
+    ocr = db.session.query(OCRText.text).filter_by(image_id=image_id).first()
+    return has_embedding, ocr is not None and ocr.text is not None
 
 
-def _compute_sha256(stream) -> str:
-    pos = stream.tell() if stream.seekable() else None
-    h = hashlib.sha256()
-    while True:
-        chunk = stream.read(1024 * 1024)
-        if not chunk:
-            break
-        if isinstance(chunk, str):
-            chunk = chunk.encode("utf-8")
-        h.update(chunk)
-    if pos is not None:
-        stream.seek(pos)
-    return h.hexdigest()
+def _upload_payload(img: Image, result: dict | None, duplicate: bool) -> dict:
+    if duplicate and result is None:
+        has_embedding, has_ocr_text = _result_flags(img.id)
+    else:
+        # unknown (None) until the background job has run
+        has_embedding = result.get("has_embedding", False) if result else None
+        has_ocr_text = result.get("has_ocr_text", False) if result else None
+    return {
+        "image_id": img.id,
+        "original_filename": img.original_filename,
+        "storage_uri": img.storage_uri,
+        "mime_type": img.mime_type,
+        "checksum": img.checksum,
+        "status": img.status,
+        "visibility": img.visibility,
+        "duplicate": duplicate,
+        "has_embedding": has_embedding,
+        "has_ocr_text": has_ocr_text,
+    }
 
 
 @files_bp.post("/upload")
@@ -53,81 +62,125 @@ def upload_file():
     if allowed and mime not in allowed:
         return error("INVALID_MIME", f"File mime not supported: {mime}")
 
-    # Prepare paths
-    upload_dir = current_app.config.get("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
-    _ensure_upload_dir(upload_dir)
-
-    # Filename handling
     original_name = file.filename
     ext = os.path.splitext(secure_filename(original_name))[-1].lower()
-    new_name = f"{uuid.uuid4().hex}{ext}"
-    abs_path = os.path.join(upload_dir, new_name)
-
-    # Compute checksum before saving (read stream, then save)
-    checksum = _compute_sha256(file.stream)
-    file.stream.seek(0)
-    file.save(abs_path)
 
-    # Persist image record
+    # Read the upload once: checksum, blob on disk and (inline processing) the decode share the bytes
+    data = file.stream.read()
+    checksum = hashlib.sha256(data).hexdigest()
     owner_id = int(get_jwt_identity())
-    img = Image(
-        owner_id=owner_id,
-        original_filename=original_name,
-        storage_uri=f"local://{new_name}",
-        mime_type=mime,
-        checksum=checksum,
-        status="READY",
-        visibility="private",
-    )
-    db.session.add(img)
-    db.session.commit()
 
-    abs_public_path = abs_path  # currently local storage; could map from storage_uri later
-    # Online embedding
-    vec = embed_image_path(abs_public_path)
-    if vec is not None:
-        norm_vec = l2_normalize(vec)
-        payload = to_bytes(norm_vec)
-        emb = Embedding(
-            image_id=img.id,
-            vec=payload,
-            dim=len(norm_vec),
-            model_version=current_app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+    # Same file already uploaded by this owner: return that image (unique owner_id + checksum)
+    img = Image.query.filter_by(owner_id=owner_id, checksum=checksum).first()
+    duplicate = img is not None
+    if img is None:
+        # Content-addressed blob, shared with any other image of the same bytes
+        storage_uri = put_blob(data, checksum, ext)
+        # Persist image record; embedding / OCR / index update happen in process_image
+        img = Image(
+            owner_id=owner_id,
+            original_filename=original_name,
+            storage_uri=storage_uri,
+            mime_type=mime,
+            checksum=checksum,
+            status="PENDING",
+            visibility="private",
         )
-        db.session.add(emb)
-        db.session.commit()
-
-        # update vector index
-        if not push_vector_id_pairs(owner_id, [norm_vec], [img.id]):
-            current_app.logger.warning("Failed to add image (id: '%d') and its vector to existing index", img.id)
-
-    # Online OCR
-    text = ocr_extract_from_image_path(abs_public_path)
-    row = OCRText.query.filter_by(image_id=img.id).first()
-    if row is None:
-        row = OCRText(
-            image_id=img.id,
-            text=text,
-            avg_confidence=None
-        )
-        db.session.add(row)
-        db.session.commit()
-    else:
-        row.text = text or row.text
+        db.session.add(img)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent upload of the same file by this owner committed first
+            db.session.rollback()
+            img = Image.query.filter_by(owner_id=owner_id, checksum=checksum).first()
+            if img is None:
+                raise
+            duplicate = True
+    # after the commit: a concurrent delete of the blob's last other reference may have removed it
+    # (also restores a missing file of an earlier upload)
+    if local_path(img.storage_uri) is not None:
+        ensure_blob(img.storage_uri, data)
+    if duplicate:
+        if img.status != "FAILED":
+            return ok(_upload_payload(img, None, duplicate=True))
+        # re-upload of a file whose processing failed: run it again
+        img.status = "PENDING"
         db.session.commit()
 
-    # TODO: dispatch async tasks (generate thumbnails, OCR) ?
+    # Async: return right away and let a task worker move the image to READY (poll /<id>/status);
+    # processed inline if the task layer cannot take the job
+    result = None
+    queued = False
+    if current_app.config.get("UPLOAD_ASYNC", True):
+        try:
+            enqueue("process_image", img.id)
+            queued = True
+        except Exception:
+            current_app.logger.exception("Failed to queue image (id: '%d'); processing inline", img.id)
+    if not queued:
+        try:
+            result = process_image(img.id, image=DecodedImage(local_path(img.storage_uri), data=data, full=True))
+        except Exception as e:
+            # as a worker would after its last attempt: FAILED, so a re-upload of the file retries it
+            current_app.logger.exception("Inline processing of image (id: '%d') failed", img.id)
+            task_failed("process_image", [img.id], e)
+            result = {"has_embedding": False, "has_ocr_text": False}
+        db.session.refresh(img)
+    if current_app.config.get("THUMB_SIZES"):
+        try:
+            enqueue("generate_thumbs", img.id)
+        except Exception:
+            current_app.logger.warning("Failed to queue thumbnails for image (id: '%d')", img.id)
+
+    return ok(_upload_payload(img, result, duplicate=duplicate))
+
+
+@files_bp.get("/<int:image_id>/status")
+@jwt_required()
+def file_status(image_id: int):
+    """查询图片处理状态（异步上传后轮询）：PENDING → PROCESSING → READY / FAILED。"""
+    owner_id = int(get_jwt_identity())
+    img = Image.query.get(image_id)
+    if not img or img.owner_id != owner_id:
+        return error("IMAGE_NOT_FOUND", "图片不存在或不属于当前用户", http=404)
 
+    has_embedding, has_ocr_text = _result_flags(image_id)
     return ok(
         {
             "image_id": img.id,
-            "original_filename": img.original_filename,
-            "storage_uri": img.storage_uri,
-            "mime_type": img.mime_type,
-            "checksum": img.checksum,
             "status": img.status,
-            "visibility": img.visibility,
-            "has_embedding": vec is not None,
-            "has_ocr_text": text is not None,
+            "ready": img.status == "READY",
+            "has_embedding": has_embedding,
+            "has_ocr_text": has_ocr_text,
         }
     )
+
+
+@files_bp.delete("/<int:image_id>")
+@jwt_required()
+def delete_file(image_id: int):
+    """删除当前用户的一张图片：DB 记录、本地文件，并从向量索引中移除（无需重建）。
+
+    索引移除由 index_store 的 session hook 在提交后完成（墓碑 + delta log），检索不再返回该图片。
+    本地文件按内容寻址、可被多张图片共享：仅当没有其它图片引用该 blob 时才删除文件。
+    """
+    owner_id = int(get_jwt_identity())
+    img = Image.query.get(image_id)
+    if not img or img.owner_id != owner_id:
+        return error("IMAGE_NOT_FOUND", "图片不存在或不属于当前用户", http=404)
+
+    storage_uri = img.storage_uri or ""
+    # 依赖行先删（schema 未设置 ON DELETE CASCADE）
+    Embedding.query.filter_by(image_id=image_id).delete()
+    OCRText.query.filter_by(image_id=image_id).delete()
+    ImageTag.query.filter_by(image_id=image_id).delete()
+    db.session.delete(img)
+    db.session.commit()
+
+    file_removed = False
+    try:
+        file_removed = release_blob(storage_uri)
+    except OSError:
+        current_app.logger.warning("Failed to remove file of deleted image (id: '%d')", image_id)
+
+    return ok({"image_id": image_id, "deleted": True, "file_removed": file_removed})
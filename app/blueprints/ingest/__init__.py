@@ -5,9 +5,11 @@ from flask import Blueprint, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
 from app.models import Image, Embedding, OCRText
-from app.services.ocr_pipeline import ocr_extract_from_image_path, ocr_extract_from_image_path_batch
+from app.services.ocr_pipeline import get_model_version, ocr_extract_from_image_path, ocr_extract_from_image_path_batch
 from app.services.embedding_io import l2_normalize, to_bytes
+from app.services.result_reuse import SOURCE_INGEST, SOURCE_PIPELINE
 from app.utils.responses import ok, error
+from app.tasks import enqueue
 
 ingest_bp = Blueprint("ingest", __name__, url_prefix="/api/v1/ingest")
 
@@ -50,20 +52,25 @@ def ingest_embedding():
     # Normalize if needed
     vec: List[float] = vector if normalized else l2_normalize(vector)
     dim = len(vec)
+    dtype = current_app.config.get("EMBEDDING_STORAGE_DTYPE", "float32")
     try:
-        payload = to_bytes(vec)
+        payload = to_bytes(vec, dtype)
     except Exception:
         return error("VECTOR_ENCODE_ERROR", "向量序列化失败，请检查数值是否为可转为 float 的类型")
 
     emb = Embedding.query.filter_by(image_id=image_id).first()
     created = False
     if emb is None:
-        emb = Embedding(image_id=image_id, vec=payload, dim=dim, model_version=model_version)
+        emb = Embedding(image_id=image_id, vec=payload, dim=dim, dtype=dtype, model_version=model_version,
+                        source=SOURCE_INGEST)
         db.session.add(emb)
         created = True
     else:
         emb.vec = payload
         emb.dim = dim
+        emb.dtype = dtype
+        # client-supplied: never reused for other images' uploads (services.result_reuse)
+        emb.source = SOURCE_INGEST
         if model_version:
             emb.model_version = model_version
 
@@ -94,6 +101,7 @@ def ingest_embedding_batch():
         return error("INVALID_ITEMS", "items 必须为非空数组")
 
     owner_id = int(get_jwt_identity())
+    dtype = current_app.config.get("EMBEDDING_STORAGE_DTYPE", "float32")
     results = []
     for idx, item in enumerate(items):
         try:
@@ -110,18 +118,21 @@ def ingest_embedding_batch():
                 continue
 
             vec = vector if normalized else l2_normalize(vector)
-            payload = to_bytes(vec)
+            payload = to_bytes(vec, dtype)
             dim = len(vec)
 
             emb = Embedding.query.filter_by(image_id=image_id).first()
             created = False
             if emb is None:
-                emb = Embedding(image_id=image_id, vec=payload, dim=dim, model_version=model_version)
+                emb = Embedding(image_id=image_id, vec=payload, dim=dim, dtype=dtype, model_version=model_version,
+                                source=SOURCE_INGEST)
                 db.session.add(emb)
                 created = True
             else:
                 emb.vec = payload
                 emb.dim = dim
+                emb.dtype = dtype
+                emb.source = SOURCE_INGEST
                 if model_version:
                     emb.model_version = model_version
 
@@ -182,6 +193,9 @@ def ingest_ocr():
         created = True
     else:
         row.text = text or None
+    row.model_version = get_model_version()
+    # OCR ran here on the stored file: not client-supplied text
+    row.source = SOURCE_PIPELINE
     db.session.commit()
 
     payload = {"image_id": image_id, "has_text": bool(text), "created": created}
@@ -202,6 +216,7 @@ def ingest_ocr_batch():
     Request JSON:
     - image_ids: [int, ...]  或  items: [{image_id:int}, ...]
     - batch_size: int (optional, default 32) 传递给组员的批处理函数（若存在）
+    - async: bool (optional, default False) 为 true 时每张图片入队一个 run_ocr 任务，立即返回 task_id
 
     Behavior:
     - 仅处理当前用户拥有的本地存储图片（storage_uri=local://...），跳过不合法项
@@ -255,6 +270,13 @@ def ingest_ocr_batch():
     ok_ids = list(id_to_path.keys())
     paths = [id_to_path[i] for i in ok_ids]
 
+    if bool(data.get("async", False)):
+        results = [{"image_id": iid, "ok": True, "queued": True, **enqueue("run_ocr", iid)} for iid in ok_ids]
+        results += [{"image_id": iid, "ok": False, "error": "IMAGE_NOT_FOUND_OR_UNSUPPORTED"} for iid in missing_or_forbidden]
+        order = {iid: idx for idx, iid in enumerate(ids)}
+        results.sort(key=lambda r: order.get(r.get("image_id"), 10**9))
+        return ok({"results": results, "async": True})
+
     results = []
     texts: List[str | None] = []
     if paths:
@@ -275,6 +297,8 @@ def ingest_ocr_batch():
             created = True
         else:
             row.text = text or None
+        row.model_version = get_model_version()
+        row.source = SOURCE_PIPELINE
         item = {"image_id": iid, "ok": True, "created": created, "has_text": bool(text)}
         if include_text:
             preview = (text or "")
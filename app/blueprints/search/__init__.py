@@ -1,13 +1,13 @@
 from __future__ import annotations
-from typing import List, Tuple
-from flask import Blueprint, request
+import numpy as np
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.extensions import db
 from app.models import Image, Embedding
 from app.services.embedding_io import from_bytes
-from app.services.vector_index import FaissVectorIndex
-from app.services.index_store import search_topk
-from app.services.clip_pipeline import embed_text
+from app.services.index_store import search_topk, search_topk_batch, get_vector, get_vectors
+from app.services.clip_pipeline import embed_text, embed_texts
+from app.services.hybrid_search import FUSIONS, hybrid_search
 from app.utils.responses import ok, error
 
 search_bp = Blueprint("search", __name__, url_prefix="/api/v1/search")
@@ -32,45 +32,19 @@ def search_by_vector():
         return error("INVALID_K", "k 必须为整数")
 
     user_id = int(get_jwt_identity())
-    rows = (
-        db.session.query(Image.id, Embedding.vec, Embedding.dim)
-        .join(Embedding, Embedding.image_id == Image.id)
-        .filter(
-            Image.owner_id == user_id,
-            Image.status == "READY"
-        )
-        .order_by(Image.id.asc())
-        .all()
-    )
-    if not rows:
-        return ok({"results": [], "note": "no embeddings for current user"})
-
-    image_ids: List[int] = []
-    vectors: List[List[float]] = []
-    for iid, vec_bytes, dim in rows:
-        v = from_bytes(vec_bytes)
-        if len(v) != int(dim):
-            return error("EMBED_DIM_MISMATCH", f"image {iid} 向量维度不匹配: got {len(v)}, expect {dim}")
-        image_ids.append(int(iid))
-        vectors.append(v)
-
-    # 优先使用持久化索引（per-user），其次使用临时内存索引，再退回纯 Python
+    # 持久化索引（per-user）直接作答；仅在索引缺失时由 index_store 回源 DB 构建
     try:
-        # Try persistent per-user index first
         pairs = search_topk(user_id, vector, k=k)
-        if not pairs:
-            # Build ephemeral index as fallback
-            index = FaissVectorIndex(norm=True)
-            index.build(vectors)
-            inds, sims = index.search_topk_scores(vector, k=min(k, len(vectors)))
-            pairs = [(int(image_ids[int(i)]), float(s)) for i, s in zip(inds, sims)]
-        results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
-        return ok({"results": results, "count": len(results)})
     except ValueError as e:
         # Common case: 查询向量维度与索引维度不一致
         return error("VECTOR_DIM_MISMATCH", str(e))
     except Exception as e:
         return error("", str(e))
+    if not pairs:
+        return ok({"results": [], "note": "no embeddings for current user"})
+
+    results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
+    return ok({"results": results, "count": len(results)})
 
 
 @search_bp.post("/text")
@@ -99,41 +73,67 @@ def search_text():
         )
 
     user_id = int(get_jwt_identity())
-    rows = (
-        db.session.query(Image.id, Embedding.vec, Embedding.dim)
-        .join(Embedding, Embedding.image_id == Image.id)
-        .filter(
-            Image.owner_id == user_id,
-            Image.status == "READY"
-        )
-        .order_by(Image.id.asc())
-        .all()
-    )
-    if not rows:
-        return ok({"results": [], "note": "no embeddings for current user"})
-
-    image_ids: List[int] = []
-    vectors: List[List[float]] = []
-    for iid, vec_bytes, dim in rows:
-        v = from_bytes(vec_bytes)
-        if len(v) != int(dim):
-            return error("EMBED_DIM_MISMATCH", f"image {iid} 向量维度不匹配: got {len(v)}, expect {dim}")
-        image_ids.append(int(iid))
-        vectors.append(v)
-
     try:
         pairs = search_topk(user_id, vec, k=k)
-        if not pairs:
-            index = FaissVectorIndex(norm=True)
-            index.build(vectors)
-            inds, sims = index.search_topk_scores(vec, k=min(k, len(vectors)))
-            pairs = [(int(image_ids[int(i)]), float(s)) for i, s in zip(inds, sims)]
-        results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
-        return ok({"results": results, "count": len(results)})
     except ValueError as e:
         return error("VECTOR_DIM_MISMATCH", str(e))
     except Exception as e:
         return error("", str(e))
+    if not pairs:
+        return ok({"results": [], "note": "no embeddings for current user"})
+
+    results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
+    return ok({"results": results, "count": len(results)})
+
+
+@search_bp.post("/hybrid")
+@jwt_required()
+def search_hybrid():
+    """混合检索：CLIP 向量检索与 OCR 文本检索并行执行，融合为一个 top‑K 列表。
+
+    Request JSON:
+    - query: str (required)
+    - k: int (optional, default 10)
+    - fusion: "rrf" (default, reciprocal rank fusion) | "weighted"（各路分数归一化后加权）
+    - weights: {"clip": float, "ocr": float} (optional, fusion=weighted 时使用，默认各 0.5)
+    - ocr_mode: "exact" (default) | "fuzzy"
+
+    Response: results（含 score / rank，以及命中的 clip_rank+similarity、ocr_rank+ocr_score+snippet），
+    stages（各路命中数或错误）与 timings_ms（clip / ocr / ocr_wait / fusion / total）。
+    """
+    data = request.get_json(silent=True) or {}
+    query = (data.get("query") or "").strip()
+    if not query:
+        return error("INVALID_QUERY", "query 不能为空")
+    try:
+        k = int(data.get("k", 10))
+    except Exception:
+        return error("INVALID_K", "k 必须为整数")
+    k = max(1, min(200, k))
+    fusion = (data.get("fusion") or "rrf").strip().lower()
+    if fusion not in FUSIONS:
+        return error("INVALID_FUSION", "fusion 仅支持 rrf / weighted")
+    ocr_mode = (data.get("ocr_mode") or "exact").strip().lower()
+    if ocr_mode not in ("exact", "fuzzy"):
+        return error("INVALID_MODE", "ocr_mode 仅支持 exact / fuzzy")
+    weights = data.get("weights") or {}
+    try:
+        weights = {name: float(weights[name]) for name in ("clip", "ocr") if name in weights}
+    except Exception:
+        return error("INVALID_WEIGHTS", "weights 必须为 {clip: number, ocr: number}")
+
+    user_id = int(get_jwt_identity())
+    results, stages, timings = hybrid_search(user_id, query, k=k, fusion=fusion, weights=weights, ocr_mode=ocr_mode)
+    if all("error" in st for st in stages.values()):
+        return error("HYBRID_SEARCH_FAILED", "向量检索与 OCR 检索均失败")
+    return ok({
+        "query": query,
+        "fusion": fusion,
+        "results": results,
+        "count": len(results),
+        "stages": stages,
+        "timings_ms": timings,
+    })
 
 
 @search_bp.get("/image/<int:image_id>/similar")
@@ -151,54 +151,191 @@ def similar_images(image_id: int):
 
     user_id = int(get_jwt_identity())
 
-    # 只检索当前用户的 READY 图片且已有 embedding
-    rows = (
-        db.session.query(Image.id, Embedding.vec, Embedding.dim)
-        .join(Embedding, Embedding.image_id == Image.id)
-        .filter(
-            Image.owner_id == user_id,
-            Image.status == "READY"
+    # 参考向量优先从索引中按 image_id 取回；不在索引中时只查该图片的一行 embedding
+    ref_vec = get_vector(user_id, image_id)
+    if ref_vec is None:
+        row = (
+            db.session.query(Embedding.vec, Embedding.dim, Embedding.dtype)
+            .join(Image, Embedding.image_id == Image.id)
+            .filter(
+                Image.id == image_id,
+                Image.owner_id == user_id,
+                Image.status == "READY"
+            )
+            .first()
         )
-        .order_by(Image.id.asc())
-        .all()
-    )
-    if not rows:
-        return ok({"results": [], "note": "no embeddings for current user"})
-
-    image_ids: List[int] = []
-    vectors: List[List[float]] = []
-    ref_idx: int | None = None
-    for idx, (iid, vec_bytes, dim) in enumerate(rows):
-        image_ids.append(int(iid))
-        v = from_bytes(vec_bytes)
-        if len(v) != int(dim):
-            return error("EMBED_DIM_MISMATCH", f"image {iid} 向量维度不匹配: got {len(v)}, expect {dim}")
-        vectors.append(v)
-        if iid == image_id:
-            ref_idx = idx
-
-    if ref_idx is None:
-        return error("TARGET_NO_EMBED", "目标图片不存在或尚未生成 embedding", http=404)
-
-    # 若只有一条（自身），则无相似项
-    if len(vectors) <= 1:
-        return ok({"results": []})
+        if row is None:
+            return error("TARGET_NO_EMBED", "目标图片不存在或尚未生成 embedding", http=404)
+        ref_vec = from_bytes(row.vec, row.dtype)
+        if len(ref_vec) != int(row.dim):
+            return error(
+                "EMBED_DIM_MISMATCH", f"image {image_id} 向量维度不匹配: got {len(ref_vec)}, expect {row.dim}"
+            )
 
     try:
-        # Use persistent index if available
-        ref_vec = vectors[ref_idx]
         pairs = search_topk(user_id, ref_vec, k=k + 1)
-        # remove self
-        pairs = [(iid, sim) for (iid, sim) in pairs if iid != image_id][:k]
-        if not pairs:
-            # Fallback: ephemeral index
-            index = FaissVectorIndex(norm=True)
-            index.build(vectors)
-            kq = min(k + 1, len(vectors))
-            inds, sims = index.search_topk_scores(ref_vec, k=kq)
-            temp_pairs = [(int(image_ids[int(i)]), float(s)) for i, s in zip(inds, sims)]
-            pairs = [(iid, sim) for (iid, sim) in temp_pairs if iid != image_id][:k]
-        results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
-        return ok({"results": results, "count": len(results)})
+    except ValueError as e:
+        return error("VECTOR_DIM_MISMATCH", str(e))
     except Exception as e:
         return error("", str(e))
+    # remove self; 若只有自身，则无相似项
+    pairs = [(iid, sim) for (iid, sim) in pairs if iid != image_id][:k]
+    results = [{"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)]
+    return ok({"results": results, "count": len(results)})
+
+
+@search_bp.post("/batch")
+@jwt_required()
+def search_batch():
+    """批量检索：一个请求混合多条向量 / 文本 / 以图找图查询。
+
+    文本一次编码，FAISS 一次检索。
+
+    Request JSON:
+    - queries: list[object] (required)，每项为以下之一（可带 "k" 覆盖全局 k）：
+      - {"vector": list[float]}
+      - {"text": str}
+      - {"image_id": int}（以图找图，结果不含自身）
+    - k: int (optional, default 10)
+
+    Response: results 与 queries 按下标一一对应；
+    单条查询出错只在该项返回 error，不影响其余查询。
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or len(queries) == 0:
+        return error("INVALID_QUERIES", "queries 必须为非空数组")
+    max_queries = int(current_app.config.get("SEARCH_BATCH_MAX_QUERIES", 64))
+    if len(queries) > max_queries:
+        return error("TOO_MANY_QUERIES", f"单次最多 {max_queries} 条查询，收到 {len(queries)} 条")
+    try:
+        k = int(data.get("k", 10))
+    except Exception:
+        return error("INVALID_K", "k 必须为整数")
+
+    user_id = int(get_jwt_identity())
+    items = []  # 每条查询: {"index", "type", "k", 以及 "vec" 或 "error"}
+    texts = {}  # 去重后的文本 → 在 embed_texts 输入中的行号
+    for i, q in enumerate(queries):
+        item = {"index": i, "type": None, "k": k}
+        items.append(item)
+        if not isinstance(q, dict):
+            item["error"] = ("INVALID_QUERY", "每条查询必须为对象")
+            continue
+        if "k" in q:
+            try:
+                item["k"] = int(q["k"])
+            except Exception:
+                item["error"] = ("INVALID_K", "k 必须为整数")
+                continue
+        if "vector" in q:
+            item["type"] = "vector"
+            vector = q["vector"]
+            if not isinstance(vector, list) or len(vector) == 0:
+                item["error"] = ("INVALID_VECTOR", "vector 必须为非空数组")
+                continue
+            try:
+                vec = np.asarray(vector, dtype=np.float32)
+            except Exception:
+                vec = None
+            if vec is None or vec.ndim != 1:
+                item["error"] = ("INVALID_VECTOR", "vector 必须为一维数值数组")
+                continue
+            item["vec"] = vec
+        elif "text" in q:
+            item["type"] = "text"
+            text = (q["text"] or "").strip() if isinstance(q["text"], str) else ""
+            if not text:
+                item["error"] = ("INVALID_QUERY", "text 不能为空")
+                continue
+            item["text"] = text
+            texts.setdefault(text, len(texts))
+        elif "image_id" in q:
+            item["type"] = "image"
+            try:
+                item["image_id"] = int(q["image_id"])
+            except Exception:
+                item["error"] = ("INVALID_IMAGE_ID", "image_id 必须为整数")
+        else:
+            item["error"] = ("INVALID_QUERY", "每条查询需提供 vector、text 或 image_id 之一")
+
+    # 文本：所有去重后的文本一次 model.encode
+    if texts:
+        text_vecs = embed_texts(list(texts))
+        for item in items:
+            if "text" not in item:
+                continue
+            if text_vecs is None:
+                item["error"] = (
+                    "EMBED_TEXT_FAILED",
+                    "文本嵌入失败或依赖缺失，请确认已安装 sentence-transformers/numpy/Pillow。",
+                )
+            else:
+                item["vec"] = text_vecs[texts[item["text"]]]
+
+    # 以图找图：参考向量先按 image_id 从索引取回，缺失的再一次性查 embedding 表
+    ref_ids = sorted({item["image_id"] for item in items if "image_id" in item and "error" not in item})
+    if ref_ids:
+        ref_vecs = get_vectors(user_id, ref_ids)
+        missing = [iid for iid in ref_ids if iid not in ref_vecs]
+        if missing:
+            rows = (
+                db.session.query(Embedding.image_id, Embedding.vec, Embedding.dim, Embedding.dtype)
+                .join(Image, Embedding.image_id == Image.id)
+                .filter(
+                    Image.id.in_(missing),
+                    Image.owner_id == user_id,
+                    Image.status == "READY"
+                )
+                .all()
+            )
+            for row in rows:
+                vec = from_bytes(row.vec, row.dtype)
+                if len(vec) == int(row.dim):
+                    ref_vecs[int(row.image_id)] = vec
+        for item in items:
+            if "image_id" not in item or "error" in item:
+                continue
+            if item["image_id"] in ref_vecs:
+                item["vec"] = ref_vecs[item["image_id"]]
+            else:
+                item["error"] = ("TARGET_NO_EMBED", "目标图片不存在或尚未生成 embedding")
+
+    # 同维度的查询拼成一个 (nq, d) 矩阵做一次检索（正常情况下只有一组）；
+    # 维度与索引不符的整组报错
+    groups = {}
+    for item in items:
+        if "vec" in item:
+            groups.setdefault(int(item["vec"].shape[0]), []).append(item)
+    for group in groups.values():
+        # 以图找图多取一条，去掉自身后仍有 k 条
+        k_max = max(item["k"] + (1 if item["type"] == "image" else 0) for item in group)
+        try:
+            hits = search_topk_batch(user_id, np.stack([item["vec"] for item in group]), k=k_max)
+        except ValueError as e:
+            for item in group:
+                item["error"] = ("VECTOR_DIM_MISMATCH", str(e))
+            continue
+        except Exception as e:
+            for item in group:
+                item["error"] = ("", str(e))
+            continue
+        for item, pairs in zip(group, hits):
+            if item["type"] == "image":
+                pairs = [(iid, sim) for (iid, sim) in pairs if iid != item["image_id"]]
+            item["pairs"] = pairs[: max(item["k"], 0)]
+
+    results = []
+    for item in items:
+        entry = {"index": item["index"], "type": item["type"]}
+        if "error" in item:
+            code, message = item["error"]
+            entry["error"] = {"code": code, "message": message}
+        else:
+            pairs = item.get("pairs", [])
+            entry["results"] = [
+                {"image_id": iid, "similarity": sim, "rank": r + 1} for r, (iid, sim) in enumerate(pairs)
+            ]
+            entry["count"] = len(pairs)
+        results.append(entry)
+    return ok({"results": results, "count": len(results)})
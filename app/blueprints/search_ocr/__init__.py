@@ -2,7 +2,8 @@ from __future__ import annotations
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from app.models import OCRText, Image
+from app.services.ocr_fuzzy import fuzzy_search_ocr_text
+from app.services.ocr_search import search_ocr_text
 from app.utils.responses import ok, error
 
 search_ocr_bp = Blueprint("search_ocr", __name__, url_prefix="/api/v1/search/ocr")
@@ -11,11 +12,18 @@ search_ocr_bp = Blueprint("search_ocr", __name__, url_prefix="/api/v1/search/ocr
 @search_ocr_bp.post("")
 @jwt_required()
 def search_ocr():
-    """Simple OCR text search over user's images.
+    """Full-text OCR search over user's images, best match first.
 
     Request JSON:
     - query: str (required)
     - top_k: int (optional, default 20)
+    - mode: "exact" (default, full-text index) | "fuzzy" (typo-tolerant, score 0-100)
+
+    exact matches whole words (as prefixes) and CJK bigrams, ranked; when that finds fewer than top_k
+    images, substring matches inside words (ILIKE, score 0) fill up the rest
+    (OCR_SEARCH_SUBSTRING_FALLBACK, default on).
+
+    Items: image_id, score (higher is better), snippet, highlights ([start, end) offsets in snippet).
     """
     data = request.get_json(silent=True) or {}
     q = (data.get("query") or "").strip()
@@ -25,31 +33,19 @@ def search_ocr():
         top_k = int(data.get("top_k", 20))
     except Exception:
         top_k = 20
+    mode = (data.get("mode") or "exact").strip().lower()
+    if mode not in ("exact", "fuzzy"):
+        return error("INVALID_MODE", "mode 仅支持 exact / fuzzy")
 
     owner_id = int(get_jwt_identity())
 
     # Only return texts for images owned by user; can later expand to public visibility.
-    # Simple ilike contains; for Chinese/complex text consider FTS later.
-    items = (
-        OCRText.query.join(Image, OCRText.image_id == Image.id)
-        .filter(Image.owner_id == owner_id)
-        .filter(OCRText.text.ilike(f"%{q}%"))
-        .order_by(OCRText.id.desc())
-        .limit(max(1, min(200, top_k)))
-        .all()
-    )
-
-    results = []
-    for row in items:
-        txt = row.text or ""
-        # produce a small snippet
-        idx = txt.lower().find(q.lower())
-        start = max(0, idx - 30) if idx >= 0 else 0
-        end = min(len(txt), (idx + len(q) + 30) if idx >= 0 else 120)
-        snippet = txt[start:end]
-        results.append({
-            "image_id": row.image_id,
-            "snippet": snippet,
-        })
-
-    return ok({"query": q, "items": results, "count": len(results)})
+    # Full-text index (FTS5 / tsvector, CJK bigrams), BM25-ranked; see services.ocr_search
+    top_k = max(1, min(200, top_k))
+    if mode == "fuzzy":
+        # Trigram candidates + rapidfuzz re-ranking for noisy OCR text; see services.ocr_fuzzy
+        results = fuzzy_search_ocr_text(owner_id, q, top_k=top_k)
+    else:
+        results = search_ocr_text(owner_id, q, top_k=top_k)
+
+    return ok({"query": q, "mode": mode, "items": results, "count": len(results)})
@@ -35,6 +35,10 @@ class Config:
     # Max upload size in MB; also map to Flask MAX_CONTENT_LENGTH (bytes)
     UPLOAD_MAX_SIZE_MB = float(os.environ.get("UPLOAD_MAX_SIZE_MB", "20"))
     MAX_CONTENT_LENGTH = int(UPLOAD_MAX_SIZE_MB * 1024 * 1024)
+    # Return from upload with status=PENDING and embed / OCR / index in a background task
+    UPLOAD_ASYNC = os.environ.get("UPLOAD_ASYNC", "true").lower() == "true"
+    # Thumbnail edge lengths generated after upload (generate_thumbs task; empty = none)
+    THUMB_SIZES = [int(s) for s in os.environ.get("THUMB_SIZES", "256").split(",") if s.strip()]
     # Comma-separated allowed mime types
     UPLOAD_ALLOWED_MIME = [
         m.strip() for m in os.environ.get(
@@ -45,21 +49,105 @@ class Config:
     # Celery (optional; not required to run the minimal app)
     CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+    # Task layer: auto (Celery if the broker is reachable, else local queue) | celery | local
+    TASK_BACKEND = os.environ.get("TASK_BACKEND", "auto").strip().lower()
+    TASK_BROKER_CHECK_INTERVAL_S = float(os.environ.get("TASK_BROKER_CHECK_INTERVAL_S", "30"))
+    TASK_MAX_ATTEMPTS = int(os.environ.get("TASK_MAX_ATTEMPTS", "3"))
+    TASK_RETRY_BACKOFF_S = float(os.environ.get("TASK_RETRY_BACKOFF_S", "5"))
+    # Local queue: SQLite file, worker processes (hosted by a web process unless AUTOSTART is off)
+    TASK_QUEUE_PATH = os.environ.get("TASK_QUEUE_PATH", os.path.join(os.getcwd(), "instance", "tasks.sqlite"))
+    TASK_LOCAL_WORKERS = int(os.environ.get("TASK_LOCAL_WORKERS", "2"))
+    TASK_LOCAL_AUTOSTART = os.environ.get("TASK_LOCAL_AUTOSTART", "true").lower() == "true"
+    TASK_LEASE_TIMEOUT_S = float(os.environ.get("TASK_LEASE_TIMEOUT_S", "900"))
+    # Per-task running limits on the local queue, e.g. "run_ocr=1,compute_embedding=2"
+    TASK_CONCURRENCY = os.environ.get("TASK_CONCURRENCY", "")
 
     # CLIP model (for online embedding)
     CLIP_MODEL_NAME = os.environ.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+    # Inference backend: torch (sentence-transformers) | onnx (onnxruntime CPU, towers exported on first load)
+    CLIP_BACKEND = os.environ.get("CLIP_BACKEND", "torch").strip().lower()
+    CLIP_ONNX_DIR = os.environ.get("CLIP_ONNX_DIR", os.path.join(os.getcwd(), "instance", "clip_onnx"))
+    CLIP_ONNX_QUANTIZE = os.environ.get("CLIP_ONNX_QUANTIZE", "false").lower() == "true"
+    # onnxruntime intra-op threads (0 = onnxruntime default: one per physical core)
+    CLIP_ONNX_THREADS = int(os.environ.get("CLIP_ONNX_THREADS", "0"))
+    # Micro-batch concurrent embed_text / embed_image_path calls into one model.encode
+    CLIP_BATCHING = os.environ.get("CLIP_BATCHING", "true").lower() == "true"
+    CLIP_BATCH_MAX_SIZE = int(os.environ.get("CLIP_BATCH_MAX_SIZE", "32"))
+    CLIP_BATCH_MAX_WAIT_MS = float(os.environ.get("CLIP_BATCH_MAX_WAIT_MS", "2"))
+    # Decode JPEGs at reduced resolution (DCT scaling) close to the model input size; EXIF orientation applied
+    CLIP_DECODE_DRAFT = os.environ.get("CLIP_DECODE_DRAFT", "true").lower() == "true"
+    # Threads decoding images for embed_image_path_batch (0 = min(4, CPUs))
+    CLIP_DECODE_WORKERS = int(os.environ.get("CLIP_DECODE_WORKERS", "0"))
+    # Decoded images waiting ahead of the model in embed_image_path_batch (0 = its batch_size)
+    CLIP_DECODE_PREFETCH = int(os.environ.get("CLIP_DECODE_PREFETCH", "0"))
+    # Encoding for new rows in embeddings.vec: float32 | float16 | int8 (existing rows keep their tag)
+    EMBEDDING_STORAGE_DTYPE = os.environ.get("EMBEDDING_STORAGE_DTYPE", "float32").strip().lower()
+    # Text-query embedding cache: in-memory LRU entries (0 = off); optional shared SQLite store
+    TEXT_EMBED_CACHE_SIZE = int(os.environ.get("TEXT_EMBED_CACHE_SIZE", "4096"))
+    TEXT_EMBED_CACHE_PATH = os.environ.get("TEXT_EMBED_CACHE_PATH", "")
+    TEXT_EMBED_CACHE_DISK_MAX_ENTRIES = int(os.environ.get("TEXT_EMBED_CACHE_DISK_MAX_ENTRIES", "100000"))
+    # Copy the stored embedding / OCR text of an identical file (same checksum and model) instead of running inference
+    RESULT_REUSE = os.environ.get("RESULT_REUSE", "true").lower() == "true"
 
     # OCR model architectures
     OCR_DET_ARCH = os.environ.get("OCR_DET_ARCH", "db_mobilenet_v3_large")
     OCR_RECO_ARCH = os.environ.get("OCR_RECO_ARCH", "crnn_mobilenet_v3_large")
+    # Text-presence prefilter before full OCR: off | heuristic (edge/contrast score) | detection (det model only)
+    OCR_PREFILTER = os.environ.get("OCR_PREFILTER", "off").strip().lower()
+    # heuristic: minimum text_score (lined-up stroke cells) to run OCR; detection: minimum box score
+    OCR_PREFILTER_MIN_SCORE = float(os.environ.get("OCR_PREFILTER_MIN_SCORE", "3"))
+    OCR_PREFILTER_DET_MIN_SCORE = float(os.environ.get("OCR_PREFILTER_DET_MIN_SCORE", "0.3"))
+    # Persistent pools of the pipelined batch OCR: decode threads (0 = min(4, CPUs)), post-processing threads
+    OCR_DECODE_WORKERS = int(os.environ.get("OCR_DECODE_WORKERS", "0"))
+    OCR_POST_WORKERS = int(os.environ.get("OCR_POST_WORKERS", "2"))
+    # PaddleOCR backend: model version, images per predict call (detection), text lines per recognition batch
+    OCR_PADDLE_MODEL_NAME = os.environ.get("OCR_PADDLE_MODEL_NAME", "PP-OCRv4")
+    OCR_PADDLE_DET_BATCH_SIZE = int(os.environ.get("OCR_PADDLE_DET_BATCH_SIZE", "4"))
+    OCR_PADDLE_REC_BATCH_SIZE = int(os.environ.get("OCR_PADDLE_REC_BATCH_SIZE", "16"))
 
     # FAISS index persistence (per-user) directory
     INDEX_DIR = os.environ.get("INDEX_DIR", os.path.join(os.getcwd(), "instance", "faiss"))
+    # In-memory per-user index cache budget in bytes (LRU eviction; 0 = unbounded)
+    INDEX_CACHE_MAX_BYTES = int(os.environ.get("INDEX_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+    # Fold the per-user append-only delta log into the base index after this many records
+    INDEX_DELTA_COMPACT_THRESHOLD = int(os.environ.get("INDEX_DELTA_COMPACT_THRESHOLD", "4096"))
+    # Index type: auto | flat | ivf_flat | hnsw | ivf_pq ("auto" picks by per-user library size)
+    INDEX_TYPE = os.environ.get("INDEX_TYPE", "auto").strip().lower()
+    INDEX_AUTO_HNSW_MIN_SIZE = int(os.environ.get("INDEX_AUTO_HNSW_MIN_SIZE", "50000"))
+    INDEX_AUTO_IVFPQ_MIN_SIZE = int(os.environ.get("INDEX_AUTO_IVFPQ_MIN_SIZE", "1000000"))
+    # ANN build / query parameters (0 = derive from library size / dim)
+    INDEX_NLIST = int(os.environ.get("INDEX_NLIST", "0"))
+    INDEX_PQ_M = int(os.environ.get("INDEX_PQ_M", "0"))
+    INDEX_HNSW_M = int(os.environ.get("INDEX_HNSW_M", "32"))
+    INDEX_NPROBE = int(os.environ.get("INDEX_NPROBE", "16"))
+    INDEX_EF_SEARCH = int(os.environ.get("INDEX_EF_SEARCH", "64"))
+    # Memory-map persisted indexes instead of reading them into each worker's heap
+    INDEX_MMAP = os.environ.get("INDEX_MMAP", "false").lower() == "true"
+    # Upper bound on queries per POST /api/v1/search/batch request
+    SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", "64"))
+    # OCR text search: auto (SQLite FTS5 / Postgres tsvector, else ILIKE) | fts | like
+    OCR_SEARCH_BACKEND = os.environ.get("OCR_SEARCH_BACKEND", "auto").strip().lower()
+    # Fill index searches with fewer than top_k hits from the ILIKE scan (substrings inside words)
+    OCR_SEARCH_SUBSTRING_FALLBACK = os.environ.get("OCR_SEARCH_SUBSTRING_FALLBACK", "true").lower() == "true"
+    # Fuzzy OCR search (mode=fuzzy): trigram candidates re-ranked with rapidfuzz partial_ratio (0-100)
+    OCR_FUZZY_CANDIDATES = int(os.environ.get("OCR_FUZZY_CANDIDATES", "500"))
+    OCR_FUZZY_MIN_OVERLAP = float(os.environ.get("OCR_FUZZY_MIN_OVERLAP", "0.3"))
+    OCR_FUZZY_MIN_SCORE = float(os.environ.get("OCR_FUZZY_MIN_SCORE", "70"))
+    # Per-user trigram indexes: LRU budget in bytes, rebuild age (texts rewritten by other workers), delta size before rebuild
+    OCR_FUZZY_CACHE_MAX_BYTES = int(os.environ.get("OCR_FUZZY_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    OCR_FUZZY_INDEX_TTL_S = float(os.environ.get("OCR_FUZZY_INDEX_TTL_S", "600"))
+    OCR_FUZZY_DELTA_MAX = int(os.environ.get("OCR_FUZZY_DELTA_MAX", "2000"))
+    # Hybrid CLIP + OCR search: candidates per stage, RRF constant, threads running the OCR stage
+    HYBRID_STAGE_K = int(os.environ.get("HYBRID_STAGE_K", "50"))
+    HYBRID_RRF_K = float(os.environ.get("HYBRID_RRF_K", "60"))
+    HYBRID_WORKERS = int(os.environ.get("HYBRID_WORKERS", "4"))
 
     # Base dataset
     DATASET_PATH = os.environ.get("DATASET_PATH", "./data/tiny-imagenet-200/train")
     ENABLE_INITIALIZATION = os.environ.get("ENABLE_INITIALIZATION", "false").lower() == "true"
     BASE_UPLOAD_BATCH_SIZE = int(os.environ.get("BASE_UPLOAD_BATCH_SIZE", "32"))
+    # Store the files as PENDING images and enqueue one `process_images` task per batch instead of embedding inline
+    BASE_UPLOAD_ASYNC = os.environ.get("BASE_UPLOAD_ASYNC", "false").lower() == "true"
     OCR_DET_BATCH_SIZE = int(os.environ.get("OCR_DET_BATCH_SIZE", "2"))
     OCR_THRESHOLD = float(os.environ.get("OCR_THRESHOLD", "0.3"))
     LEN_SUBSET = int(os.environ.get("LEN_SUBSET", "-1"))
@@ -77,6 +165,9 @@ class TestConfig(Config):
     TESTING = True
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    # task worker processes cannot see an in-memory DB
+    UPLOAD_ASYNC = False
+    THUMB_SIZES: list[int] = []
 
 
 def get_config(name: str | None):
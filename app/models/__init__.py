@@ -35,10 +35,13 @@ class User(db.Model):  # type: ignore
 
 class Image(db.Model):  # type: ignore
     __tablename__ = "images"
+    # one row per file per owner: a re-upload returns the existing image
+    __table_args__ = (db.UniqueConstraint("owner_id", "checksum", name="uq_images_owner_checksum"),)
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     original_filename = db.Column(db.String(255), nullable=False)
-    storage_uri = db.Column(db.String(512), nullable=False, unique=True)
+    # content-addressed blobs are shared by all rows with the same checksum (services.storage)
+    storage_uri = db.Column(db.String(512), nullable=False, index=True)
     mime_type = db.Column(db.String(64), nullable=True)
     width = db.Column(db.Integer, nullable=True)
     height = db.Column(db.Integer, nullable=True)
@@ -61,7 +64,12 @@ class Embedding(db.Model):  # type: ignore
     # Store normalized embedding as binary blob (e.g., 512 * float32). Later: switch to array type if needed.
     vec = db.Column(db.LargeBinary, nullable=False)
     dim = db.Column(db.Integer, nullable=False)
+    # Blob encoding: float32 | float16 | int8 (see services.embedding_io); legacy rows are float32
+    dtype = db.Column(db.String(16), nullable=False, default="float32", server_default="float32")
     model_version = db.Column(db.String(64), nullable=False, default="clip-vit-b32")
+    # Who computed `vec`: "pipeline" (this server's model) | "ingest" (client-supplied); only pipeline
+    # rows are reused for other images (services.result_reuse), NULL for rows written before the column
+    source = db.Column(db.String(16), nullable=True)
     created_at = db.Column(db.DateTime, default=dt.datetime.now(UTC), nullable=False)
 
     image = db.relationship("Image", back_populates="embedding")
@@ -73,6 +81,10 @@ class OCRText(db.Model):  # type: ignore
     image_id = db.Column(db.Integer, db.ForeignKey("images.id"), nullable=False, unique=True, index=True)
     text = db.Column(db.Text, nullable=True)
     avg_confidence = db.Column(db.Float, nullable=True)
+    # OCR architecture that produced `text` (services.result_reuse); NULL for rows that are never reused
+    model_version = db.Column(db.String(64), nullable=True)
+    # "pipeline" | "ingest", as Embedding.source
+    source = db.Column(db.String(16), nullable=True)
     created_at = db.Column(db.DateTime, default=dt.datetime.now(UTC), nullable=False)
 
     image = db.relationship("Image", back_populates="ocr_text")
@@ -0,0 +1,125 @@
+"""Dynamic micro-batching of CLIP inference calls.
+
+Request threads used to call `model.encode` one item at a time, all contending on the same model.
+A `MicroBatcher` sits in front of it instead: callers enqueue their item and wait on a Future, and a
+single worker thread drains the queue — after the first pending item it keeps collecting for up to
+`CLIP_BATCH_MAX_WAIT_MS` or until `CLIP_BATCH_MAX_SIZE` items — then runs one `encode` over the batch
+and hands each caller its own row. Under load the queue refills while a batch runs, so batches grow
+with concurrency; a lone caller pays at most the wait window.
+
+The worker thread is started lazily and restarted after a fork (e.g. gunicorn workers forked from a
+preloaded app), since threads do not survive fork. When a batch fails, its items are encoded again
+one at a time, so one bad item (e.g. an undecodable image) fails only its own Future; the exception is
+raised in that caller's thread.
+"""
+from __future__ import annotations
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from time import monotonic
+from typing import Any, Callable
+
+
+class MicroBatcher:
+    """Collect concurrent single-item calls into batches for one `encode_batch(items) -> rows` callable."""
+
+    def __init__(
+        self,
+        encode_batch: Callable[[list], Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        name: str = "clip-batcher",
+    ) -> None:
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.split_batches = 0
+        self._lock = threading.Lock()
+        self._queue: queue.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def _ensure_worker(self) -> queue.Queue:
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name=self.name, daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def submit(self, item) -> Future:
+        fut: Future = Future()
+        self._ensure_worker().put((item, fut))
+        return fut
+
+    def submit_many(self, items: list) -> list[Future]:
+        q = self._ensure_worker()
+        futures = []
+        for item in items:
+            fut: Future = Future()
+            q.put((item, fut))
+            futures.append(fut)
+        return futures
+
+    def _collect(self, q: queue.Queue) -> list:
+        batch = [q.get()]
+        deadline = monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - monotonic()
+            try:
+                # past the deadline still take whatever is already queued, without waiting
+                batch.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, q: queue.Queue) -> None:
+        while True:
+            batch = self._collect(q)
+            # callers may have given up (cancelled) while queued
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                rows = self._encode(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    # raised again in the caller's thread (Future.result), which logs it
+                    batch[0][1].set_exception(e)
+                    continue
+                # isolate the failing item(s): the rest of the batch still gets its rows
+                with self._lock:
+                    self.split_batches += 1
+                for item, fut in batch:
+                    try:
+                        fut.set_result(self._encode([(item, fut)])[0])
+                    except Exception as item_error:
+                        fut.set_exception(item_error)
+                continue
+            for (_, fut), row in zip(batch, rows):
+                fut.set_result(row)
+
+    def _encode(self, batch: list) -> Any:
+        rows = self.encode_batch([item for item, _ in batch])
+        if len(rows) != len(batch):
+            raise RuntimeError(f"encode returned {len(rows)} rows for {len(batch)} items")
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+        return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "split_batches": self.split_batches,
+                "mean_batch_size": (self.items / self.batches) if self.batches else None,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
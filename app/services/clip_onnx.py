@@ -0,0 +1,214 @@
+"""ONNX Runtime (CPU) backend for the CLIP image and text encoders.
+
+`CLIP_BACKEND=onnx` makes `CLIPPipeline` run the two CLIP towers with onnxruntime instead of the
+sentence-transformers PyTorch model. The towers are exported once from the same checkpoint:
+
+  <CLIP_ONNX_DIR>/vision.onnx        pixel_values [n,3,S,S]            -> image_embeds [n,dim]
+  <CLIP_ONNX_DIR>/text.onnx          input_ids, attention_mask [n,77]   -> text_embeds [n,dim]
+  <CLIP_ONNX_DIR>/*.int8.onnx        same, MatMul weights dynamically quantized to int8
+  <CLIP_ONNX_DIR>/manifest.json      model name, dim, image size / mean / std
+  + the tokenizer files
+
+Both outputs are the projected (not normalized) embeddings, as `SentenceTransformer.encode` returns
+them. Image preprocessing is CLIPImageProcessor's (bicubic resize of the short side, center crop,
+rescale, mean/std) done in numpy. `python scripts/bench_clip_onnx.py` compares both against the torch
+model (cosine per embedding) and fails below fp32 0.9999 / int8 0.99; run it after exporting a model.
+
+onnxruntime and onnx are not in requirements.txt: `pip install -r requirements-onnx.txt`.
+
+`ONNXCLIPModel` has the `encode` / `get_sentence_embedding_dimension` surface of a SentenceTransformer,
+so the pipeline, its micro-batchers and `embed_image_path_batch` use it unchanged.
+
+Usage:
+  export_clip_onnx("clip-ViT-B-32", "instance/clip_onnx/clip-ViT-B-32", quantize=True)
+  model = ONNXCLIPModel("instance/clip_onnx/clip-ViT-B-32", quantized=True)
+  vecs = model.encode([pil_image, pil_image2])  # or a list of strings
+"""
+from __future__ import annotations
+import os
+import json
+
+import numpy as np
+from PIL import Image
+
+VISION_FILE = "vision.onnx"
+TEXT_FILE = "text.onnx"
+MANIFEST_FILE = "manifest.json"
+_OPSET = 14
+
+
+def _quantized_name(filename: str) -> str:
+    return filename.replace(".onnx", ".int8.onnx")
+
+
+def is_exported(model_dir: str, quantized: bool = False) -> bool:
+    files = [MANIFEST_FILE, VISION_FILE, TEXT_FILE]
+    if quantized:
+        files += [_quantized_name(VISION_FILE), _quantized_name(TEXT_FILE)]
+    return all(os.path.exists(os.path.join(model_dir, f)) for f in files)
+
+
+def export_clip_onnx(model_name: str, out_dir: str, quantize: bool = False, logger=None) -> str:
+    """Export the vision and text towers of sentence-transformers `model_name` to `out_dir`.
+
+    Needs torch, sentence-transformers and onnx (plus onnxruntime for `quantize`). Returns `out_dir`.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_name, device="cpu")
+    clip_module = st[0]
+    clip = clip_module.model.eval()
+    processor = clip_module.processor
+    image_size = int(clip.config.vision_config.image_size)
+    max_length = int(getattr(processor.tokenizer, "model_max_length", 77) or 77)
+    if max_length > 512:
+        max_length = 77
+
+    class _Vision(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, pixel_values):
+            return self.m.get_image_features(pixel_values=pixel_values)
+
+    class _Text(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, input_ids, attention_mask):
+            return self.m.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Vision(clip), (torch.zeros(1, 3, image_size, image_size),),
+            os.path.join(out_dir, VISION_FILE),
+            input_names=["pixel_values"], output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=_OPSET,
+        )
+        dummy = torch.ones(1, max_length, dtype=torch.long)
+        torch.onnx.export(
+            _Text(clip), (dummy, dummy),
+            os.path.join(out_dir, TEXT_FILE),
+            input_names=["input_ids", "attention_mask"], output_names=["text_embeds"],
+            dynamic_axes={"input_ids": {0: "batch"}, "attention_mask": {0: "batch"}, "text_embeds": {0: "batch"}},
+            opset_version=_OPSET,
+        )
+    processor.tokenizer.save_pretrained(out_dir)
+
+    image_processor = getattr(processor, "image_processor", None) or processor.feature_extractor
+    manifest = {
+        "model_name": model_name,
+        "dim": int(st.get_sentence_embedding_dimension() or clip.config.projection_dim),
+        "image_size": image_size,
+        "image_mean": [float(x) for x in image_processor.image_mean],
+        "image_std": [float(x) for x in image_processor.image_std],
+        "max_length": max_length,
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    if quantize:
+        quantize_clip_onnx(out_dir)
+    if logger is not None:
+        logger.info("Exported CLIP '%s' to ONNX in %s (int8: %s)", model_name, out_dir, quantize)
+    return out_dir
+
+
+def quantize_clip_onnx(model_dir: str) -> None:
+    """Write int8 copies of both towers (dynamic quantization of the MatMul weights only: quantizing
+    the patch-embedding Conv and the token-embedding Gather costs more accuracy than it saves)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    for filename in (VISION_FILE, TEXT_FILE):
+        quantize_dynamic(
+            os.path.join(model_dir, filename),
+            os.path.join(model_dir, _quantized_name(filename)),
+            op_types_to_quantize=["MatMul"],
+            weight_type=QuantType.QInt8,
+        )
+
+
+class ONNXCLIPModel:
+    """CLIP towers on onnxruntime with a SentenceTransformer-style `encode`."""
+
+    device = "cpu"
+
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: int = 0) -> None:
+        import onnxruntime as ort
+        from transformers import CLIPTokenizerFast
+
+        with open(os.path.join(model_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.dim = int(self.manifest["dim"])
+        self.image_size = int(self.manifest["image_size"])
+        self.max_length = int(self.manifest.get("max_length", 77))
+        self._mean = np.asarray(self.manifest["image_mean"], dtype=np.float32).reshape(1, 1, 3)
+        self._std = np.asarray(self.manifest["image_std"], dtype=np.float32).reshape(1, 1, 3)
+        self.tokenizer = CLIPTokenizerFast.from_pretrained(model_dir)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            opts.intra_op_num_threads = num_threads
+        providers = ["CPUExecutionProvider"]
+
+        def session(filename: str):
+            path = os.path.join(model_dir, _quantized_name(filename) if quantized else filename)
+            return ort.InferenceSession(path, sess_options=opts, providers=providers)
+
+        self.vision = session(VISION_FILE)
+        self.text = session(TEXT_FILE)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def preprocess(self, image: Image.Image) -> np.ndarray:
+        """CLIPImageProcessor in numpy: bicubic resize (short side), center crop, rescale, normalize; CHW."""
+        size = self.image_size
+        image = image.convert("RGB")
+        w, h = image.size
+        scale = size / min(w, h)
+        new_w, new_h = max(size, round(w * scale)), max(size, round(h * scale))
+        image = image.resize((new_w, new_h), Image.Resampling.BICUBIC)
+        left, top = (new_w - size) // 2, (new_h - size) // 2
+        image = image.crop((left, top, left + size, top + size))
+        arr = np.asarray(image, dtype=np.float32) / 255.0
+        arr = (arr - self._mean) / self._std
+        return arr.transpose(2, 0, 1)
+
+    def _encode_images(self, images: list) -> np.ndarray:
+        pixels = np.stack([self.preprocess(im) for im in images]).astype(np.float32, copy=False)
+        return self.vision.run(None, {"pixel_values": pixels})[0]
+
+    def _encode_texts(self, texts: list[str]) -> np.ndarray:
+        tok = self.tokenizer(
+            texts, padding="max_length", truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {"input_ids": tok["input_ids"].astype(np.int64), "attention_mask": tok["attention_mask"].astype(np.int64)}
+        return self.text.run(None, feeds)[0]
+
+    def encode(self, items, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """Embed one item or a list of PIL images and/or strings (like SentenceTransformer.encode for CLIP)."""
+        single = not isinstance(items, (list, tuple))
+        batch = [items] if single else list(items)
+        out = np.empty((len(batch), self.dim), dtype=np.float32)
+        text_idx = [i for i, x in enumerate(batch) if isinstance(x, str)]
+        image_idx = [i for i, x in enumerate(batch) if not isinstance(x, str)]
+        step = max(1, int(batch_size))
+        for idx, run in ((text_idx, self._encode_texts), (image_idx, self._encode_images)):
+            for start in range(0, len(idx), step):
+                chunk = idx[start:start + step]
+                out[chunk] = run([batch[i] for i in chunk])
+        return out[0] if single else out
+
+
+def default_model_dir(config, model_name: str) -> str:
+    base = config.get("CLIP_ONNX_DIR") or os.path.join(os.getcwd(), "instance", "clip_onnx")
+    return os.path.join(base, model_name.replace("/", "__"))
@@ -1,15 +1,51 @@
 from __future__ import annotations
-from PIL import Image
 from flask import current_app
 import numpy as np
 
+from app.services.clip_batcher import MicroBatcher
+from app.services.image_decode import ImageSource, decode_for_clip, iter_decode_images
+from app.services.result_reuse import find_embeddings, reuse_enabled
+from app.services.text_cache import get_text_cache, normalize_query
+
 
 _PIPELINE: CLIPPipeline | None = None
 
 
 class CLIPPipeline:
 
-    def __init__(self, model_name='clip-ViT-B-32'):
+    def __init__(self, model_name='clip-ViT-B-32', model=None):
+        """Load `model_name` with sentence-transformers (or onnxruntime with `CLIP_BACKEND=onnx`),
+        or wrap an already built `model` (anything with a sentence-transformers style `encode`)."""
+        self.model_name = model_name
+        if model is not None:
+            self.device = getattr(model, "device", "cpu")
+            self.model = model
+        elif current_app.config.get("CLIP_BACKEND", "torch") == "onnx":
+            self._load_onnx_model(model_name)
+        else:
+            self._load_model(model_name)
+
+        try:
+            self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        except Exception:
+            # Compatibility for older versions or other model interfaces
+            self.embedding_dim = None
+
+        # Reduced-resolution decode: images only need to cover the model's input size (224 for ViT-B/32)
+        self.decode_min_side: int | None = None
+        if current_app.config.get("CLIP_DECODE_DRAFT", True):
+            self.decode_min_side = int(getattr(self.model, "image_size", 0) or 224)
+
+        # Concurrent single-item calls are micro-batched into one model.encode (see clip_batcher)
+        self.text_batcher: MicroBatcher | None = None
+        self.image_batcher: MicroBatcher | None = None
+        if self.model is not None and current_app.config.get("CLIP_BATCHING", True):
+            max_size = current_app.config.get("CLIP_BATCH_MAX_SIZE", 32)
+            max_wait_ms = current_app.config.get("CLIP_BATCH_MAX_WAIT_MS", 2.0)
+            self.text_batcher = MicroBatcher(self._encode_batch, max_size, max_wait_ms, "clip-text-batcher")
+            self.image_batcher = MicroBatcher(self._encode_batch, max_size, max_wait_ms, "clip-image-batcher")
+
+    def _load_model(self, model_name: str) -> None:
         # lazy import
         try:
             import torch
@@ -17,7 +53,6 @@ class CLIPPipeline:
         except ImportError as e:
             current_app.logger.exception("Failed to import dependencies for CLIPPipeline: %s", e)
 
-        self.model_name = model_name
         try:
             self.device = "mps" if torch.backends.mps.is_available() else \
                         "cuda" if torch.cuda.is_available() else "cpu"
@@ -32,15 +67,33 @@ class CLIPPipeline:
             current_app.logger.exception("Failed to load CLIP model '%s': %s", model_name, e)
             self.model = None
 
+    def _load_onnx_model(self, model_name: str) -> None:
+        from app.services.clip_onnx import ONNXCLIPModel, default_model_dir, export_clip_onnx, is_exported
+
+        self.device = "cpu"
+        model_dir = default_model_dir(current_app.config, model_name)
+        quantized = current_app.config.get("CLIP_ONNX_QUANTIZE", False)
         try:
-            self.embedding_dim = self.model.get_sentence_embedding_dimension()
-        except Exception:
-            # Compatibility for older versions or other model interfaces
-            self.embedding_dim = None
+            if not is_exported(model_dir, quantized):
+                # first start: export from the torch checkpoint (needs torch + onnx once)
+                export_clip_onnx(model_name, model_dir, quantize=quantized, logger=current_app.logger)
+            current_app.logger.info("Loading CLIP model '%s' with onnxruntime (int8: %s)...", model_name, quantized)
+            self.model = ONNXCLIPModel(model_dir, quantized=quantized,
+                                       num_threads=current_app.config.get("CLIP_ONNX_THREADS", 0))
+            current_app.logger.info("Successfully loaded CLIP model.")
+        except Exception as e:
+            current_app.logger.exception("Failed to load ONNX CLIP model '%s' from %s: %s", model_name, model_dir, e)
+            self.model = None
+
+    def _encode_batch(self, items: list) -> np.ndarray:
+        return self.model.encode(items, batch_size=len(items), convert_to_numpy=True)
 
-    def embed_image_path(self, image_path: str) -> np.ndarray | None:
+    def embed_image_path(self, image_path: ImageSource) -> np.ndarray | None:
         try:
-            pil_image = Image.open(image_path).convert("RGB")
+            # decode in the calling thread; only inference goes through the batcher
+            pil_image = decode_for_clip(image_path, self.decode_min_side)
+            if self.image_batcher is not None:
+                return self.image_batcher.submit(pil_image).result()
             embedding = self.model.encode(pil_image, convert_to_numpy=True)
             return embedding
         except Exception as e:
@@ -49,27 +102,66 @@ class CLIPPipeline:
 
     def embed_text(self, text_query: str) -> np.ndarray | None:
         try:
+            if self.text_batcher is not None:
+                return self.text_batcher.submit(text_query).result()
             embedding = self.model.encode(text_query, convert_to_numpy=True)
             return embedding
         except Exception as e:
             current_app.logger.exception("Failed to embed text '%s': %s", text_query, e)
             return None
 
-    def embed_image_path_batch(self, image_paths: list[str], batch_size: int = 32) -> np.ndarray | None:
-        current_app.logger.info("Start batch embedding %d images (batch_size: %d)...", len(image_paths), batch_size)
+    def embed_texts(self, text_queries: list[str], batch_size: int = 32) -> np.ndarray | None:
         try:
-            pil_images = [Image.open(path).convert("RGB") for path in image_paths]
-            all_embeddings = self.model.encode(
-                pil_images, 
-                batch_size=batch_size, 
-                convert_to_numpy=True,
-                show_progress_bar=True
-            )
-            return all_embeddings
+            if self.text_batcher is not None:
+                # merged with other requests' queries; split at CLIP_BATCH_MAX_SIZE rather than batch_size
+                futures = self.text_batcher.submit_many(text_queries)
+                return np.stack([f.result() for f in futures])
+            embeddings = self.model.encode(text_queries, batch_size=batch_size, convert_to_numpy=True)
+            return embeddings
         except Exception as e:
-            current_app.logger.exception("Failed to batch embed images: %s", e)
+            current_app.logger.exception("Failed to embed %d texts: %s", len(text_queries), e)
             return None
 
+    def embed_image_path_batch(self, image_paths: list[ImageSource], batch_size: int = 32) -> list[np.ndarray | None]:
+        """Embed image files (or `DecodedImage` handles); one result per item, None for items that fail
+        to decode or embed.
+
+        Images are decoded ahead by the decode pool (at most `CLIP_DECODE_PREFETCH`, default
+        `batch_size`, waiting) and encoded `batch_size` at a time, so memory is bounded by the
+        micro-batch rather than by len(image_paths).
+        """
+        current_app.logger.info("Start batch embedding %d images (batch_size: %d)...", len(image_paths), batch_size)
+        batch_size = max(1, int(batch_size))
+        prefetch = current_app.config.get("CLIP_DECODE_PREFETCH", 0) or batch_size
+        results: list[np.ndarray | None] = [None] * len(image_paths)
+        batch: list[tuple[int, object]] = []
+        decoded = iter_decode_images(image_paths, self.decode_min_side, prefetch)
+        for i, (path, img) in enumerate(decoded):
+            if img is not None:
+                batch.append((i, img))
+            if len(batch) == batch_size or (i == len(image_paths) - 1 and batch):
+                self._encode_into(batch, image_paths, results)
+                batch = []
+        failed = sum(r is None for r in results)
+        if failed:
+            current_app.logger.warning("Batch embedding: %d/%d images failed", failed, len(image_paths))
+        return results
+
+    def _encode_into(self, batch: list[tuple[int, object]], image_paths: list[ImageSource], results: list) -> None:
+        try:
+            rows = self.model.encode([img for _, img in batch], batch_size=len(batch), convert_to_numpy=True)
+        except Exception as e:
+            # isolate the image(s) the model rejects
+            current_app.logger.warning("Micro-batch of %d images failed (%s); encoding one by one", len(batch), e)
+            for i, img in batch:
+                try:
+                    results[i] = self.model.encode(img, convert_to_numpy=True)
+                except Exception as e1:
+                    current_app.logger.warning("Failed to embed image '%s': %s", image_paths[i], e1)
+            return
+        for (i, _), row in zip(batch, rows):
+            results[i] = row
+
 
 def _initialze_pipeline() -> CLIPPipeline:
     return CLIPPipeline(
@@ -77,11 +169,17 @@ def _initialze_pipeline() -> CLIPPipeline:
     )
 
 
-def embed_image_path(path: str) -> np.ndarray | None:
-    """Embed a single image file and return a np.ndarray. Returns None on failure.
-    The caller is responsible for normalization and persistence.
+def embed_image_path(path: ImageSource, checksum: str | None = None) -> np.ndarray | None:
+    """Embed a single image file, or a `DecodedImage` shared with OCR, and return a np.ndarray.
+    With `checksum`, the stored embedding of an identical file (same model) is returned without
+    loading or running the model (see services.result_reuse).
+    Returns None on failure. The caller is responsible for normalization and persistence.
     """
     global _PIPELINE
+    if checksum and reuse_enabled():
+        vec = find_embeddings([checksum], _cache_model_name()).get(checksum)
+        if vec is not None:
+            return vec
     if _PIPELINE is None:
         _PIPELINE = _initialze_pipeline()
     if _PIPELINE.model is None:
@@ -91,29 +189,97 @@ def embed_image_path(path: str) -> np.ndarray | None:
     return _PIPELINE.embed_image_path(path)
 
 
+def _cache_model_name() -> str:
+    # cache / reuse key: the loaded model, or the configured one before the model is loaded
+    if _PIPELINE is not None:
+        return _PIPELINE.model_name
+    return current_app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+
+
 def embed_text(text: str) -> np.ndarray | None:
+    """Embed a text query; repeated (normalized) queries are answered from the text embedding cache
+    without loading or running the model. Returns None on failure.
+    """
     global _PIPELINE
+    cache = get_text_cache()
+    query = normalize_query(text)
+    vec = cache.get(_cache_model_name(), query)
+    if vec is not None:
+        return vec
+
     if _PIPELINE is None:
         _PIPELINE = _initialze_pipeline()
     if _PIPELINE.model is None:
         current_app.logger.error("CLIP model is not loaded.")
         return None
 
-    return _PIPELINE.embed_text(text)
+    vec = _PIPELINE.embed_text(query)
+    if vec is None:
+        return None
+    return cache.put(_PIPELINE.model_name, query, vec)
 
 
-def embed_image_path_batch(image_paths: list[str], batch_size: int = 32) -> np.ndarray | None:
-    """Embed a batch of image files and return a 2D np.ndarray. Returns None on failure.
-    The caller is responsible for normalization and persistence.
+def embed_texts(texts: list[str], batch_size: int = 32) -> np.ndarray | None:
+    """Embed several text queries in one model call and return a 2D np.ndarray (one row per text).
+    Cached queries are taken from the text embedding cache; only the misses go through the model.
+    Returns None on failure.
     """
     global _PIPELINE
+    cache = get_text_cache()
+    queries = [normalize_query(t) for t in texts]
+    found = {}
+    for q in dict.fromkeys(queries):
+        vec = cache.get(_cache_model_name(), q)
+        if vec is not None:
+            found[q] = vec
+    missing = [q for q in dict.fromkeys(queries) if q not in found]
+
+    if missing:
+        if _PIPELINE is None:
+            _PIPELINE = _initialze_pipeline()
+        if _PIPELINE.model is None:
+            current_app.logger.error("CLIP model is not loaded.")
+            return None
+        vecs = _PIPELINE.embed_texts(missing, batch_size=batch_size)
+        if vecs is None:
+            return None
+        for q, vec in zip(missing, vecs):
+            found[q] = cache.put(_PIPELINE.model_name, q, vec)
+
+    if not queries:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack([found[q] for q in queries])
+
+
+def embed_image_path_batch(
+    image_paths: list[ImageSource], batch_size: int = 32, checksums: list[str | None] | None = None
+) -> list[np.ndarray | None] | None:
+    """Embed image files (or `DecodedImage` handles), streaming them through the model `batch_size` at a time. Returns one
+    np.ndarray per path (None for an image that failed), or None if the model is unavailable.
+    With `checksums` (aligned with `image_paths`), stored embeddings of identical files are reused and
+    only the rest go through the model. The caller is responsible for normalization and persistence.
+    """
+    global _PIPELINE
+    reused: dict[str, np.ndarray] = {}
+    if checksums and reuse_enabled():
+        reused = find_embeddings(checksums, _cache_model_name())
+    todo = [i for i in range(len(image_paths)) if not checksums or checksums[i] not in reused]
+    if reused and not todo:
+        return [reused[c] for c in checksums]
+
     if _PIPELINE is None:
         _PIPELINE = _initialze_pipeline()
     if _PIPELINE.model is None:
         current_app.logger.error("CLIP model is not loaded.")
-        return None
+        return [reused.get(c) for c in checksums] if reused else None
 
-    return _PIPELINE.embed_image_path_batch(image_paths, batch_size=batch_size)
+    if not reused:
+        return _PIPELINE.embed_image_path_batch(image_paths, batch_size=batch_size)
+    results = [reused.get(c) for c in checksums]
+    vecs = _PIPELINE.embed_image_path_batch([image_paths[i] for i in todo], batch_size=batch_size)
+    for i, vec in zip(todo, vecs):
+        results[i] = vec
+    return results
 
 
 def get_model_name() -> str | None:
@@ -123,6 +289,13 @@ def get_model_name() -> str | None:
     return _PIPELINE.model_name
 
 
+def get_batching_stats() -> dict | None:
+    global _PIPELINE
+    if _PIPELINE is None or _PIPELINE.text_batcher is None:
+        return None
+    return {"text": _PIPELINE.text_batcher.stats(), "image": _PIPELINE.image_batcher.stats()}
+
+
 def get_embedding_dim() -> int | None:
     global _PIPELINE
     if _PIPELINE is None:
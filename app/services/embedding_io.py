@@ -1,7 +1,17 @@
+"""Embedding (de)serialization for the `embeddings.vec` blob.
+
+Storage dtypes (recorded in `Embedding.dtype`):
+- float32: raw little-endian float32 (legacy rows, 4 bytes/dim)
+- float16: half precision (2 bytes/dim)
+- int8: symmetric scalar quantization, float32 scale header + int8 codes (1 byte/dim + 4)
+"""
 from __future__ import annotations
 import numpy as np
 
 
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+
 def l2_normalize(vec: list[float] | np.ndarray) -> np.ndarray:
     v = np.asarray(vec, dtype=np.float32)
     norm = np.linalg.norm(v)
@@ -10,10 +20,27 @@ def l2_normalize(vec: list[float] | np.ndarray) -> np.ndarray:
     return v / norm
 
 
-def to_bytes(vec: list[float] | np.ndarray) -> bytes:
+def to_bytes(vec: list[float] | np.ndarray, dtype: str = "float32") -> bytes:
     v = np.asarray(vec, dtype=np.float32)
-    return v.tobytes()
+    if dtype == "float32":
+        return v.tobytes()
+    if dtype == "float16":
+        return v.astype(np.float16).tobytes()
+    if dtype == "int8":
+        peak = float(np.max(np.abs(v))) if v.size else 0.0
+        scale = peak / 127.0 if peak > 0.0 else 1.0
+        codes = np.clip(np.rint(v / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + codes.tobytes()
+    raise ValueError(f"unsupported embedding dtype: {dtype}")
 
 
-def from_bytes(b: bytes) -> np.ndarray:
-    return np.frombuffer(b, dtype=np.float32)
\ No newline at end of file
+def from_bytes(b: bytes, dtype: str | None = "float32") -> np.ndarray:
+    """Decode a blob written by `to_bytes` back to float32; `None` dtype means legacy float32."""
+    if dtype in (None, "", "float32"):
+        return np.frombuffer(b, dtype=np.float32)
+    if dtype == "float16":
+        return np.frombuffer(b, dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        scale = np.frombuffer(b, dtype=np.float32, count=1)[0]
+        return np.frombuffer(b, dtype=np.int8, offset=4).astype(np.float32) * scale
+    raise ValueError(f"unsupported embedding dtype: {dtype}")
@@ -0,0 +1,167 @@
+"""Hybrid search: CLIP vector retrieval and OCR text retrieval in parallel, fused into one ranking.
+
+The two stages are independent, so they run concurrently and hybrid latency is about the slower of
+the two rather than their sum:
+- clip: embed the query with the CLIP text tower, then `index_store.search_topk` on the user's index;
+- ocr: `search_ocr_text` (full-text index) or, with `ocr_mode="fuzzy"`, `fuzzy_search_ocr_text`.
+The OCR stage runs on a small persistent thread pool (`HYBRID_WORKERS`) inside its own app context
+(and thus its own DB session); the CLIP stage runs in the calling thread. Each stage fetches
+`max(k, HYBRID_STAGE_K)` candidates. A stage that fails (e.g. no CLIP model) is reported in `stages`
+and the other one still answers.
+
+Fusion:
+- rrf (default): score = sum over the lists of 1 / (`HYBRID_RRF_K` + rank); rank-only, so CLIP cosine
+  similarities and BM25 / rapidfuzz scores need no calibration;
+- weighted: each list's scores min-max normalized to [0, 1], then weights["clip"] * clip +
+  weights["ocr"] * ocr (missing from a list = 0).
+
+Usage:
+  results, stages, timings = hybrid_search(user_id, "receipt from taipei", k=10, fusion="rrf")
+"""
+from __future__ import annotations
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from flask import current_app
+
+FUSIONS = ("rrf", "weighted")
+
+_POOL: ThreadPoolExecutor | None = None
+_POOL_PID: int | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        # threads do not survive fork: a forked worker builds its own pool
+        if _POOL is None or _POOL_PID != os.getpid():
+            workers = max(1, int(current_app.config.get("HYBRID_WORKERS", 4)))
+            _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hybrid-search")
+            _POOL_PID = os.getpid()
+        return _POOL
+
+
+def rrf_fuse(ranked: dict[str, list[int]], rrf_k: float = 60.0) -> dict[int, float]:
+    """Reciprocal rank fusion of ranked image-id lists (rank starts at 1)."""
+    scores: dict[int, float] = {}
+    for ids in ranked.values():
+        for rank, image_id in enumerate(ids, start=1):
+            scores[image_id] = scores.get(image_id, 0.0) + 1.0 / (rrf_k + rank)
+    return scores
+
+
+def weighted_fuse(scored: dict[str, list[tuple[int, float]]], weights: dict[str, float]) -> dict[int, float]:
+    """Weighted sum of per-list min-max normalized scores."""
+    fused: dict[int, float] = {}
+    for name, pairs in scored.items():
+        if not pairs:
+            continue
+        values = [s for _, s in pairs]
+        lo, hi = min(values), max(values)
+        weight = float(weights.get(name, 0.0))
+        for image_id, s in pairs:
+            norm = (s - lo) / (hi - lo) if hi > lo else 1.0
+            fused[image_id] = fused.get(image_id, 0.0) + weight * norm
+    return fused
+
+
+def _clip_stage(user_id: int, query: str, depth: int, encode) -> list[tuple[int, float]]:
+    from app.services.index_store import search_topk
+
+    if encode is None:
+        from app.services.clip_pipeline import embed_text as encode
+    vec = encode(query)
+    if vec is None:
+        raise RuntimeError("text embedding unavailable (CLIP model not loaded)")
+    return [(int(iid), float(sim)) for iid, sim in search_topk(user_id, vec, k=depth)]
+
+
+def _ocr_stage(app, user_id: int, query: str, depth: int, ocr_mode: str) -> tuple[list[dict], float]:
+    # own app context: own DB session, released when the context is popped
+    with app.app_context():
+        st = perf_counter()
+        if ocr_mode == "fuzzy":
+            from app.services.ocr_fuzzy import fuzzy_search_ocr_text
+
+            hits = fuzzy_search_ocr_text(user_id, query, top_k=depth)
+        else:
+            from app.services.ocr_search import search_ocr_text
+
+            hits = search_ocr_text(user_id, query, top_k=depth)
+        return hits, perf_counter() - st
+
+
+def hybrid_search(
+    user_id: int,
+    query: str,
+    k: int = 10,
+    fusion: str = "rrf",
+    weights: dict[str, float] | None = None,
+    ocr_mode: str = "exact",
+    encode=None,
+) -> tuple[list[dict], dict, dict]:
+    """Fused top-k for `query`: (results, stages {name: {"count"} or {"error"}}, timings in ms).
+
+    `encode` replaces the CLIP text encoder (a callable returning a vector or None)."""
+    config = current_app.config
+    depth = max(k, int(config.get("HYBRID_STAGE_K", 50)))
+    app = current_app._get_current_object()
+    wall_st = perf_counter()
+
+    ocr_future = _get_pool().submit(_ocr_stage, app, user_id, query, depth, ocr_mode)
+    stages: dict[str, dict] = {}
+    timings: dict[str, float] = {}
+    clip_pairs: list[tuple[int, float]] = []
+    st = perf_counter()
+    try:
+        clip_pairs = _clip_stage(user_id, query, depth, encode)
+        stages["clip"] = {"count": len(clip_pairs)}
+    except Exception as e:
+        current_app.logger.warning("Hybrid search: CLIP stage failed: %s", e)
+        stages["clip"] = {"error": str(e)}
+    timings["clip"] = perf_counter() - st
+
+    ocr_hits: list[dict] = []
+    st = perf_counter()
+    try:
+        ocr_hits, timings["ocr"] = ocr_future.result()
+        stages["ocr"] = {"count": len(ocr_hits)}
+    except Exception as e:
+        current_app.logger.warning("Hybrid search: OCR stage failed: %s", e)
+        stages["ocr"] = {"error": str(e)}
+        timings["ocr"] = 0.0
+    # time the request thread spent waiting for OCR after its own stage finished
+    timings["ocr_wait"] = perf_counter() - st
+
+    st = perf_counter()
+    ocr_pairs = [(int(h["image_id"]), float(h["score"])) for h in ocr_hits]
+    if fusion == "weighted":
+        w = {"clip": 0.5, "ocr": 0.5}
+        w.update(weights or {})
+        fused = weighted_fuse({"clip": clip_pairs, "ocr": ocr_pairs}, w)
+    else:
+        fused = rrf_fuse(
+            {"clip": [iid for iid, _ in clip_pairs], "ocr": [iid for iid, _ in ocr_pairs]},
+            rrf_k=float(config.get("HYBRID_RRF_K", 60)),
+        )
+    clip_info = {iid: (rank, sim) for rank, (iid, sim) in enumerate(clip_pairs, start=1)}
+    ocr_info = {int(h["image_id"]): (rank, h) for rank, h in enumerate(ocr_hits, start=1)}
+    top = sorted(fused.items(), key=lambda x: (-x[1], x[0]))[:k]
+    results = []
+    for rank, (image_id, score) in enumerate(top, start=1):
+        item = {"image_id": image_id, "score": round(score, 6), "rank": rank}
+        if image_id in clip_info:
+            item["clip_rank"], item["similarity"] = clip_info[image_id]
+        if image_id in ocr_info:
+            ocr_rank, hit = ocr_info[image_id]
+            item["ocr_rank"] = ocr_rank
+            item["ocr_score"] = hit["score"]
+            item["snippet"] = hit["snippet"]
+            item["highlights"] = hit["highlights"]
+        results.append(item)
+    timings["fusion"] = perf_counter() - st
+    timings["total"] = perf_counter() - wall_st
+    return results, stages, {name: round(v * 1000.0, 2) for name, v in timings.items()}
@@ -0,0 +1,152 @@
+"""Image decoding for CLIP preprocessing.
+
+CLIP only ever sees a 224px (model `image_size`) center crop, but `Image.open(path).convert("RGB")`
+decodes a 12 MP phone photo at full resolution first — the decode and the RGB copy cost more than
+the model. `decode_for_clip` asks the JPEG decoder for a reduced size instead (`Image.draft`: DCT
+scaling by 1/2, 1/4 or 1/8, the largest reduction that keeps both sides >= the target), so a
+4032x3024 photo is decoded directly at 504x378. Other formats are decoded normally. EXIF orientation
+is applied afterwards, as phone photos are stored rotated.
+
+`iter_decode_images` streams decoded images in input order from a shared thread pool
+(`CLIP_DECODE_WORKERS`; Pillow releases the GIL while decoding), keeping at most `prefetch` decodes
+in flight or waiting to be consumed, so memory stays bounded however many paths are given. A file
+that cannot be decoded yields None instead of stopping the stream.
+
+`DecodedImage` is a handle for one source image that CLIP and OCR both consume (upload processing,
+`initialize_base` batches): the file is read once (or taken from the request bytes) and decoded once
+at full resolution, upright; OCR gets the RGB array and CLIP a copy reduced with `Image.reduce` (no
+second read or decode). Without `full=True` (CLIP only) `for_clip` falls back to the draft decode.
+
+Usage:
+  img = decode_for_clip("photo.jpg", min_side=224)
+  for path, img in iter_decode_images(paths, min_side=224, prefetch=32):
+      ...
+  image = DecodedImage(path, full=True)   # or DecodedImage(data=request_bytes, full=True)
+  embed_decoded(image); ocr_extract_from_image(image)
+"""
+from __future__ import annotations
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Iterable, Iterator, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+from flask import current_app, has_app_context
+
+
+_POOL: ThreadPoolExecutor | None = None
+_POOL_PID: int | None = None
+_POOL_LOCK = threading.Lock()
+
+
+class DecodedImage:
+    """One source image (path or bytes) decoded at most once, shared by CLIP and OCR. Thread-safe."""
+
+    def __init__(self, path: str | None = None, data: bytes | None = None, full: bool = False) -> None:
+        if path is None and data is None:
+            raise ValueError("DecodedImage needs a path or data")
+        self.path = path
+        self.data = data
+        # a full-resolution view will be needed (OCR): derive the CLIP view from it
+        self.full = full
+        self._image: Image.Image | None = None
+        self._array: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        source = self.path if self.path is not None else f"<{len(self.data)} bytes>"
+        return f"DecodedImage({source})"
+
+    def _source(self):
+        return BytesIO(self.data) if self.data is not None else self.path
+
+    def image(self) -> Image.Image:
+        """Full-resolution upright RGB image (decoded on first use)."""
+        with self._lock:
+            if self._image is None:
+                self._image = decode_for_clip(self._source(), None)
+            return self._image
+
+    def array(self) -> np.ndarray:
+        """Full-resolution RGB uint8 array (HxWx3), as OCR takes it."""
+        image = self.image()
+        with self._lock:
+            if self._array is None:
+                self._array = np.asarray(image)
+            return self._array
+
+    def for_clip(self, min_side: int | None = 224) -> Image.Image:
+        """Image whose shorter side is still >= `min_side` (when the source is larger)."""
+        if min_side is None:
+            return self.image()
+        if not self.full and self._image is None:
+            return decode_for_clip(self._source(), min_side)
+        image = self.image()
+        factor = min(8, min(image.size) // min_side)
+        return image.reduce(factor) if factor > 1 else image
+
+
+ImageSource = Union[str, DecodedImage]
+
+
+def decode_for_clip(path, min_side: int | None = 224) -> Image.Image:
+    """Decode `path` (or a file object) as an upright RGB image whose shorter side is still >= `min_side`
+    when the source is larger (reduced-resolution JPEG decode). `min_side=None` decodes at full size."""
+    if isinstance(path, DecodedImage):
+        return path.for_clip(min_side)
+    with Image.open(path) as src:
+        if min_side:
+            # no-op for non-JPEG sources
+            src.draft("RGB", (min_side, min_side))
+        # exif_transpose already returns a loaded copy; convert only when the mode differs
+        img = ImageOps.exif_transpose(src)
+        return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _decode_workers() -> int:
+    if has_app_context():
+        workers = int(current_app.config.get("CLIP_DECODE_WORKERS", 0))
+        if workers > 0:
+            return workers
+    return min(4, os.cpu_count() or 1)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        # threads do not survive fork: a forked worker builds its own pool
+        if _POOL is None or _POOL_PID != os.getpid():
+            _POOL = ThreadPoolExecutor(max_workers=_decode_workers(), thread_name_prefix="image-decode")
+            _POOL_PID = os.getpid()
+        return _POOL
+
+
+def iter_decode_images(
+    paths: Iterable[ImageSource], min_side: int | None = 224, prefetch: int = 32
+) -> Iterator[tuple[ImageSource, Image.Image | None]]:
+    """Yield (path, image or None if it failed to decode) in input order, decoding ahead on the pool.
+    Items may be `DecodedImage` handles (their CLIP view is used)."""
+    pool = _get_pool()
+    it = iter(paths)
+    pending: deque = deque()
+
+    def submit_next() -> None:
+        for path in it:
+            pending.append((path, pool.submit(decode_for_clip, path, min_side)))
+            return
+
+    for _ in range(max(1, int(prefetch))):
+        submit_next()
+    while pending:
+        path, fut = pending.popleft()
+        submit_next()
+        try:
+            img = fut.result()
+        except Exception as e:
+            if has_app_context():
+                current_app.logger.warning("Failed to decode image '%s': %s", path, e)
+            img = None
+        yield path, img
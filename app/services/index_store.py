@@ -1,150 +1,571 @@
 """Per-user FAISS index persistence and in-memory cache.
 
-Stores FAISS index file and image_id mapping under `INDEX_DIR`/user_{id}/.
+Stores one self-describing file per user, `INDEX_DIR`/user_{id}/index.faiss: an IndexIDMap2 that carries
+the image_ids natively, followed by a metadata trailer (dim, model_version, vector count, generation).
+Base files are written to a temp file and renamed, so a crash never leaves a half-written or mismatched
+index, and loading creates no per-id Python objects.
+Uploads are appended to a per-user delta log (`delta.log`, fsynced) instead of rewriting the base
+file; the log header records the generation of the base it extends. Loads replay it and it is folded
+into the base once it reaches `INDEX_DELTA_COMPACT_THRESHOLD` records; a log left over from an older
+generation (compaction crashed before resetting it) is discarded, its records being in the newer base.
+Removals (image deleted, or status leaving READY) are appended as REMOVE records and tombstoned in
+the cached index, filtered out at query time and physically dropped at the next compaction; the changes
+are picked up from SQLAlchemy session events (see register_index_hooks), so they cost O(1) per image.
+Re-adding a tombstoned id (re-embed) appends an ADD after its REMOVE; replay keeps the log order, so the
+new vector is served from the overlay while the old one stays filtered until compaction.
+Writers serialize on a per-user lock file so several worker processes can share `INDEX_DIR`.
+The index type follows `INDEX_TYPE`; with `auto` it is picked from the user's library size
+(flat → hnsw at `INDEX_AUTO_HNSW_MIN_SIZE` → ivf_pq at `INDEX_AUTO_IVFPQ_MIN_SIZE`) and re-evaluated at compaction.
+Loaded indexes are kept in an LRU cache bounded by `INDEX_CACHE_MAX_BYTES`; evicted users are
+reloaded from `INDEX_DIR` on their next access.
+With `INDEX_MMAP` the base file is memory-mapped instead of read into the heap, so worker processes
+share it through the page cache.
+The legacy layout (index.faiss without trailer + ids.json) is rebuilt from the DB on first access.
 
 Usage:
 - search_topk(user_id, query_vec, k): ensure index exists (load or build), then return top‑K with similarities.
+- get_vector(user_id, image_id): stored (normalized) vector of an indexed image, reconstructed from the index.
+- remove_image_ids(user_id, image_ids): drop images from the user's index without a rebuild.
+- get_cache_stats(): hit/miss/eviction counters and current cache size.
+
+The DB is only read when neither the cache nor the persisted files can serve the user.
 """
 from __future__ import annotations
-import json
 import os
+import struct
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
 
-from flask import current_app
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
 from app.extensions import db
 from app.models import Image, Embedding
 from app.services.embedding_io import from_bytes
 from app.services.vector_index import FaissVectorIndex
 
 
-CacheEntry = tuple[FaissVectorIndex, list[int]]
+try:  # advisory file locks (POSIX); single-process fallback elsewhere
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
 _STORE: IndexStore | None = None
 
+# Delta log layout: header (magic, dim, base generation) followed by records (op, image_id[, dim * float32])
+_DELTA_MAGIC = b"WIDDLOG2"
+_DELTA_HEADER = struct.Struct("<8sIq")
+_DELTA_RECORD = struct.Struct("<Bq")
+_OP_ADD = 1
+_OP_REMOVE = 2
+
+
+class _DeltaCursor:
+    """How far this process has replayed a user's delta log, and against which base file."""
+
+    __slots__ = ("base_sig", "offset", "records")
+
+    def __init__(self, base_sig: tuple | None, offset: int, records: int) -> None:
+        self.base_sig = base_sig
+        self.offset = offset
+        self.records = records
+
+
+def _file_sig(path: str) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _delta_reset(path: str, dim: int, generation: int) -> int:
+    with open(path, "wb") as f:
+        f.write(_DELTA_HEADER.pack(_DELTA_MAGIC, int(dim), int(generation)))
+        f.flush()
+        os.fsync(f.fileno())
+    return _DELTA_HEADER.size
+
+
+def _delta_read(
+    path: str, dim: int, generation: int, offset: int
+) -> tuple[list[tuple[int, list[int], list[np.ndarray]]], int, int]:
+    """Read complete records from `offset`; return (runs, end_offset, record_count).
+
+    `runs` groups consecutive records of the same op, in log order, as (op, image_ids, vectors) (no
+    vectors for REMOVE runs): a REMOVE followed by an ADD of the same id (re-embed) must replay as a
+    replacement, not as a removal.
+    A torn record at the tail (crash mid-append) is left out; end_offset points before it.
+    Raises ValueError when the header is missing or written for another dimension or base generation.
+    """
+    vec_size = int(dim) * 4
+    runs: list[tuple[int, list[int], list[np.ndarray]]] = []
+    with open(path, "rb") as f:
+        if offset < _DELTA_HEADER.size:
+            header = f.read(_DELTA_HEADER.size)
+            if len(header) < _DELTA_HEADER.size:
+                raise ValueError("delta log header incomplete")
+            magic, file_dim, file_generation = _DELTA_HEADER.unpack(header)
+            if magic != _DELTA_MAGIC or int(file_dim) != int(dim) or int(file_generation) != int(generation):
+                raise ValueError("delta log header mismatch")
+            offset = _DELTA_HEADER.size
+        f.seek(offset)
+        data = f.read()
+    pos = 0
+    count = 0
+    while pos + _DELTA_RECORD.size <= len(data):
+        op, image_id = _DELTA_RECORD.unpack_from(data, pos)
+        if op == _OP_ADD:
+            end = pos + _DELTA_RECORD.size + vec_size
+            if end > len(data):
+                break
+        elif op == _OP_REMOVE:
+            end = pos + _DELTA_RECORD.size
+        else:
+            break
+        if not runs or runs[-1][0] != op:
+            runs.append((op, [], []))
+        runs[-1][1].append(int(image_id))
+        if op == _OP_ADD:
+            runs[-1][2].append(
+                np.frombuffer(data, dtype=np.float32, count=int(dim), offset=pos + _DELTA_RECORD.size)
+            )
+        pos = end
+        count += 1
+    return runs, offset + pos, count
+
+
+def _delta_append(
+    path: str, dim: int, generation: int, offset: int, image_ids: list, vectors: list | None = None
+) -> int:
+    """Append ADD records (REMOVE records when `vectors` is None) at `offset`, dropping any torn tail;
+    fsync and return the new end offset."""
+    if vectors is None:
+        payload = b"".join(_DELTA_RECORD.pack(_OP_REMOVE, int(iid)) for iid in image_ids)
+    else:
+        arr = np.asarray(vectors, dtype=np.float32).reshape(len(image_ids), int(dim))
+        payload = b"".join(
+            _DELTA_RECORD.pack(_OP_ADD, int(iid)) + arr[i].tobytes() for i, iid in enumerate(image_ids)
+        )
+    if offset < _DELTA_HEADER.size or not os.path.exists(path):
+        offset = _delta_reset(path, dim, generation)
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    return offset + len(payload)
+
+
+class IndexCache:
+    """LRU cache of per-user indexes under an approximate byte budget.
+
+    Entry size is accounted as `ntotal * dim * 4` (float32 vectors); `max_bytes <= 0` disables the bound.
+    Memory-mapped indexes only count their in-heap overlay, the mapped pages being shared page cache.
+    The most recently inserted entry is never evicted, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: int = 0) -> None:
+        self.max_bytes = int(max_bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[int, FaissVectorIndex] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(idx: FaissVectorIndex) -> int:
+        if idx.mapped:
+            ntotal = int(idx.overlay.ntotal) if idx.overlay is not None else 0
+        else:
+            ntotal = idx.ntotal
+        return ntotal * int(idx.dim or 0) * 4
+
+    def get(self, user_id: int) -> FaissVectorIndex | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def put(self, user_id: int, entry: FaissVectorIndex) -> list[int]:
+        """Insert or refresh an entry (re-accounting its size); return the evicted user_ids."""
+        size = self.entry_size(entry)
+        evicted: list[int] = []
+        with self._lock:
+            self.total_bytes -= self._sizes.get(user_id, 0)
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            self._sizes[user_id] = size
+            self.total_bytes += size
+            while self.max_bytes > 0 and self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_id, _ = self._entries.popitem(last=False)
+                self.total_bytes -= self._sizes.pop(old_id, 0)
+                self.evictions += 1
+                evicted.append(old_id)
+        return evicted
+
+    def pop(self, user_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.total_bytes -= self._sizes.pop(user_id, 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
 
 class IndexStore:
 
     def __init__(self) -> None:
         self.base_dir = current_app.config.get("INDEX_DIR", os.path.join(os.getcwd(), "instance", "faiss"))
-        self.cache: dict[int, CacheEntry] = {}
+        self.cache = IndexCache(max_bytes=current_app.config.get("INDEX_CACHE_MAX_BYTES", 0))
+        self.compact_threshold = int(current_app.config.get("INDEX_DELTA_COMPACT_THRESHOLD", 4096))
+        self.index_type = current_app.config.get("INDEX_TYPE", "auto")
+        self.hnsw_min_size = int(current_app.config.get("INDEX_AUTO_HNSW_MIN_SIZE", 50000))
+        self.ivfpq_min_size = int(current_app.config.get("INDEX_AUTO_IVFPQ_MIN_SIZE", 1000000))
+        self.nprobe = int(current_app.config.get("INDEX_NPROBE", 16))
+        self.ef_search = int(current_app.config.get("INDEX_EF_SEARCH", 64))
+        self.mmap = bool(current_app.config.get("INDEX_MMAP", False))
+        self.index_params = {
+            "nlist": int(current_app.config.get("INDEX_NLIST", 0)) or None,
+            "pq_m": int(current_app.config.get("INDEX_PQ_M", 0)) or None,
+            "hnsw_m": int(current_app.config.get("INDEX_HNSW_M", 32)),
+            "nprobe": self.nprobe,
+            "ef_search": self.ef_search,
+        }
+        self.cursors: dict[int, _DeltaCursor] = {}
 
-    def _user_index_paths(self, user_id: int) -> tuple[str, str]:
+    def _user_dir(self, user_id: int) -> str:
         user_dir = os.path.join(self.base_dir, f"user_{user_id}")
         os.makedirs(user_dir, exist_ok=True)
-        idx_path = os.path.join(user_dir, "index.faiss")
-        ids_path = os.path.join(user_dir, "ids.json")
-        return (idx_path, ids_path)
+        return user_dir
+
+    def _user_index_path(self, user_id: int) -> str:
+        return os.path.join(self._user_dir(user_id), "index.faiss")
 
-    def _load_files(self, user_id: int) -> CacheEntry | None:
-        idx_path, ids_path = self._user_index_paths(user_id)
-        if not (os.path.exists(idx_path) and os.path.exists(ids_path)):
+    def _delta_path(self, user_id: int) -> str:
+        return os.path.join(self._user_dir(user_id), "delta.log")
+
+    @contextmanager
+    def _user_lock(self, user_id: int):
+        """Exclusive per-user lock (across threads and processes) for loading and writing index files."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self._user_dir(user_id), ".lock"), "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load_file(self, user_id: int) -> FaissVectorIndex | None:
+        idx_path = self._user_index_path(user_id)
+        if not os.path.exists(idx_path):
             return None
         try:
-            with open(ids_path, "r", encoding="utf-8") as f:
-                ids = json.load(f)
-                if not isinstance(ids, list):
-                    return None
-                ids = [int(x) for x in ids]
-            idx = FaissVectorIndex.load_from_file(idx_path, norm=True)
-            if idx.index is None:
-                return None
-            return (idx, ids)
+            idx = FaissVectorIndex.load_from_file(
+                idx_path, norm=True, nprobe=self.nprobe, ef_search=self.ef_search, mmap=self.mmap
+            )
         except Exception:
             return None
+        if idx.index is None or not idx.with_ids or idx.generation is None:
+            # legacy index.faiss + ids.json layout: rebuilt from the DB by the caller
+            return None
+        cursor = _DeltaCursor(_file_sig(idx_path), 0, 0)
+        self.cursors[user_id] = cursor
+        self._replay_delta(user_id, idx, cursor)
+        return idx
+
+    def _persist_base(self, user_id: int, idx: FaissVectorIndex) -> FaissVectorIndex:
+        """Write the base file under the next generation and start an empty delta log (also used for compaction).
 
-    def _save_files(self, user_id: int, index: FaissVectorIndex, image_ids: list[int]) -> None:
-        idx_path, ids_path = self._user_index_paths(user_id)
-        index.save(idx_path)
-        with open(ids_path, "w", encoding="utf-8") as f:
-            json.dump([int(i) for i in image_ids], f)
+        Returns the index to cache: the compacted copy (overlay merged, tombstones dropped), or with
+        `INDEX_MMAP` a mapping of the file just written.
+        """
+        idx = idx.compacted()
+        idx_path = self._user_index_path(user_id)
+        meta = FaissVectorIndex.read_meta(idx_path)
+        idx.generation = (meta["generation"] if meta else 0) + 1
+        idx.save(idx_path)
+        legacy_ids_path = os.path.join(self._user_dir(user_id), "ids.json")
+        if os.path.exists(legacy_ids_path):
+            os.remove(legacy_ids_path)
+        offset = _delta_reset(self._delta_path(user_id), idx.dim, idx.generation)
+        self.cursors[user_id] = _DeltaCursor(_file_sig(idx_path), offset, 0)
+        if self.mmap:
+            try:
+                return FaissVectorIndex.load_from_file(
+                    idx_path, norm=True, nprobe=self.nprobe, ef_search=self.ef_search, mmap=True
+                )
+            except Exception:
+                pass
+        return idx
 
-    def _build_from_db(self, user_id: int) -> CacheEntry | None:
+    def _replay_delta(self, user_id: int, idx: FaissVectorIndex, cursor: _DeltaCursor) -> None:
+        path = self._delta_path(user_id)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if cursor.offset >= _DELTA_HEADER.size and size <= cursor.offset:
+            return
+        try:
+            runs, end, count = _delta_read(path, idx.dim, idx.generation, cursor.offset)
+        except ValueError:
+            # unreadable log, or left over from an older base generation (callers hold the user lock)
+            cursor.offset = _delta_reset(path, idx.dim, idx.generation)
+            return
+        if size > end:
+            # drop a torn tail left by a crashed append
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        for op, image_ids, vectors in runs:
+            if op == _OP_ADD:
+                idx.push(vectors, ids=image_ids)
+            else:
+                idx.remove(image_ids)
+        cursor.offset = end
+        cursor.records += count
+
+    def _choose_index_type(self, n: int) -> str:
+        index_type = self.index_type
+        if index_type == "auto":
+            if n >= self.ivfpq_min_size:
+                index_type = "ivf_pq"
+            elif n >= self.hnsw_min_size:
+                index_type = "hnsw"
+            else:
+                index_type = "flat"
+        return FaissVectorIndex.resolve_type(index_type, n)
+
+    def _delta_changed(self, user_id: int) -> bool:
+        cursor = self.cursors.get(user_id)
+        if cursor is None:
+            return True
+        if _file_sig(self._user_index_path(user_id)) != cursor.base_sig:
+            return True
+        try:
+            size = os.path.getsize(self._delta_path(user_id))
+        except OSError:
+            size = 0
+        return size > cursor.offset
+
+    def _build_from_db(self, user_id: int, conn=None) -> FaissVectorIndex | None:
+        """Build the user's index from the DB, through `conn` if given (else the session)."""
         # Fetch user's READY images with embeddings ordered by image id (stable mapping)
-        rows = (
-            db.session.query(Image.id, Embedding.vec, Embedding.dim)
+        query = (
+            select(Image.id, Embedding.vec, Embedding.dim, Embedding.dtype, Embedding.model_version)
             .join(Embedding, Embedding.image_id == Image.id)
-            .filter(Image.owner_id == user_id, Image.status == "READY")
+            .where(Image.owner_id == user_id, Image.status == "READY")
             .order_by(Image.id.asc())
-            .all()
         )
+        rows = (conn if conn is not None else db.session).execute(query).all()
         if not rows:
             return None
 
         image_ids: list[int] = []
         vectors: list[list[float]] = []
-        for iid, vec_bytes, dim in rows:
-            v = from_bytes(vec_bytes)
+        models: Counter[str] = Counter()
+        for iid, vec_bytes, dim, dtype, model_version in rows:
+            try:
+                v = from_bytes(vec_bytes, dtype)
+            except ValueError:
+                continue
             if len(v) != int(dim):
                 # skip malformed
                 continue
             image_ids.append(int(iid))
             vectors.append(v)
+            models[model_version] += 1
 
         if not vectors:
             return None
 
-        idx = FaissVectorIndex(norm=True)
-        idx.build(vectors)
-        return (idx, image_ids)
+        idx = FaissVectorIndex(norm=True, index_type=self._choose_index_type(len(vectors)), **self.index_params)
+        idx.build(vectors, ids=image_ids)
+        idx.model_version = models.most_common(1)[0][0]
+        return idx
 
-    def ensure_index(self, user_id: int) -> CacheEntry | None:
-        # Try cache
-        entry = self.cache.get(user_id)
-        if entry is not None:
-            return entry
+    def _cache_put(self, user_id: int, idx: FaissVectorIndex) -> None:
+        for evicted_id in self.cache.put(user_id, idx):
+            self.cursors.pop(evicted_id, None)
+
+    def _ensure_index_locked(
+        self, user_id: int, idx: FaissVectorIndex | None, build: bool = True
+    ) -> tuple[FaissVectorIndex | None, bool]:
+        """Refresh / load / build under the user lock; return (index, built_from_db).
+
+        With build=False nothing is read from the DB: (None, False) when neither cache nor file exists.
+        """
+        # Cached and base file unchanged: only replay what other processes appended
+        cursor = self.cursors.get(user_id)
+        if idx is not None and cursor is not None and _file_sig(self._user_index_path(user_id)) == cursor.base_sig:
+            self._replay_delta(user_id, idx, cursor)
+            self._cache_put(user_id, idx)
+            return idx, False
         # Try files
-        entry = self._load_files(user_id)
-        if entry is not None:
-            self.cache[user_id] = entry
-            return entry
+        idx = self._load_file(user_id)
+        if idx is not None:
+            self._cache_put(user_id, idx)
+            return idx, False
         # Build and persist
-        entry = self._build_from_db(user_id)
-        if entry is None:
-            return None
-        self._save_files(user_id, entry[0], entry[1])
-        self.cache[user_id] = entry
-        return entry
+        if not build:
+            return None, False
+        idx = self._build_from_db(user_id)
+        if idx is None:
+            return None, False
+        idx = self._persist_base(user_id, idx)
+        self._cache_put(user_id, idx)
+        return idx, True
+
+    def ensure_index(self, user_id: int) -> FaissVectorIndex | None:
+        # Try cache
+        idx = self.cache.get(user_id)
+        if idx is not None and not self._delta_changed(user_id):
+            return idx
+        with self._user_lock(user_id):
+            idx, _ = self._ensure_index_locked(user_id, idx)
+        return idx
 
-    def push_vector_id_pairs(self, user_id: int, vectors: list, image_ids: list) -> bool:
+    def push_vector_id_pairs(self, user_id: int, vectors: list, image_ids: list, build: bool = True) -> bool:
+        """Add vectors to the user's index; with build=False users without a persisted index are skipped."""
         if len(vectors) != len(image_ids):
             return False
 
-        entry = self.cache.get(user_id)
-        if entry is None:
-            entry = self._load_files(user_id)
-            if entry is None:
-                entry = self._build_from_db(user_id)
-                if entry is None:
-                    return False
-                self._save_files(user_id, entry[0], entry[1])
-            self.cache[user_id] = entry
-
-        idx, existing_ids = entry
-        idx.push(vectors)
-        existing_ids.extend(image_ids)
-
-        self._save_files(user_id, idx, existing_ids)
-        self.cache[user_id] = (idx, existing_ids)
+        with self._user_lock(user_id):
+            idx, built = self._ensure_index_locked(user_id, self.cache.get(user_id), build=build)
+            if idx is None:
+                return False
+            if built:
+                # a fresh build already contains every committed embedding
+                present = np.isin(np.asarray(image_ids, dtype=np.int64), idx.ids())
+                keep = [i for i, p in enumerate(present) if not p]
+                vectors = [vectors[i] for i in keep]
+                image_ids = [image_ids[i] for i in keep]
+                if not image_ids:
+                    return True
+
+            # a tombstoned id (re-embed, or a deleted max rowid handed out again by SQLite) is revived
+            # in the overlay; its old vector stays filtered until the next compaction
+            image_ids = [int(i) for i in image_ids]
+            idx.push(vectors, ids=image_ids)
+
+            cursor = self.cursors[user_id]
+            cursor.offset = _delta_append(
+                self._delta_path(user_id), idx.dim, idx.generation, cursor.offset, image_ids, vectors
+            )
+            cursor.records += len(image_ids)
+            idx = self._compact_if_due(user_id, idx)
+            self._cache_put(user_id, idx)
         return True
 
+    def remove_image_ids(self, user_id: int, image_ids: list) -> bool:
+        """Tombstone images in the user's index (REMOVE records in the delta log); O(1) per id.
+
+        Never builds from the DB: without a persisted index there is nothing to remove, and the
+        next build only picks up READY images.
+        """
+        with self._user_lock(user_id):
+            idx, _ = self._ensure_index_locked(user_id, self.cache.get(user_id), build=False)
+            if idx is None:
+                return True
+            image_ids = [int(i) for i in image_ids if int(i) not in idx.tombstones]
+            if not image_ids:
+                return True
+
+            idx.remove(image_ids)
+            cursor = self.cursors[user_id]
+            cursor.offset = _delta_append(self._delta_path(user_id), idx.dim, idx.generation, cursor.offset, image_ids)
+            cursor.records += len(image_ids)
+            idx = self._compact_if_due(user_id, idx)
+            self._cache_put(user_id, idx)
+        return True
+
+    def _compact_if_due(self, user_id: int, idx: FaissVectorIndex) -> FaissVectorIndex:
+        """Fold the delta log into the base file once it holds `compact_threshold` records."""
+        if self.cursors[user_id].records < self.compact_threshold:
+            return idx
+        # rebuild from the DB instead when the library outgrew its index type; callers run after their
+        # commit, often inside the after_commit hook where the session cannot emit SQL: read on a
+        # separate connection
+        rebuilt = None
+        if self._choose_index_type(idx.ntotal - len(idx.tombstones) - len(idx.replaced)) != idx.index_type:
+            with db.engine.connect() as conn:
+                rebuilt = self._build_from_db(user_id, conn)
+        return self._persist_base(user_id, rebuilt if rebuilt is not None else idx)
+
     def rebuild_index(self, user_id: int) -> bool:
-        entry = self._build_from_db(user_id)
-        if entry is None:
-            return False
-        self._save_files(user_id, entry[0], entry[1])
-        self.cache[user_id] = entry
+        with self._user_lock(user_id):
+            idx = self._build_from_db(user_id)
+            if idx is None:
+                return False
+            idx = self._persist_base(user_id, idx)
+            self._cache_put(user_id, idx)
         return True
 
+    def get_vector(self, user_id: int, image_id: int) -> np.ndarray | None:
+        idx = self.ensure_index(user_id)
+        if idx is None:
+            return None
+        try:
+            return idx.reconstruct(int(image_id))
+        except Exception:
+            return None
+
+    def get_vectors(self, user_id: int, image_ids: list[int]) -> dict[int, np.ndarray]:
+        """Reconstruct several vectors with one index lookup; ids not in the index are left out."""
+        idx = self.ensure_index(user_id)
+        if idx is None:
+            return {}
+        found = {}
+        for iid in image_ids:
+            try:
+                found[int(iid)] = idx.reconstruct(int(iid))
+            except Exception:
+                continue
+        return found
+
     def search_topk(self, user_id: int, query_vec: list[float], k: int = 10) -> list[tuple[int, float]]:
-        entry = self.ensure_index(user_id)
-        if entry is None:
+        idx = self.ensure_index(user_id)
+        if idx is None:
             return []
-        idx, image_ids = entry
-        inds, sims = idx.search_topk_scores(query_vec, k=min(k, len(image_ids)))
-        results: list[tuple[int, float]] = []
-        for i, s in zip(list(inds), list(sims)):
-            # Safety for out-of-range indices
-            if 0 <= int(i) < len(image_ids):
-                results.append((int(image_ids[int(i)]), float(s)))
-        return results
+        labels, sims = idx.search_topk_scores(query_vec, k=k)
+        # ANN types may return fewer than k hits (label -1)
+        return [(int(iid), float(s)) for iid, s in zip(list(labels), list(sims)) if int(iid) >= 0]
+
+    def search_topk_batch(self, user_id: int, query_vecs, k: int = 10) -> list[list[tuple[int, float]]]:
+        """Answer an (nq, d) query matrix with a single FAISS search; one hit list per row."""
+        q = np.asarray(query_vecs, dtype=np.float32)
+        if q.ndim != 2:
+            raise ValueError(f"expected an (nq, d) query matrix, got shape {q.shape}")
+        idx = self.ensure_index(user_id)
+        if idx is None or q.shape[0] == 0:
+            return [[] for _ in range(q.shape[0])]
+        labels, sims = idx.search_topk_scores(q, k=k)
+        return [
+            [(int(iid), float(s)) for iid, s in zip(row_labels, row_sims) if int(iid) >= 0]
+            for row_labels, row_sims in zip(labels.tolist(), sims.tolist())
+        ]
 
 
 def _initialze_store() -> IndexStore:
@@ -159,9 +580,119 @@ def search_topk(user_id: int, query_vec: list[float], k: int = 10) -> list[tuple
     return _STORE.search_topk(user_id, query_vec, k=k)
 
 
-def push_vector_id_pairs(user_id: int, vectors: list, image_ids: list) -> bool:
+def search_topk_batch(user_id: int, query_vecs, k: int = 10) -> list[list[tuple[int, float]]]:
+    global _STORE
+    if _STORE is None:
+        _STORE = _initialze_store()
+
+    return _STORE.search_topk_batch(user_id, query_vecs, k=k)
+
+
+def get_vector(user_id: int, image_id: int) -> np.ndarray | None:
+    global _STORE
+    if _STORE is None:
+        _STORE = _initialze_store()
+
+    return _STORE.get_vector(user_id, image_id)
+
+
+def get_vectors(user_id: int, image_ids: list[int]) -> dict[int, np.ndarray]:
+    global _STORE
+    if _STORE is None:
+        _STORE = _initialze_store()
+
+    return _STORE.get_vectors(user_id, image_ids)
+
+
+def push_vector_id_pairs(user_id: int, vectors: list, image_ids: list, build: bool = True) -> bool:
+    global _STORE
+    if _STORE is None:
+        _STORE = _initialze_store()
+
+    return _STORE.push_vector_id_pairs(user_id, vectors, image_ids, build=build)
+
+
+def remove_image_ids(user_id: int, image_ids: list) -> bool:
     global _STORE
     if _STORE is None:
         _STORE = _initialze_store()
 
-    return _STORE.push_vector_id_pairs(user_id, vectors, image_ids)
+    return _STORE.remove_image_ids(user_id, image_ids)
+
+
+def get_cache_stats() -> dict | None:
+    global _STORE
+    if _STORE is None:
+        return None
+    return _STORE.cache.stats()
+
+
+# --- Session hooks: keep indexes in sync with Image deletes / status changes ---
+
+_PENDING_KEY = "index_store_changes"
+
+
+def _collect_image_changes(session, flush_context) -> None:
+    """after_flush: remember images that left or (re-)entered the READY set in this transaction."""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.deleted:
+        if isinstance(obj, Image) and obj.id is not None:
+            pending[obj.id] = (obj.owner_id, False)
+    for obj in session.dirty:
+        if not isinstance(obj, Image):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes():
+            continue
+        was_ready = "READY" in (history.deleted or ())
+        is_ready = obj.status == "READY"
+        if was_ready != is_ready:
+            pending[obj.id] = (obj.owner_id, is_ready)
+
+
+def _apply_image_changes(session) -> None:
+    """after_commit: tombstone removed images, push images that became READY again."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not has_app_context():
+        return
+    removed: dict[int, list[int]] = {}
+    added: dict[int, list[int]] = {}
+    for image_id, (owner_id, is_ready) in pending.items():
+        (added if is_ready else removed).setdefault(owner_id, []).append(image_id)
+    try:
+        for owner_id, image_ids in removed.items():
+            remove_image_ids(owner_id, image_ids)
+        if added:
+            # the committed session cannot emit SQL here; read the vectors on a separate connection
+            ids = [iid for image_ids in added.values() for iid in image_ids]
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(Embedding.image_id, Embedding.vec, Embedding.dtype).where(Embedding.image_id.in_(ids))
+                ).all()
+            vectors = {int(iid): from_bytes(vec, dtype) for iid, vec, dtype in rows}
+            for owner_id, image_ids in added.items():
+                image_ids = [iid for iid in image_ids if iid in vectors]
+                if image_ids:
+                    # the committed session cannot run a DB build either; unindexed users build on next search
+                    push_vector_id_pairs(owner_id, [vectors[iid] for iid in image_ids], image_ids, build=False)
+    except Exception:
+        current_app.logger.warning("Failed to apply image changes to the vector index", exc_info=True)
+
+
+def _discard_image_changes(session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_index_hooks() -> None:
+    """Keep per-user indexes in sync with ORM deletes of Image rows and Image.status changes.
+
+    Bulk `query.delete()` / `query.update()` bypass the ORM events and need rebuild_index.
+    Visibility is not part of the index (indexes are per owner), so visibility changes need no hook.
+    """
+    for name, fn in (
+        ("after_flush", _collect_image_changes),
+        ("after_commit", _apply_image_changes),
+        ("after_rollback", _discard_image_changes),
+    ):
+        if not event.contains(db.session, name, fn):
+            event.listen(db.session, name, fn)
@@ -0,0 +1,435 @@
+"""Typo-tolerant OCR search: trigram candidates from a per-user inverted index, rapidfuzz re-ranking.
+
+OCR output drops and swaps letters and spaces ("GRTWALLOF", "KAOHSI"), so exact matching misses.
+Texts are normalized to their letters and digits (NFKC, casefold, everything else removed) and cut
+into overlapping character trigrams, hashed into 2^20 buckets. Per user, the postings are numpy
+arrays: the sorted ids of the buckets that occur (`bucket_ids`, looked up with searchsorted), their
+`offsets` into `indices` (document numbers), built in numpy from the concatenated texts in chunks.
+Memory grows with the postings only, not with the bucket range.
+
+A query touches only the posting lists of its own trigrams: documents sharing at least
+`OCR_FUZZY_MIN_OVERLAP` of them are counted, the `OCR_FUZZY_CANDIDATES` best are read back from
+the DB and re-ranked with `rapidfuzz.fuzz.partial_ratio` (best-matching substring, 0-100); results below
+`OCR_FUZZY_MIN_SCORE` are dropped. The snippet is cut around the aligned substring. Queries with
+fewer than 3 letters/digits have no trigram and use the exact full-text search instead.
+
+Indexes are built on the first fuzzy search of a user and kept in an LRU cache bounded by
+`OCR_FUZZY_CACHE_MAX_BYTES`. Session hooks apply this process's OCR writes to cached indexes as a
+small delta (added documents scanned directly, removed ones filtered), folded in by a rebuild once it
+holds `OCR_FUZZY_DELTA_MAX` documents. OCR rows inserted by other processes (task workers of async
+uploads) are caught up before each search: one range query on `OCRText.id` above the highest id the
+index has seen. Rows deleted elsewhere are dropped at re-ranking (their text is gone); texts
+rewritten in place by another process are picked up when the index is older than
+`OCR_FUZZY_INDEX_TTL_S`.
+
+Usage:
+  hits = fuzzy_search_ocr_text(owner_id, "great wall", top_k=20)  # [{"image_id", "score", "snippet", "highlights"}]
+  get_fuzzy_cache_stats()
+"""
+from __future__ import annotations
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from time import monotonic
+
+import numpy as np
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+
+from app.extensions import db
+from app.models import Image, OCRText
+
+_BUCKET_BITS = 20
+_NON_ALNUM = re.compile(r"[\W_]+")
+_BUILD_CHUNK = 50000
+# multiplicative hashing of the 63-bit trigram code (3 x 21-bit code points) into the bucket range
+_HASH_MUL = np.uint64(0x9E3779B97F4A7C15)
+
+_CACHE: FuzzyIndexCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def normalize(text: str | None) -> str:
+    """Letters and digits only, NFKC + casefold ("Great Wall!" -> "greatwall")."""
+    return _NON_ALNUM.sub("", unicodedata.normalize("NFKC", text or "").casefold())
+
+
+def _normalize_with_offsets(text: str) -> tuple[str, list[int]]:
+    """Like `normalize`, per character, keeping the offset in `text` of each kept character."""
+    chars: list[str] = []
+    offsets: list[int] = []
+    for i, ch in enumerate(text):
+        for c in unicodedata.normalize("NFKC", ch).casefold():
+            if c.isalnum():
+                chars.append(c)
+                offsets.append(i)
+    return "".join(chars), offsets
+
+
+def _buckets(codes: np.ndarray) -> np.ndarray:
+    """Bucket of every trigram in a uint32 code-point array."""
+    c = codes.astype(np.uint64)
+    key = (c[:-2] << np.uint64(42)) | (c[1:-1] << np.uint64(21)) | c[2:]
+    return ((key * _HASH_MUL) >> np.uint64(64 - _BUCKET_BITS)).astype(np.uint32)
+
+
+def trigram_buckets(norm: str) -> np.ndarray:
+    """Distinct trigram buckets of a normalized string."""
+    if len(norm) < 3:
+        return np.empty(0, dtype=np.uint32)
+    return np.unique(_buckets(np.frombuffer(norm.encode("utf-32-le"), dtype=np.uint32)))
+
+
+class TrigramIndex:
+    """Trigram bucket -> documents for one user's OCR texts, plus a delta of later changes."""
+
+    def __init__(
+        self,
+        image_ids: np.ndarray,
+        bucket_ids: np.ndarray,
+        offsets: np.ndarray,
+        indices: np.ndarray,
+        max_row_id: int = 0,
+    ) -> None:
+        self.image_ids = image_ids
+        # postings of bucket_ids[i] are indices[offsets[i]:offsets[i + 1]]
+        self.bucket_ids = bucket_ids
+        self.offsets = offsets
+        self.indices = indices
+        # highest OCRText.id covered by the build or caught up since (see _user_index)
+        self.max_row_id = max_row_id
+        self.built_at = monotonic()
+        # image_id -> buckets for documents added / changed after the build; removed image ids
+        self.delta: dict[int, np.ndarray] = {}
+        self.removed: set[int] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows: list[tuple[int, str | None]], max_row_id: int = 0) -> TrigramIndex:
+        """Index (image_id, text) rows, numpy-vectorized per chunk of documents."""
+        image_ids = np.asarray([iid for iid, _ in rows], dtype=np.int64)
+        doc_parts, bucket_parts = [], []
+        for start in range(0, len(rows), _BUILD_CHUNK):
+            norms = [normalize(text) for _, text in rows[start:start + _BUILD_CHUNK]]
+            lengths = np.fromiter((len(n) for n in norms), dtype=np.int64, count=len(norms))
+            codes = np.frombuffer("".join(norms).encode("utf-32-le"), dtype=np.uint32)
+            if len(codes) < 3:
+                continue
+            doc_of = np.repeat(np.arange(start, start + len(norms), dtype=np.int64), lengths)
+            # keep trigrams that start and end in the same document
+            same = doc_of[:-2] == doc_of[2:]
+            keys = (_buckets(codes)[same].astype(np.int64) << 32) | doc_of[:-2][same]
+            keys = np.unique(keys)  # sorted by (bucket, doc), duplicates within a document dropped
+            bucket_parts.append((keys >> 32).astype(np.uint32))
+            doc_parts.append((keys & 0xFFFFFFFF).astype(np.uint32))
+        if bucket_parts:
+            buckets = np.concatenate(bucket_parts)
+            docs = np.concatenate(doc_parts)
+            # chunks are in document order: a stable sort by bucket keeps each posting list sorted
+            order = np.argsort(buckets, kind="stable")
+            indices = docs[order]
+            bucket_ids, counts = np.unique(buckets[order], return_counts=True)
+        else:
+            indices = np.empty(0, dtype=np.uint32)
+            bucket_ids, counts = np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64)
+        offsets = np.zeros(len(bucket_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(image_ids, bucket_ids, offsets, indices, max_row_id=max_row_id)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = self.image_ids.nbytes + self.bucket_ids.nbytes + self.offsets.nbytes + self.indices.nbytes
+        return int(arrays) + 64 * len(self.delta)
+
+    def update(self, image_id: int, text: str | None) -> None:
+        with self._lock:
+            self.removed.add(image_id)
+            buckets = trigram_buckets(normalize(text))
+            if len(buckets):
+                self.delta[image_id] = buckets
+            else:
+                self.delta.pop(image_id, None)
+
+    def remove(self, image_id: int) -> None:
+        with self._lock:
+            self.removed.add(image_id)
+            self.delta.pop(image_id, None)
+
+    def candidates(self, buckets: np.ndarray, min_overlap: float, limit: int) -> list[int]:
+        """Image ids sharing the most query trigram buckets (at least `min_overlap` of them)."""
+        need = max(1, int(np.ceil(len(buckets) * min_overlap)))
+        pos = np.searchsorted(self.bucket_ids, buckets)
+        hit = pos < len(self.bucket_ids)
+        hit[hit] = self.bucket_ids[pos[hit]] == buckets[hit]
+        lists = [self.indices[self.offsets[p]:self.offsets[p + 1]] for p in pos[hit]]
+        postings = np.concatenate(lists) if lists else np.empty(0, dtype=np.uint32)
+        found: list[tuple[int, int]] = []
+        if len(postings):
+            docs, counts = np.unique(postings, return_counts=True)
+            keep = counts >= need
+            docs, counts = docs[keep], counts[keep]
+            if len(docs) > limit:
+                top = np.argpartition(-counts, limit - 1)[:limit]
+                docs, counts = docs[top], counts[top]
+            found = list(zip(self.image_ids[docs].tolist(), counts.tolist()))
+        with self._lock:
+            removed = set(self.removed)
+            delta = list(self.delta.items())
+        if removed:
+            found = [(iid, c) for iid, c in found if iid not in removed]
+        for iid, doc_buckets in delta:
+            c = int(np.isin(buckets, doc_buckets, assume_unique=True).sum())
+            if c >= need:
+                found.append((iid, c))
+        found.sort(key=lambda x: -x[1])
+        return [iid for iid, _ in found[:limit]]
+
+
+class FuzzyIndexCache:
+    """LRU of per-user trigram indexes under a byte budget (the newest entry is never evicted)."""
+
+    def __init__(self, max_bytes: int = 0) -> None:
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self._entries: OrderedDict[int, TrigramIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> TrigramIndex | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def peek(self, user_id: int) -> TrigramIndex | None:
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def put(self, user_id: int, entry: TrigramIndex) -> list[int]:
+        """Insert an entry; return the evicted user_ids."""
+        evicted: list[int] = []
+        with self._lock:
+            self.builds += 1
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            total = sum(e.nbytes for e in self._entries.values())
+            while self.max_bytes > 0 and total > self.max_bytes and len(self._entries) > 1:
+                old_id, old = self._entries.popitem(last=False)
+                total -= old.nbytes
+                evicted.append(old_id)
+        return evicted
+
+    def pop(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def users(self) -> list[int]:
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "builds": self.builds,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
+
+def _get_cache() -> FuzzyIndexCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = FuzzyIndexCache(current_app.config.get("OCR_FUZZY_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+        return _CACHE
+
+
+# per-user build locks, dropped with the user's cache entry (guarded by _CACHE_LOCK)
+_BUILD_LOCKS: dict[int, threading.Lock] = {}
+
+
+def _owner_rows(owner_id: int, after_row_id: int | None = None):
+    query = (
+        db.session.query(OCRText.image_id, OCRText.text)
+        .join(Image, OCRText.image_id == Image.id)
+        .filter(Image.owner_id == owner_id)
+    )
+    if after_row_id is None:
+        return query.filter(OCRText.text.is_not(None)).order_by(OCRText.image_id).all()
+    # range scan on the primary key: only rows inserted since, of any owner, are visited
+    return query.filter(OCRText.id > after_row_id).order_by(OCRText.id).all()
+
+
+def _catch_up(idx: TrigramIndex, owner_id: int) -> None:
+    """Apply OCR rows inserted by other processes since the index last looked."""
+    max_row_id = db.session.query(db.func.max(OCRText.id)).scalar() or 0
+    if max_row_id <= idx.max_row_id:
+        return
+    for image_id, text in _owner_rows(owner_id, after_row_id=idx.max_row_id):
+        if text:
+            idx.update(image_id, text)
+        else:
+            idx.remove(image_id)
+    idx.max_row_id = max(idx.max_row_id, max_row_id)
+
+
+def _user_index(owner_id: int) -> TrigramIndex:
+    cache = _get_cache()
+    idx = cache.get(owner_id)
+    ttl = float(current_app.config.get("OCR_FUZZY_INDEX_TTL_S", 600))
+    delta_max = int(current_app.config.get("OCR_FUZZY_DELTA_MAX", 2000))
+    if idx is not None and monotonic() - idx.built_at < ttl:
+        _catch_up(idx, owner_id)
+        if len(idx.delta) < delta_max:
+            return idx
+    with _CACHE_LOCK:
+        lock = _BUILD_LOCKS.setdefault(owner_id, threading.Lock())
+    with lock:
+        # another thread may have rebuilt it meanwhile
+        fresh = cache.peek(owner_id)
+        if fresh is not None and fresh is not idx:
+            return fresh
+        # taken before the rows: anything inserted while building is caught up (again) next time
+        max_row_id = db.session.query(db.func.max(OCRText.id)).scalar() or 0
+        idx = TrigramIndex.build(_owner_rows(owner_id), max_row_id=max_row_id)
+        evicted = cache.put(owner_id, idx)
+    if evicted:
+        # an evicted user's next search builds again under a new lock
+        with _CACHE_LOCK:
+            for user_id in evicted:
+                _BUILD_LOCKS.pop(user_id, None)
+    return idx
+
+
+def _snippet(text: str, norm: str, offsets: list[int], start: int, end: int, width: int) -> tuple[str, list[list[int]]]:
+    if not offsets or start >= end:
+        return text[:width], []
+    s, e = offsets[start], offsets[end - 1] + 1
+    lo = max(0, min(s - (width - (e - s)) // 2, len(text) - width))
+    hi = min(len(text), max(lo + width, e))
+    return text[lo:hi], [[s - lo, e - lo]]
+
+
+def fuzzy_search_ocr_text(owner_id: int, query: str, top_k: int = 20, snippet_width: int = 60) -> list[dict]:
+    """Owner's images whose OCR text approximately contains `query`, best first (score 0-100)."""
+    from rapidfuzz import fuzz, process
+
+    qnorm = normalize(query)
+    buckets = trigram_buckets(qnorm)
+    if not len(buckets):
+        from app.services.ocr_search import search_ocr_text
+
+        return search_ocr_text(owner_id, query, top_k=top_k, snippet_width=snippet_width)
+
+    config = current_app.config
+    idx = _user_index(owner_id)
+    candidate_ids = idx.candidates(
+        buckets,
+        min_overlap=float(config.get("OCR_FUZZY_MIN_OVERLAP", 0.3)),
+        limit=int(config.get("OCR_FUZZY_CANDIDATES", 500)),
+    )
+    if not candidate_ids:
+        return []
+    texts = dict(
+        db.session.query(OCRText.image_id, OCRText.text).filter(OCRText.image_id.in_(candidate_ids)).all()
+    )
+    min_score = float(config.get("OCR_FUZZY_MIN_SCORE", 70))
+    choices = {image_id: normalize(texts.get(image_id)) for image_id in candidate_ids}
+    best = process.extract(qnorm, choices, scorer=fuzz.partial_ratio, limit=top_k, score_cutoff=min_score)
+
+    results = []
+    for _, score, image_id in sorted(best, key=lambda x: (-x[1], -x[2])):
+        # alignment (for the snippet) only for the returned rows
+        text = texts.get(image_id) or ""
+        norm, offsets = _normalize_with_offsets(text)
+        align = fuzz.partial_ratio_alignment(qnorm, norm)
+        start, end = (align.dest_start, align.dest_end) if align is not None else (0, 0)
+        snippet, highlights = _snippet(text, norm, offsets, start, end, snippet_width)
+        results.append(
+            {"image_id": image_id, "score": round(float(score), 2), "snippet": snippet, "highlights": highlights}
+        )
+    return results
+
+
+def get_fuzzy_cache_stats() -> dict | None:
+    return _CACHE.stats() if _CACHE is not None else None
+
+
+# --- session hooks: apply this process's OCR writes to cached indexes ---
+
+_PENDING_KEY = "ocr_fuzzy_changes"
+
+
+def _collect_ocr_changes(session, flush_context) -> None:
+    """after_flush: remember OCR texts written / removed in this transaction."""
+    if _CACHE is None:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, OCRText):
+            pending[obj.image_id] = (None, obj.text)
+    for obj in session.dirty:
+        if isinstance(obj, OCRText) and inspect(obj).attrs.text.history.has_changes():
+            pending[obj.image_id] = (None, obj.text)
+    for obj in session.deleted:
+        if isinstance(obj, OCRText):
+            pending[obj.image_id] = (None, None)
+        elif isinstance(obj, Image) and obj.id is not None:
+            pending[obj.id] = (obj.owner_id, None)
+
+
+def _apply_ocr_changes(session) -> None:
+    """after_commit: update the cached indexes of the affected users."""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or _CACHE is None or not has_app_context():
+        return
+    try:
+        cached = set(_CACHE.users())
+        if not cached:
+            return
+        unknown = [iid for iid, (owner, _) in pending.items() if owner is None]
+        owners = {}
+        if unknown:
+            # the committed session cannot emit SQL here
+            with db.engine.connect() as conn:
+                owners = dict(conn.execute(select(Image.id, Image.owner_id).where(Image.id.in_(unknown))).all())
+        for image_id, (owner_id, text) in pending.items():
+            owner_id = owner_id if owner_id is not None else owners.get(image_id)
+            if owner_id not in cached:
+                continue
+            idx = _CACHE.peek(owner_id)
+            if idx is None:
+                continue
+            if text:
+                idx.update(image_id, text)
+            else:
+                idx.remove(image_id)
+    except Exception:
+        current_app.logger.warning("Failed to apply OCR changes to the fuzzy index", exc_info=True)
+
+
+def _discard_ocr_changes(session, previous_transaction=None) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_ocr_fuzzy_hooks() -> None:
+    """Keep cached trigram indexes in sync with ORM changes of OCRText rows and Image deletes."""
+    for name, fn in (
+        ("after_flush", _collect_ocr_changes),
+        ("after_commit", _apply_ocr_changes),
+        ("after_rollback", _discard_ocr_changes),
+    ):
+        if not event.contains(db.session, name, fn):
+            event.listen(db.session, name, fn)
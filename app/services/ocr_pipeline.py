@@ -5,19 +5,48 @@ and call `extract_text_from_image_path` directly to keep behavior consistent.
 Falls back to None on any error.
 """
 from __future__ import annotations
+import os
+import threading
 from time import perf_counter
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from PIL import Image
 from flask import current_app
 import numpy as np
 
+from app.services.image_decode import DecodedImage, ImageSource
+from app.services.ocr_prefilter import prefilter_images
+from app.services.result_reuse import find_ocr_texts, reuse_enabled
+
 
 _PIPELINE: OCRPipeline | None = None
 
 
 class OCRPipeline:
 
-    def __init__(self, det_arch="db_mobilenet_v3_large", reco_arch="crnn_mobilenet_v3_large", det_bs=2):
+    def __init__(self, det_arch="db_mobilenet_v3_large", reco_arch="crnn_mobilenet_v3_large", det_bs=2,
+                 prefilter="off", prefilter_min_score=3, prefilter_det_min_score=0.3,
+                 decode_workers=0, post_workers=2, model=None):
+        """Load the doctr predictor, or wrap an already built `model` (a callable taking a list of
+        RGB arrays and returning a result with `.pages`)."""
+        self.det_arch = det_arch
+        self.reco_arch = reco_arch
+        # text-presence prefilter in front of the full model (see ocr_prefilter)
+        self.prefilter = prefilter
+        self.prefilter_min_score = prefilter_min_score
+        self.prefilter_det_min_score = prefilter_det_min_score
+        # persistent pools for the batch pipeline (created on first use, rebuilt after fork)
+        self.decode_workers = decode_workers or min(4, os.cpu_count() or 1)
+        self.post_workers = max(1, post_workers)
+        self._pools: tuple[ThreadPoolExecutor, ThreadPoolExecutor] | None = None
+        self._pools_pid: int | None = None
+        self._pools_lock = threading.Lock()
+        self.last_timings: dict | None = None
+        self.bs = det_bs
+        if model is not None:
+            self.device = getattr(model, "device", "cpu")
+            self.model = model
+            return
+
         # lazy import
         try:
             import torch
@@ -25,10 +54,7 @@ class OCRPipeline:
         except ImportError as e:
             current_app.logger.exception("Failed to import dependencies for OCRPipeline: %s", e)
 
-        self.det_arch = det_arch
-        self.reco_arch = reco_arch
         try:
-            self.bs = det_bs
             self.device = "mps" if torch.backends.mps.is_available() else \
                         "cuda" if torch.cuda.is_available() else "cpu"
         except Exception:
@@ -43,8 +69,11 @@ class OCRPipeline:
             current_app.logger.exception("Failed to load OCR model '%s' + '%s': %s", det_arch, reco_arch, e)
             self.model = None
 
-    def _process_image_file(self, image_path: str) -> np.ndarray | None:
+    def _process_image_file(self, image_path: ImageSource) -> np.ndarray | None:
         try:
+            if isinstance(image_path, DecodedImage):
+                # decoded once, shared with CLIP
+                return image_path.array()
             image = Image.open(image_path).convert("RGB")
             image = np.array(image)
             return image
@@ -73,10 +102,17 @@ class OCRPipeline:
 
         return text.strip()
 
-    def extract_from_image_path(self, image_path: str, ocr_threshold: float = 0.3) -> str | None:
+    def _prefilter(self, images: list[np.ndarray]) -> list[bool]:
+        return prefilter_images(self.model, images, mode=self.prefilter, min_score=self.prefilter_min_score,
+                                det_min_score=self.prefilter_det_min_score)
+
+    def extract_from_image_path(self, image_path: ImageSource, ocr_threshold: float = 0.3) -> str | None:
         image_np = self._process_image_file(image_path)
         if image_np is None:
             return None
+        if not self._prefilter([image_np])[0]:
+            current_app.logger.debug("OCR prefilter: no text expected in '%s', skipped.", image_path)
+            return None
 
         model_result = self.model([image_np])
         if model_result is None or not model_result.pages:
@@ -87,55 +123,91 @@ class OCRPipeline:
 
         return text_result
 
-    def extract_from_image_path_batch(self, image_paths: list[str], ocr_threshold: float = 0.3) -> list[str | None]:
+    def _get_pools(self) -> tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        with self._pools_lock:
+            if self._pools is None or self._pools_pid != os.getpid():
+                self._pools = (
+                    ThreadPoolExecutor(self.decode_workers, thread_name_prefix="ocr-decode"),
+                    ThreadPoolExecutor(self.post_workers, thread_name_prefix="ocr-post"),
+                )
+                self._pools_pid = os.getpid()
+            return self._pools
+
+    def extract_from_image_path_batch(
+        self, image_paths: list[ImageSource], ocr_threshold: float = 0.3
+    ) -> list[str | None]:
+        """OCR images in micro-batches of `self.bs`, pipelined over persistent pools: batch i+1 is
+        decoded while batch i is in the model, and page post-processing runs while the next batch
+        is inferred. Results are aligned with `image_paths` (None for failures / no text).
+        Stage timings of the last call are kept in `self.last_timings` and logged."""
         total_images = len(image_paths)
-        all_texts = []
-        total_batches = (total_images + self.bs - 1) // self.bs 
-
-        current_app.logger.info("Start batch processing %d images (batch_size: %d) in %d batches...", total_images, self.bs, total_batches)
-
+        total_batches = (total_images + self.bs - 1) // self.bs
+        current_app.logger.info(
+            "Start batch processing %d images (batch_size: %d) in %d batches...", total_images, self.bs, total_batches
+        )
+
+        decode_pool, post_pool = self._get_pools()
+        app = current_app._get_current_object()
+
+        def in_app(fn, *args):
+            # pool threads have no app context; the helpers log through current_app
+            with app.app_context():
+                return fn(*args)
+
+        def submit_decode(start: int) -> list[Future]:
+            return [decode_pool.submit(in_app, self._process_image_file, p) for p in image_paths[start:start + self.bs]]
+
+        def post(pages) -> list[str | None]:
+            return [self._process_page_result(page, ocr_threshold=ocr_threshold) for page in pages]
+
+        timings = {"decode_wait": 0.0, "prefilter": 0.0, "inference": 0.0, "post_wait": 0.0}
+        wall_st = perf_counter()
+        all_texts: list[str | None] = [None] * total_images
+        post_jobs: list[tuple[list[int], Future]] = []
+        next_decode = submit_decode(0) if total_images else []
         for i in range(0, total_images, self.bs):
-            batch_paths = image_paths[i : i + self.bs]
             current_batch_num = (i // self.bs) + 1
 
-            # current_app.logger.info("  Batch %d/%d: Pre-processing {len(batch_paths)} images (I/O)...", current_batch_num, total_batches)
-
-            # pre_st = perf_counter()
-            with ThreadPoolExecutor() as executor:
-                images_np = list(executor.map(self._process_image_file, batch_paths))
+            st = perf_counter()
+            images_np = [f.result() for f in next_decode]
+            timings["decode_wait"] += perf_counter() - st
+            # prefetch: the next batch decodes while this one is in the model
+            next_decode = submit_decode(i + self.bs) if i + self.bs < total_images else []
 
-            valid_images = [img for img in images_np if img is not None]
-            if not valid_images:
-                all_texts.extend([None] * len(batch_paths))
+            valid_idx = [j for j, img in enumerate(images_np) if img is not None]
+            if not valid_idx:
                 current_app.logger.warning("  Batch %d/%d: All images failed to load. Skipping.", current_batch_num, total_batches)
                 continue
-            # pre_ed = perf_counter()
-
-            # inf_st = perf_counter()
-            # current_app.logger.info("  Batch %d/%d: Running model on %d images...",current_batch_num, total_batches, len(valid_images))
-            results = self.model(valid_images)
-            # current_app.logger.info("  Batch %d/%d: Model inference complete.", current_batch_num, total_batches)
-            # inf_ed = perf_counter()
-
-            # post_st = perf_counter()
-            # current_app.logger.info("  Batch %d/%d: Post-processing results (CPU)...", current_batch_num, total_batches)
-            with ThreadPoolExecutor() as executor:
-                texts = list(executor.map(lambda page: self._process_page_result(page, ocr_threshold=ocr_threshold), results.pages))
-
-            text_iter = iter(texts)
-            batch_results = []
-            for img in images_np:
-                if img is None:
-                    batch_results.append(None)
-                else:
-                    batch_results.append(next(text_iter, None))
-
-            all_texts.extend(batch_results)
-            # post_ed = perf_counter()
-
-            # current_app.logger.debug("\n**Time stats**\nPre: %.3fs\nInference: %.3fs\nPost: %.3fs", pre_ed-pre_st, inf_ed-inf_st, post_ed-post_st)
+            st = perf_counter()
+            keep = self._prefilter([images_np[j] for j in valid_idx])
+            run_idx = [i + j for j, k in zip(valid_idx, keep) if k]
+            timings["prefilter"] += perf_counter() - st
+            if not run_idx:
+                continue
 
-        current_app.logger.info("Batch processing complete.")
+            st = perf_counter()
+            results = self.model([images_np[j - i] for j in run_idx])
+            timings["inference"] += perf_counter() - st
+            if results is None or not results.pages:
+                continue
+            post_jobs.append((run_idx, post_pool.submit(in_app, post, results.pages)))
+
+        st = perf_counter()
+        for run_idx, fut in post_jobs:
+            for j, text in zip(run_idx, fut.result()):
+                all_texts[j] = text
+        timings["post_wait"] = perf_counter() - st
+        timings = {k: round(v, 4) for k, v in timings.items()}
+        timings["total"] = round(perf_counter() - wall_st, 4)
+        timings["images"] = total_images
+        self.last_timings = timings
+
+        current_app.logger.info(
+            "Batch processing complete: %d images in %.2fs "
+            "(decode wait %.2fs, prefilter %.2fs, inference %.2fs, post wait %.2fs).",
+            total_images, timings["total"],
+            timings["decode_wait"], timings["prefilter"], timings["inference"], timings["post_wait"],
+        )
         return all_texts
 
 
@@ -143,12 +215,24 @@ def _initialize_pipeline() -> OCRPipeline:
     return OCRPipeline(
         det_arch=current_app.config.get("OCR_DET_ARCH", "db_mobilenet_v3_large"),
         reco_arch=current_app.config.get("OCR_RECO_ARCH", "crnn_mobilenet_v3_large"),
-        det_bs=current_app.config.get("OCR_DET_BATCH_SIZE", 2)
+        det_bs=current_app.config.get("OCR_DET_BATCH_SIZE", 2),
+        prefilter=current_app.config.get("OCR_PREFILTER", "off"),
+        prefilter_min_score=current_app.config.get("OCR_PREFILTER_MIN_SCORE", 3),
+        prefilter_det_min_score=current_app.config.get("OCR_PREFILTER_DET_MIN_SCORE", 0.3),
+        decode_workers=current_app.config.get("OCR_DECODE_WORKERS", 0),
+        post_workers=current_app.config.get("OCR_POST_WORKERS", 2),
     )
 
 
-def ocr_extract_from_image_path(image_path: str) -> str | None:
+def ocr_extract_from_image_path(image_path: ImageSource, checksum: str | None = None) -> str | None:
+    """OCR one image file, or a `DecodedImage` shared with CLIP. Returns None if no text.
+    With `checksum`, the stored text of an identical file (same architectures) is returned without
+    loading or running the model (see services.result_reuse)."""
     global _PIPELINE
+    if checksum and reuse_enabled():
+        found = find_ocr_texts([checksum], _reuse_key())
+        if checksum in found:
+            return found[checksum]
     if _PIPELINE is None:
         _PIPELINE = _initialize_pipeline()
     if _PIPELINE.model is None:
@@ -158,18 +242,35 @@ def ocr_extract_from_image_path(image_path: str) -> str | None:
     return _PIPELINE.extract_from_image_path(image_path, ocr_threshold=current_app.config.get("OCR_THRESHOLD", 0.3))
 
 
-def ocr_extract_from_image_path_batch(image_paths: list[str]) -> list[str | None]:
+def ocr_extract_from_image_path_batch(
+    image_paths: list[ImageSource], checksums: list[str | None] | None = None
+) -> list[str | None]:
+    """With `checksums` (aligned with `image_paths`), stored texts of identical files are reused and only
+    the rest go through the model."""
     global _PIPELINE
 
     total_images = len(image_paths)
+    reused: dict[str, str | None] = {}
+    if checksums and reuse_enabled():
+        reused = find_ocr_texts(checksums, _reuse_key())
+    todo = [i for i in range(total_images) if not checksums or checksums[i] not in reused]
+    if reused and not todo:
+        return [reused[c] for c in checksums]
 
     if _PIPELINE is None:
         _PIPELINE = _initialize_pipeline()
     if _PIPELINE.model is None:
         current_app.logger.error("OCR model is not loaded.")
-        return [None] * total_images
+        return [reused.get(c) for c in checksums] if reused else [None] * total_images
 
-    return _PIPELINE.extract_from_image_path_batch(image_paths, ocr_threshold=current_app.config.get("OCR_THRESHOLD", 0.3))
+    ocr_threshold = current_app.config.get("OCR_THRESHOLD", 0.3)
+    if not reused:
+        return _PIPELINE.extract_from_image_path_batch(image_paths, ocr_threshold=ocr_threshold)
+    results = [reused.get(c) for c in checksums]
+    texts = _PIPELINE.extract_from_image_path_batch([image_paths[i] for i in todo], ocr_threshold=ocr_threshold)
+    for i, text in zip(todo, texts):
+        results[i] = text
+    return results
 
 
 def get_arch_name() -> str | None:
@@ -177,3 +278,24 @@ def get_arch_name() -> str | None:
     if _PIPELINE is None:
         return None
     return f"{_PIPELINE.det_arch} + {_PIPELINE.reco_arch}"
+
+
+def _reuse_key() -> str:
+    # reuse key: the loaded model, or the configured one before the model is loaded
+    if _PIPELINE is not None:
+        key, prefilter = f"{_PIPELINE.det_arch} + {_PIPELINE.reco_arch}", _PIPELINE.prefilter
+    else:
+        det_arch = current_app.config.get("OCR_DET_ARCH", "db_mobilenet_v3_large")
+        reco_arch = current_app.config.get("OCR_RECO_ARCH", "crnn_mobilenet_v3_large")
+        key = f"{det_arch} + {reco_arch}"
+        prefilter = current_app.config.get("OCR_PREFILTER", "off")
+    # a prefilter may have skipped an image with text: its empty results must not outlive the setting
+    return key if prefilter == "off" else f"{key} | pf={prefilter}"
+
+
+def get_model_version() -> str | None:
+    """Version stamped on stored OCR text ("<det_arch> + <reco_arch>", plus " | pf=<mode>" with OCR_PREFILTER);
+    None if the model failed to load, so the empty result of a missing model is never reused."""
+    if _PIPELINE is not None and _PIPELINE.model is None:
+        return None
+    return _reuse_key()
@@ -3,20 +3,46 @@
 We load the module from file location (folder name contains dashes, not importable as package)
 and call `extract_text_from_image_path` directly to keep behavior consistent.
 Falls back to None on any error.
+
+Batches: `process_image_batch` hands PaddleOCR `det_bs` images per `predict` call
+(`OCR_PADDLE_DET_BATCH_SIZE`) and recognizes text lines `rec_bs` at a time
+(`OCR_PADDLE_REC_BATCH_SIZE`). Images are decoded (EXIF-transposed, RGB) on a persistent thread pool
+(`OCR_DECODE_WORKERS`), the next batch while the current one is in the model. Results are aligned
+with the input: None for files that fail to decode or to OCR (a failed batch is retried per image).
 """
 from __future__ import annotations
+import os
+import threading
 from time import perf_counter
-from PIL import Image, ImageOps
+from concurrent.futures import Future, ThreadPoolExecutor
 from flask import current_app
 import numpy as np
 
+from app.services.image_decode import ImageSource, decode_for_clip
+from app.services.result_reuse import find_ocr_texts, reuse_enabled
+
 
 _PIPELINE: OCRPipeline | None = None
 
 
 class OCRPipeline:
 
-    def __init__(self, model_name="PP-OCRv4"):
+    def __init__(self, model_name="PP-OCRv4", det_bs=4, rec_bs=16, decode_workers=0, model=None):
+        """Load PaddleOCR, or wrap an already built `model` (with PaddleOCR's `predict`)."""
+        self.model_name = model_name
+        self.det_bs = max(1, int(det_bs))
+        self.rec_bs = max(1, int(rec_bs))
+        # persistent decode pool (created on first use, rebuilt after fork)
+        self.decode_workers = decode_workers or min(4, os.cpu_count() or 1)
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_pid: int | None = None
+        self._pool_lock = threading.Lock()
+        self.last_timings: dict | None = None
+        if model is not None:
+            self.device = getattr(model, "device", "cpu")
+            self.model = model
+            return
+
         # lazy import
         try:
             import torch
@@ -25,19 +51,21 @@ class OCRPipeline:
         except ImportError as e:
             current_app.logger.exception("Failed to import dependencies for OCRPipeline: %s", e)
 
-        self.model_name = model_name
         try:
             self.device = "cuda" if paddle.is_compiled_with_cuda() else \
                         "mps" if paddle.is_compiled_with_mps() else "cpu"
         except Exception:
             self.device = "cpu"
-        current_app.logger.info("Loading OCR model: '%s' (using device: %s)...", model_name, self.device) 
+        current_app.logger.info("Loading OCR model: '%s' (using device: %s, det batch %d, rec batch %d)...",
+                                model_name, self.device, self.det_bs, self.rec_bs)
 
+        batch_kwargs = {"text_recognition_batch_size": self.rec_bs, "textline_orientation_batch_size": self.rec_bs}
         try:
             self.model = PaddleOCR(
                 use_angle_cls=True,
                 lang='ch',
-                ocr_version=model_name
+                ocr_version=model_name,
+                **batch_kwargs,
             )
             current_app.logger.info("Successfully loaded OCR model.")
         except Exception as e:
@@ -46,61 +74,128 @@ class OCRPipeline:
                 self.model = PaddleOCR(
                     use_angle_cls=True,
                     lang='ch',
+                    **batch_kwargs,
                 )
                 current_app.logger.info("Successfully loaded OCR model with no specific version.")
             except Exception as e:
                 current_app.logger.exception("Failed to load OCR model again: %s", e)
                 self.model = None
 
-    def process_image_batch(self, paths: list[str], batch_size: int = 32) -> list[str | None]:
-        all_texts = []
-        total = len(paths)
-
-        current_app.logger.info(f"Processing {total} images using PaddleOCR Mobile...")
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(self.decode_workers, thread_name_prefix="paddle-ocr-decode")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    @staticmethod
+    def _decode(path: ImageSource) -> np.ndarray:
+        # full resolution, EXIF orientation applied, RGB
+        return np.asarray(decode_for_clip(path, None))
+
+    @staticmethod
+    def _result_text(item) -> str | None:
+        if item is None:
+            return None
+
+        full_text = ""
+        if isinstance(item, dict) and 'rec_texts' in item:
+            text_list = item['rec_texts']
+            valid_texts = [str(t) for t in text_list if t]
+            full_text = " ".join(valid_texts)
+
+        elif isinstance(item, list):
+            lines = []
+            for line in item:
+                if isinstance(line, (list, tuple)) and len(line) >= 2:
+                    content = line[1]
+                    if isinstance(content, (list, tuple)) and len(content) >= 1:
+                        lines.append(str(content[0]))
+                    elif isinstance(content, str):
+                        lines.append(content)
+            full_text = " ".join(lines)
+
+        return full_text.strip()
+
+    def _predict(self, images: list[np.ndarray], paths: list[ImageSource]) -> list[str | None]:
+        """Texts for one batch; if the batch call fails, each image is retried alone."""
+        try:
+            result = self.model.predict(images)
+            if result is not None:
+                result = list(result)
+                if len(result) == len(images):
+                    return [self._result_text(item) for item in result]
+            current_app.logger.warning("PaddleOCR returned %s results for %d images; retrying one by one.",
+                                       "no" if result is None else len(result), len(images))
+        except Exception as e:
+            if len(images) == 1:
+                current_app.logger.warning(f"Error processing {paths[0]}: {e}")
+                return [None]
+            current_app.logger.warning("PaddleOCR batch of %d failed (%s); retrying one by one.", len(images), e)
 
-        for idx, path in enumerate(paths):
+        texts: list[str | None] = []
+        for img, path in zip(images, paths):
             try:
-                img = Image.open(path).convert('RGB')
-                img = ImageOps.exif_transpose(img)
-                img_np = np.array(img)
-  
-                result = self.model.predict(img_np)
-
-                if result is None or len(result) == 0 or result[0] is None:
-                    all_texts.append(None)
-                    continue
-
-                full_text = ""
-                first_item = result[0]
-
-                if isinstance(first_item, dict) and 'rec_texts' in first_item:
-                    text_list = first_item['rec_texts']
-                    valid_texts = [str(t) for t in text_list if t]
-                    full_text = " ".join(valid_texts)
-
-                elif isinstance(first_item, list):
-                    lines = []
-                    for item in first_item:
-                        if isinstance(item, (list, tuple)) and len(item) >= 2:
-                            content = item[1]
-                            if isinstance(content, (list, tuple)) and len(content) >= 1:
-                                lines.append(str(content[0]))
-                            elif isinstance(content, str):
-                                lines.append(content)
-                    full_text = " ".join(lines)
-
-                all_texts.append(full_text.strip())
-
+                result = self.model.predict(img)
+                texts.append(self._result_text(result[0]) if result else None)
             except Exception as e:
                 current_app.logger.warning(f"Error processing {path}: {e}")
-                all_texts.append(None)
-
-            if (idx + 1) % 10 == 0:
-                current_app.logger.info(f"  > Processed {idx + 1}/{total}...")
+                texts.append(None)
+        return texts
 
+    def process_image_batch(self, paths: list[ImageSource], batch_size: int | None = None) -> list[str | None]:
+        """OCR `paths` in batches of `batch_size` (default `self.det_bs`) images per `predict` call.
+        Aligned with `paths`; stage timings of the last call are kept in `self.last_timings`."""
+        total = len(paths)
+        bs = max(1, int(batch_size or self.det_bs))
+
+        current_app.logger.info(f"Processing {total} images using PaddleOCR Mobile (batch size {bs})...")
+
+        pool = self._get_pool()
+
+        def submit_decode(start: int) -> list[Future]:
+            return [pool.submit(self._decode, p) for p in paths[start:start + bs]]
+
+        timings = {"decode_wait": 0.0, "inference": 0.0}
+        wall_st = perf_counter()
+        all_texts: list[str | None] = [None] * total
+        next_decode = submit_decode(0) if total else []
+        for start in range(0, total, bs):
+            futures = next_decode
+            # prefetch: the next batch decodes while this one is in the model
+            next_decode = submit_decode(start + bs) if start + bs < total else []
+
+            st = perf_counter()
+            valid_idx, images = [], []
+            for j, fut in enumerate(futures):
+                try:
+                    images.append(fut.result())
+                    valid_idx.append(start + j)
+                except Exception as e:
+                    current_app.logger.warning(f"Error processing {paths[start + j]}: {e}")
+            timings["decode_wait"] += perf_counter() - st
+            if not images:
+                continue
+
+            st = perf_counter()
+            texts = self._predict(images, [paths[j] for j in valid_idx])
+            timings["inference"] += perf_counter() - st
+            for j, text in zip(valid_idx, texts):
+                all_texts[j] = text
+
+            done = min(start + bs, total)
+            if done // 10 > start // 10:
+                current_app.logger.info(f"  > Processed {done}/{total}...")
+
+        timings = {k: round(v, 4) for k, v in timings.items()}
+        timings["total"] = round(perf_counter() - wall_st, 4)
+        timings["images"] = total
+        self.last_timings = timings
+        current_app.logger.info("PaddleOCR batch complete: %d images in %.2fs (decode wait %.2fs, inference %.2fs).",
+                                total, timings["total"], timings["decode_wait"], timings["inference"])
         return all_texts
 
-    def process_image(self, path: str) -> str | None:
+    def process_image(self, path: ImageSource) -> str | None:
         res = self.process_image_batch([path], batch_size=1)
         return res[0] if res else None
 
@@ -108,11 +203,18 @@ class OCRPipeline:
 def _initialize_pipeline() -> OCRPipeline:
     return OCRPipeline(
         model_name=current_app.config.get("OCR_PADDLE_MODEL_NAME", "PP-OCRv4"),
+        det_bs=current_app.config.get("OCR_PADDLE_DET_BATCH_SIZE", 4),
+        rec_bs=current_app.config.get("OCR_PADDLE_REC_BATCH_SIZE", 16),
+        decode_workers=current_app.config.get("OCR_DECODE_WORKERS", 0),
     )
 
 
-def ocr_extract_from_image_path(image_path: str) -> str | None:
+def ocr_extract_from_image_path(image_path: ImageSource, checksum: str | None = None) -> str | None:
     global _PIPELINE
+    if checksum and reuse_enabled():
+        found = find_ocr_texts([checksum], _reuse_key())
+        if checksum in found:
+            return found[checksum]
     if _PIPELINE is None:
        _PIPELINE = _initialize_pipeline()
     if _PIPELINE.model is None:
@@ -122,18 +224,34 @@ def ocr_extract_from_image_path(image_path: str) -> str | None:
     return _PIPELINE.process_image(image_path)
 
 
-def ocr_extract_from_image_path_batch(image_paths: list[str], batch_size: int = 32) -> list[str | None]:
+def ocr_extract_from_image_path_batch(
+    image_paths: list[ImageSource], batch_size: int | None = None, checksums: list[str | None] | None = None
+) -> list[str | None]:
+    """With `checksums` (aligned with `image_paths`), stored texts of identical files are reused and only
+    the rest go through the model."""
     global _PIPELINE
 
     total_images = len(image_paths)
+    reused: dict[str, str | None] = {}
+    if checksums and reuse_enabled():
+        reused = find_ocr_texts(checksums, _reuse_key())
+    todo = [i for i in range(total_images) if not checksums or checksums[i] not in reused]
+    if reused and not todo:
+        return [reused[c] for c in checksums]
 
     if _PIPELINE is None:
         _PIPELINE = _initialize_pipeline()
     if _PIPELINE.model is None:
         current_app.logger.error("OCR model is not loaded.")
-        return [None] * total_images
+        return [reused.get(c) for c in checksums] if reused else [None] * total_images
 
-    return _PIPELINE.process_image_batch(image_paths, batch_size=batch_size)
+    if not reused:
+        return _PIPELINE.process_image_batch(image_paths, batch_size=batch_size)
+    results = [reused.get(c) for c in checksums]
+    texts = _PIPELINE.process_image_batch([image_paths[i] for i in todo], batch_size=batch_size)
+    for i, text in zip(todo, texts):
+        results[i] = text
+    return results
 
 
 def get_arch_name() -> str | None:
@@ -141,3 +259,18 @@ def get_arch_name() -> str | None:
     if _PIPELINE is None:
         return None
     return f"{_PIPELINE.model_name}"
+
+
+def _reuse_key() -> str:
+    # reuse key: the loaded model, or the configured one before the model is loaded
+    if _PIPELINE is not None:
+        return _PIPELINE.model_name
+    return current_app.config.get("OCR_PADDLE_MODEL_NAME", "PP-OCRv4")
+
+
+def get_model_version() -> str | None:
+    """Version stamped on stored OCR text (the PaddleOCR model name); None if the model failed to load, so the
+    empty result of a missing model is never reused."""
+    if _PIPELINE is not None and _PIPELINE.model is None:
+        return None
+    return _reuse_key()
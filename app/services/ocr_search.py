@@ -0,0 +1,421 @@
+"""Full-text index over OCR text (SQLite FTS5 / Postgres tsvector) with CJK bigram tokenization.
+
+`OCRText.text ILIKE '%q%'` scans every row of every user and cannot rank. Here each text is
+pre-tokenized in Python, so both engines see the same terms:
+- Latin / digit runs: NFKC-normalized, casefolded words ("Great Wall" -> great, wall);
+- CJK runs (Han, kana, Hangul): overlapping bigrams ("长城站" -> 长城, 城站), plus each character as a
+  unigram in a separate field so one-character queries still match.
+A query becomes: every word (as a prefix) AND every CJK run as a phrase of its bigrams, restricted to
+the owner's rows.
+
+Engines (`OCR_SEARCH_BACKEND`: auto | fts | like):
+- SQLite: FTS5 table `ocr_fts(owner, tokens, unigrams)`, rowid = image id, ranked by `bm25()` (owner
+  column weighted 0);
+- Postgres: table `ocr_search_docs(image_id, owner_id, tokens tsvector)` with a GIN index, the vector
+  built from the same terms (explicit positions, so no text-search parser / locale is involved),
+  ranked by `ts_rank_cd`;
+- like: the previous ILIKE scan (also the fallback for other databases or SQLite without FTS5).
+The index matches whole words (as prefixes) and CJK bigrams, so a substring inside a word ("wall" in
+OCR text "GRTWALLOF") is not an index hit. With `OCR_SEARCH_SUBSTRING_FALLBACK` (default on), a search
+that finds fewer than top_k rows is filled up by the ILIKE scan (score 0, after the ranked hits), so it
+returns everything the ILIKE search did.
+The engines index bigrams, not the original text, so snippets are rebuilt in Python for the top-k
+rows only: the best window of the original text around the matched terms, with highlight offsets.
+
+The index table is created (and backfilled from `ocr_texts`) on the first search, or with
+`python scripts/rebuild_ocr_search.py`. Afterwards session hooks keep it in sync inside the same
+transaction as the OCR row: OCRText inserts / text changes / deletes and Image deletes. Bulk
+`query.delete()` / `query.update()` bypass the hooks (deleting the Image row still cleans up).
+
+Usage:
+  hits = search_ocr_text(owner_id, "长城 great", top_k=20)   # [{"image_id", "score", "snippet", "highlights"}]
+  rebuild_ocr_search_index()
+"""
+from __future__ import annotations
+import re
+import threading
+import unicodedata
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, text as sql_text
+
+from app.extensions import db
+from app.models import Image, OCRText
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_RUN_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+_FTS_TABLE = "ocr_fts"
+_PG_TABLE = "ocr_search_docs"
+_BACKFILL_CHUNK = 5000
+# Postgres tsvector positions are capped at 16383
+_PG_MAX_POS = 16383
+
+_READY: set[str] = set()
+_READY_LOCK = threading.Lock()
+
+
+# --- tokenization ---
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def _runs(text: str):
+    """(run, start, is_cjk) over the normalized text (NFKC may change lengths; offsets refer to it)."""
+    for m in _RUN_RE.finditer(text):
+        run = m.group(0)
+        yield run, m.start(), bool(_CJK_RE.match(run))
+
+
+def index_terms(text: str | None) -> tuple[list[str], list[str]]:
+    """(positional terms: words and CJK bigrams, CJK unigrams) for a document."""
+    terms: list[str] = []
+    unigrams: list[str] = []
+    for run, _, is_cjk in _runs(_normalize(text or "")):
+        if not is_cjk:
+            terms.append(run)
+        elif len(run) == 1:
+            terms.append(run)
+            unigrams.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+            unigrams.extend(run)
+    return terms, unigrams
+
+
+def parse_query(query: str) -> list[tuple[str, list[str]]]:
+    """Query clauses, all required: ("word", [w]) prefix, ("phrase", bigrams), ("char", [c])."""
+    clauses = []
+    for run, _, is_cjk in _runs(_normalize(query)):
+        if not is_cjk:
+            clauses.append(("word", [run]))
+        elif len(run) == 1:
+            clauses.append(("char", [run]))
+        else:
+            clauses.append(("phrase", [run[i:i + 2] for i in range(len(run) - 1)]))
+    return clauses
+
+
+def make_snippet(text: str, clauses: list[tuple[str, list[str]]], width: int = 60) -> tuple[str, list[list[int]]]:
+    """Window of about `width` characters of `text` with the most query matches, and the
+    [start, end) offsets of the matches inside it."""
+    norm = _normalize(text)
+    if len(norm) != len(text):
+        # NFKC changed lengths (e.g. ligatures): offsets would not line up, highlight the normalized text
+        text = norm
+    spans = []
+    words = [c[1][0] for c in clauses if c[0] == "word"]
+    cjk = ["".join([c[1][0]] + [b[1] for b in c[1][1:]]) for c in clauses if c[0] != "word"]
+    for run, start, is_cjk in _runs(norm):
+        if not is_cjk:
+            if any(run.startswith(w) for w in words):
+                spans.append((start, start + len(run)))
+            else:
+                # substring hit of the ILIKE fallback ("wall" in "grtwallof")
+                for w in words:
+                    pos = run.find(w)
+                    if pos > 0:
+                        spans.append((start + pos, start + pos + len(w)))
+            continue
+        for needle in cjk:
+            pos = run.find(needle)
+            while pos >= 0:
+                spans.append((start + pos, start + pos + len(needle)))
+                pos = run.find(needle, pos + 1)
+    spans.sort()
+    merged: list[list[int]] = []
+    for s, e in spans:
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+
+    if not merged:
+        return text[:width], []
+    # window start: the match whose following `width` characters cover the most matches
+    best, best_count = merged[0][0], 0
+    for i, (s, _) in enumerate(merged):
+        count = sum(1 for s2, e2 in merged[i:] if e2 <= s + width)
+        if count > best_count:
+            best, best_count = s, count
+    start = max(0, min(best - width // 4, len(text) - width))
+    end = min(len(text), start + width)
+    highlights = [[max(s, start) - start, min(e, end) - start] for s, e in merged if s < end and e > start]
+    return text[start:end], highlights
+
+
+# --- backends ---
+
+def _backend(conn=None) -> str:
+    mode = str(current_app.config.get("OCR_SEARCH_BACKEND", "auto")).strip().lower()
+    if mode == "like":
+        return "like"
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return "postgresql"
+    if dialect == "sqlite" and _sqlite_has_fts5(conn):
+        return "sqlite"
+    if mode == "fts":
+        current_app.logger.warning("OCR_SEARCH_BACKEND=fts is not available on '%s'; using ILIKE", dialect)
+    return "like"
+
+
+_FTS5: dict[str, bool] = {}
+
+
+def _sqlite_has_fts5(conn=None) -> bool:
+    key = str(db.engine.url)
+    if key not in _FTS5:
+        if conn is not None:
+            # inside a flush: a second pooled connection may be the same DBAPI connection
+            # (in-memory SQLite), and returning it would roll back the caller's transaction
+            options = {row[0] for row in conn.execute(sql_text("PRAGMA compile_options"))}
+        else:
+            with db.engine.connect() as own:
+                options = {row[0] for row in own.execute(sql_text("PRAGMA compile_options"))}
+        _FTS5[key] = "ENABLE_FTS5" in options
+    return _FTS5[key]
+
+
+def _table_exists(conn, backend: str) -> bool:
+    if backend == "sqlite":
+        row = conn.execute(
+            sql_text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": _FTS_TABLE}
+        ).first()
+    else:
+        row = conn.execute(sql_text("SELECT to_regclass(:n)"), {"n": _PG_TABLE}).first()
+        row = row if row and row[0] is not None else None
+    return row is not None
+
+
+def _create_table(conn, backend: str) -> None:
+    if backend == "sqlite":
+        conn.execute(sql_text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {_FTS_TABLE} USING fts5("
+            "owner, tokens, unigrams, tokenize = 'unicode61 remove_diacritics 0')"
+        ))
+    else:
+        conn.execute(sql_text(
+            f"CREATE TABLE IF NOT EXISTS {_PG_TABLE} ("
+            "image_id INTEGER PRIMARY KEY REFERENCES images(id) ON DELETE CASCADE, "
+            "owner_id INTEGER NOT NULL, tokens TSVECTOR NOT NULL)"
+        ))
+        conn.execute(sql_text(f"CREATE INDEX IF NOT EXISTS ix_{_PG_TABLE}_tokens ON {_PG_TABLE} USING GIN (tokens)"))
+        conn.execute(sql_text(f"CREATE INDEX IF NOT EXISTS ix_{_PG_TABLE}_owner ON {_PG_TABLE} (owner_id)"))
+
+
+def _tsvector(terms: list[str], unigrams: list[str]) -> str:
+    positions: dict[str, list[str]] = {}
+    for pos, term in enumerate(terms, start=1):
+        positions.setdefault(term, []).append(str(min(pos, _PG_MAX_POS)))
+    # unigrams after the terms (no phrase can span both), weight D
+    base = len(terms) + 1
+    for pos, char in enumerate(unigrams, start=base):
+        positions.setdefault(char, []).append(f"{min(pos, _PG_MAX_POS)}D")
+    return " ".join(f"'{term}':{','.join(p)}" for term, p in positions.items())
+
+
+def _delete_rows(conn, backend: str, image_ids: list[int]) -> None:
+    if not image_ids:
+        return
+    table, key = (_FTS_TABLE, "rowid") if backend == "sqlite" else (_PG_TABLE, "image_id")
+    for i in range(0, len(image_ids), 500):
+        chunk = image_ids[i:i + 500]
+        params = {f"i{j}": iid for j, iid in enumerate(chunk)}
+        conn.execute(sql_text(f"DELETE FROM {table} WHERE {key} IN ({', '.join(':' + k for k in params)})"), params)
+
+
+def _write_rows(conn, backend: str, rows: list[tuple[int, int, str | None]]) -> None:
+    """Upsert (image_id, owner_id, text) rows; empty text removes the row."""
+    _delete_rows(conn, backend, [iid for iid, _, _ in rows])
+    values = []
+    for image_id, owner_id, text in rows:
+        terms, unigrams = index_terms(text)
+        if not terms:
+            continue
+        if backend == "sqlite":
+            values.append({"id": image_id, "owner": f"o{owner_id}", "tokens": " ".join(terms), "uni": " ".join(unigrams)})
+        else:
+            values.append({"id": image_id, "owner": owner_id, "tokens": _tsvector(terms, unigrams)})
+    if not values:
+        return
+    if backend == "sqlite":
+        stmt = f"INSERT INTO {_FTS_TABLE} (rowid, owner, tokens, unigrams) VALUES (:id, :owner, :tokens, :uni)"
+    else:
+        stmt = f"INSERT INTO {_PG_TABLE} (image_id, owner_id, tokens) VALUES (:id, :owner, CAST(:tokens AS tsvector))"
+    conn.execute(sql_text(stmt), values)
+
+
+def _backfill(conn, backend: str) -> int:
+    total = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(OCRText.image_id, Image.owner_id, OCRText.text)
+            .join(Image, OCRText.image_id == Image.id)
+            .where(OCRText.image_id > last_id, OCRText.text.is_not(None))
+            .order_by(OCRText.image_id)
+            .limit(_BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            return total
+        _write_rows(conn, backend, [tuple(r) for r in rows])
+        total += len(rows)
+        last_id = rows[-1][0]
+
+
+def ensure_ocr_search_index(rebuild: bool = False) -> str:
+    """Create (and backfill) the index table for the configured backend if needed; returns the backend."""
+    backend = _backend()
+    if backend == "like":
+        return backend
+    key = f"{db.engine.url}:{backend}"
+    with _READY_LOCK:
+        if key in _READY and not rebuild:
+            return backend
+        with db.engine.begin() as conn:
+            exists = _table_exists(conn, backend)
+            if rebuild and exists:
+                conn.execute(sql_text(f"DROP TABLE {_FTS_TABLE if backend == 'sqlite' else _PG_TABLE}"))
+                exists = False
+            if not exists:
+                _create_table(conn, backend)
+                count = _backfill(conn, backend)
+                current_app.logger.info("Built OCR search index (%s) over %d OCR rows", backend, count)
+        _READY.add(key)
+    return backend
+
+
+def rebuild_ocr_search_index() -> str:
+    return ensure_ocr_search_index(rebuild=True)
+
+
+# --- search ---
+
+def _match_sqlite(owner_id: int, clauses) -> str:
+    parts = [f'owner : "o{int(owner_id)}"']
+    for kind, terms in clauses:
+        if kind == "word":
+            parts.append(f'tokens : "{terms[0]}"*')
+        elif kind == "phrase":
+            parts.append(f'tokens : "{" ".join(terms)}"')
+        else:
+            parts.append(f'unigrams : "{terms[0]}"')
+    return " AND ".join(parts)
+
+
+def _tsquery(clauses) -> str:
+    parts = []
+    for kind, terms in clauses:
+        if kind == "word":
+            parts.append(f"'{terms[0]}':*")
+        elif kind == "phrase":
+            parts.append("(" + " <-> ".join(f"'{t}'" for t in terms) + ")")
+        else:
+            parts.append(f"'{terms[0]}'")
+    return " & ".join(parts)
+
+
+def _search_like(owner_id: int, query: str, top_k: int, exclude=()) -> list[tuple[int, float, str]]:
+    q = (
+        db.session.query(OCRText.image_id, OCRText.text)
+        .join(Image, OCRText.image_id == Image.id)
+        .filter(Image.owner_id == owner_id)
+        .filter(OCRText.text.ilike(f"%{query}%"))
+    )
+    if exclude:
+        q = q.filter(OCRText.image_id.notin_(list(exclude)))
+    rows = q.order_by(OCRText.id.desc()).limit(top_k).all()
+    return [(int(iid), 0.0, txt or "") for iid, txt in rows]
+
+
+def search_ocr_text(owner_id: int, query: str, top_k: int = 20, snippet_width: int = 60) -> list[dict]:
+    """Owner's images whose OCR text matches `query`, best first."""
+    clauses = parse_query(query)
+    backend = ensure_ocr_search_index()
+    if backend == "like" or not clauses:
+        hits = _search_like(owner_id, query, top_k)
+    else:
+        if backend == "sqlite":
+            stmt = (
+                f"SELECT rowid, -bm25({_FTS_TABLE}, 0.0, 1.0, 1.0) AS score FROM {_FTS_TABLE} "
+                f"WHERE {_FTS_TABLE} MATCH :q ORDER BY bm25({_FTS_TABLE}, 0.0, 1.0, 1.0) LIMIT :k"
+            )
+            params = {"q": _match_sqlite(owner_id, clauses), "k": top_k}
+        else:
+            stmt = (
+                f"SELECT image_id, ts_rank_cd(tokens, q) AS score FROM {_PG_TABLE}, CAST(:q AS tsquery) q "
+                "WHERE owner_id = :o AND tokens @@ q ORDER BY score DESC LIMIT :k"
+            )
+            params = {"q": _tsquery(clauses), "o": owner_id, "k": top_k}
+        ranked = db.session.execute(sql_text(stmt), params).all()
+        texts = dict(
+            db.session.query(OCRText.image_id, OCRText.text)
+            .filter(OCRText.image_id.in_([int(r[0]) for r in ranked]))
+            .all()
+        ) if ranked else {}
+        hits = [(int(iid), float(score), texts.get(int(iid)) or "") for iid, score in ranked]
+        if len(hits) < top_k and current_app.config.get("OCR_SEARCH_SUBSTRING_FALLBACK", True):
+            # substrings inside words are not index terms: fill up with the ILIKE matches
+            hits += _search_like(owner_id, query, top_k - len(hits), exclude=[h[0] for h in hits])
+
+    results = []
+    for image_id, score, txt in hits:
+        snippet, highlights = make_snippet(txt, clauses, width=snippet_width)
+        results.append({"image_id": image_id, "score": round(score, 4), "snippet": snippet, "highlights": highlights})
+    return results
+
+
+# --- session hooks: keep the index in sync with OCR rows ---
+
+def _sync_ocr_rows(session, flush_context) -> None:
+    """after_flush: apply OCRText inserts / text changes / deletes and Image deletes to the index."""
+    upserts: dict[int, str | None] = {}
+    deleted: set[int] = set()
+    for obj in session.new:
+        if isinstance(obj, OCRText):
+            upserts[obj.image_id] = obj.text
+    for obj in session.dirty:
+        if isinstance(obj, OCRText) and inspect(obj).attrs.text.history.has_changes():
+            upserts[obj.image_id] = obj.text
+    for obj in session.deleted:
+        if isinstance(obj, OCRText):
+            deleted.add(obj.image_id)
+        elif isinstance(obj, Image) and obj.id is not None:
+            deleted.add(obj.id)
+    if not upserts and not deleted:
+        return
+    if not has_app_context():
+        return
+    try:
+        conn = session.connection()
+        backend = _backend(conn)
+        if backend == "like":
+            return
+        # the table appears with the first search (which backfills it); nothing to keep in sync before
+        if f"{db.engine.url}:{backend}" not in _READY and not _table_exists(conn, backend):
+            return
+        upserts = {iid: txt for iid, txt in upserts.items() if iid not in deleted}
+
+        def apply() -> None:
+            _delete_rows(conn, backend, sorted(deleted))
+            if upserts:
+                owners = dict(conn.execute(select(Image.id, Image.owner_id).where(Image.id.in_(list(upserts)))).all())
+                _write_rows(conn, backend, [(iid, owners[iid], txt) for iid, txt in upserts.items() if iid in owners])
+
+        if backend == "postgresql":
+            # a failed statement must not abort the caller's transaction
+            with conn.begin_nested():
+                apply()
+        else:
+            apply()
+    except Exception:
+        current_app.logger.warning("Failed to update the OCR search index", exc_info=True)
+
+
+def register_ocr_search_hooks() -> None:
+    """Keep the OCR search index in sync with ORM changes of OCRText rows and Image deletes."""
+    if not event.contains(db.session, "after_flush", _sync_ocr_rows):
+        event.listen(db.session, "after_flush", _sync_ocr_rows)
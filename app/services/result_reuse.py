@@ -0,0 +1,110 @@
+"""Reuse of CLIP embeddings and OCR text across images with the same bytes.
+
+Identical files uploaded by different users (memes, screenshots, the shared base dataset) would each
+run CLIP and OCR again. The stored rows already hold the results, so they double as the cache:
+- embeddings: `Embedding` rows of images with the same `Image.checksum` and `model_version` equal to
+  the CLIP model in use;
+- OCR text: `OCRText` rows of images with the same checksum and `model_version` equal to the OCR
+  architecture in use ("<det_arch> + <reco_arch>", or the PaddleOCR model name) and the OCR_PREFILTER
+  mode (" | pf=heuristic"; nothing when off). Rows written before the column existed (NULL) are never
+  reused. An empty result (text NULL) is reused as well, hence the prefilter mode in the key: an image
+  the prefilter skipped is OCRed again once the prefilter is switched off or changed.
+Rows of other models never match, so switching `CLIP_MODEL_NAME` / `OCR_*_ARCH` falls back to
+inference. Only rows this server's models produced (`source = "pipeline"`) are reused: a vector posted
+to /api/v1/ingest/embedding (`source = "ingest"`) carries whatever `model_version` the client sent,
+and must never reach another user's image. `RESULT_REUSE=false` disables the lookups.
+
+`embed_image_path(_batch)` and `ocr_extract_from_image_path(_batch)` consult these lookups when the
+caller passes checksums; only the misses reach the model.
+
+Usage:
+  found = find_embeddings(["<sha256>", ...], "clip-ViT-B-32")   # {checksum: np.ndarray}
+  found = find_ocr_texts(["<sha256>", ...], "db_mobilenet_v3_large + crnn_mobilenet_v3_large")
+  get_reuse_stats()  # hit/miss counters (None until the first lookup in this worker)
+"""
+from __future__ import annotations
+import threading
+
+import numpy as np
+
+from flask import current_app
+
+from app.extensions import db
+from app.services.embedding_io import from_bytes
+
+SOURCE_PIPELINE = "pipeline"
+SOURCE_INGEST = "ingest"
+_DTYPE_RANK = {"float32": 0, "float16": 1, "int8": 2}
+_STATS: dict[str, dict[str, int]] | None = None
+_STATS_LOCK = threading.Lock()
+
+
+def reuse_enabled() -> bool:
+    return bool(current_app.config.get("RESULT_REUSE", True))
+
+
+def _count(kind: str, hits: int, misses: int) -> None:
+    global _STATS
+    with _STATS_LOCK:
+        if _STATS is None:
+            _STATS = {"embedding": {"hits": 0, "misses": 0}, "ocr": {"hits": 0, "misses": 0}}
+        _STATS[kind]["hits"] += hits
+        _STATS[kind]["misses"] += misses
+
+
+def find_embeddings(checksums, model_version: str) -> dict[str, np.ndarray]:
+    """checksum -> stored embedding of another image with the same bytes, in one query."""
+    from app.models import Image, Embedding
+
+    keys = {c for c in checksums if c}
+    if not keys:
+        return {}
+    rows = (
+        db.session.query(Image.checksum, Embedding.vec, Embedding.dtype)
+        .join(Embedding, Embedding.image_id == Image.id)
+        .filter(Image.checksum.in_(keys), Embedding.model_version == model_version)
+        .filter(Embedding.source == SOURCE_PIPELINE)
+        .all()
+    )
+    # several copies may exist: prefer the least quantized one
+    best: dict[str, tuple[int, bytes, str | None]] = {}
+    for checksum, vec, dtype in rows:
+        rank = _DTYPE_RANK.get(dtype or "float32", len(_DTYPE_RANK))
+        if checksum not in best or rank < best[checksum][0]:
+            best[checksum] = (rank, vec, dtype)
+    found = {checksum: from_bytes(vec, dtype) for checksum, (_, vec, dtype) in best.items()}
+    _count("embedding", len(found), len(keys) - len(found))
+    return found
+
+
+def find_ocr_texts(checksums, model_version: str) -> dict[str, str | None]:
+    """checksum -> stored OCR text (None: no text found) of another image with the same bytes."""
+    from app.models import Image, OCRText
+
+    keys = {c for c in checksums if c}
+    if not keys:
+        return {}
+    rows = (
+        db.session.query(Image.checksum, OCRText.text)
+        .join(OCRText, OCRText.image_id == Image.id)
+        .filter(Image.checksum.in_(keys), OCRText.model_version == model_version)
+        .filter(OCRText.source == SOURCE_PIPELINE)
+        .all()
+    )
+    found: dict[str, str | None] = {}
+    for checksum, text in rows:
+        if checksum not in found or (found[checksum] is None and text is not None):
+            found[checksum] = text
+    _count("ocr", len(found), len(keys) - len(found))
+    return found
+
+
+def get_reuse_stats() -> dict | None:
+    with _STATS_LOCK:
+        if _STATS is None:
+            return None
+        out = {}
+        for kind, c in _STATS.items():
+            total = c["hits"] + c["misses"]
+            out[kind] = {**c, "hit_rate": round(c["hits"] / total, 4) if total else 0.0}
+        return out
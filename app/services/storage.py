@@ -1,5 +1,116 @@
-"""Object storage client placeholder (e.g., local/MinIO/S3)."""
+"""File storage: content-addressed local blobs, plus an object storage client placeholder (MinIO/S3).
+
+Local uploads are stored once per content checksum under UPLOAD_DIR:
+  UPLOAD_DIR/cas/<sha256[:2]>/<sha256><ext>   ->   storage_uri "local://cas/<sha256[:2]>/<sha256><ext>"
+Image rows with the same bytes (re-uploads, other owners) share the blob. Its reference count is the
+number of Image rows with that storage_uri; `release_blob` removes the file once the last row is gone.
+Legacy uploads ("local://<uuid><ext>") resolve and release the same way.
+
+Writers call `ensure_blob` again after committing their Image row: a concurrent `release_blob` of the
+last previous reference may have removed the file in between, and the second call puts it back.
+`release_blob` renames the file aside before recounting, so it never removes a blob a committed row
+points to.
+
+Usage:
+  uri = put_blob(data, checksum, ".jpg")     # before db.session.commit() of the Image row
+  ensure_blob(uri, data)                     # after the commit
+  path = local_path(uri)
+  release_blob(uri)                          # after the delete of an Image row is committed
+"""
 from __future__ import annotations
+import os
+import uuid
+
+from flask import current_app
+
+from app.extensions import db
+
+LOCAL_PREFIX = "local://"
+CAS_DIR = "cas"
+
+
+def upload_dir() -> str:
+    return current_app.config.get("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
+
+
+def local_path(storage_uri: str) -> str | None:
+    """Absolute path of a local:// storage_uri (None for other schemes)."""
+    if not storage_uri.startswith(LOCAL_PREFIX):
+        return None
+    return os.path.join(upload_dir(), storage_uri[len(LOCAL_PREFIX):])
+
+
+def cas_uri(checksum: str, ext: str = "") -> str:
+    return f"{LOCAL_PREFIX}{CAS_DIR}/{checksum[:2]}/{checksum}{ext}"
+
+
+def blob_uris(checksums) -> dict[str, str]:
+    """checksum -> storage_uri of the existing content-addressed blob, in one query."""
+    from app.models import Image
+
+    checksums = list(set(checksums))
+    if not checksums:
+        return {}
+    rows = (
+        db.session.query(Image.checksum, Image.storage_uri)
+        .filter(Image.checksum.in_(checksums), Image.storage_uri.startswith(f"{LOCAL_PREFIX}{CAS_DIR}/"))
+        .distinct()
+        .all()
+    )
+    return {checksum: uri for checksum, uri in rows}
+
+
+def ensure_blob(storage_uri: str, data: bytes) -> bool:
+    """Write `data` at `storage_uri` unless the file exists; returns True if it was written."""
+    path = local_path(storage_uri)
+    if path is None:
+        raise ValueError(f"not a local storage_uri: {storage_uri!r}")
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # readers never see a partial file: write aside, then rename into place
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def put_blob(data: bytes, checksum: str, ext: str = "") -> str:
+    """Store `data` once per checksum; returns the storage_uri (an existing blob keeps its extension)."""
+    uri = blob_uris([checksum]).get(checksum) or cas_uri(checksum, ext)
+    ensure_blob(uri, data)
+    return uri
+
+
+def blob_refcount(storage_uri: str) -> int:
+    from app.models import Image
+
+    return db.session.query(Image.id).filter(Image.storage_uri == storage_uri).count()
+
+
+def release_blob(storage_uri: str) -> bool:
+    """Remove the file of `storage_uri` if no Image row references it any more; returns True if removed.
+
+    Call after the delete is committed. The file is renamed aside first and only then recounted, so an
+    upload that links the blob concurrently either is counted here (the file is restored) or finds the
+    file missing in its post-commit `ensure_blob` and writes it again.
+    """
+    path = local_path(storage_uri)
+    if path is None:
+        return False
+    if blob_refcount(storage_uri) > 0:
+        return False
+    doomed = f"{path}.{uuid.uuid4().hex}.del"
+    try:
+        os.replace(path, doomed)
+    except FileNotFoundError:
+        return False
+    if blob_refcount(storage_uri) > 0:
+        os.replace(doomed, path)
+        return False
+    os.remove(doomed)
+    return True
 
 
 class StorageClient:
@@ -0,0 +1,204 @@
+"""Cache of CLIP text-query embeddings.
+
+Search traffic repeats the same short queries ("cat", "receipt", "beach"), and every miss runs the
+CLIP text tower. Entries are keyed on (model_name, normalized query), so switching `CLIP_MODEL_NAME`
+never serves a vector from another model:
+- in memory: LRU bounded by `TEXT_EMBED_CACHE_SIZE` entries (0 disables the cache);
+- optionally on disk: a SQLite file at `TEXT_EMBED_CACHE_PATH` (e.g. instance/text_embed_cache.sqlite,
+  WAL mode) that survives restarts and is shared by the worker processes; memory misses fall through
+  to it. Rows of other models are purged when the store is opened, and the oldest rows are pruned
+  beyond `TEXT_EMBED_CACHE_DISK_MAX_ENTRIES`.
+
+Normalization (NFKC, whitespace collapsed, casefolded) matches what the CLIP tokenizer does anyway
+(it lowercases and cleans whitespace), so the normalized text is what gets encoded on a miss.
+Disk errors are logged and treated as misses; the cache never fails a search.
+
+Usage:
+- get_text_cache(): the process-wide cache configured from the app config.
+- get_text_cache_stats(): hit/miss counters (None until the first text query in this worker).
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from flask import current_app
+
+
+_CACHE: TextEmbeddingCache | None = None
+# prune the disk store once per this many inserts
+_PRUNE_EVERY = 256
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+class TextEmbeddingCache:
+    """LRU of text embeddings keyed on (model_name, normalized query), with an optional SQLite store.
+
+    Returned vectors are read-only float32 arrays shared between callers.
+    """
+
+    def __init__(self, max_entries: int = 4096, store_path: str | None = None, disk_max_entries: int = 100000) -> None:
+        self.max_entries = int(max_entries)
+        self.store_path = store_path or None
+        self.disk_max_entries = int(disk_max_entries)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        self._purged_models: set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    # --- disk store ---
+
+    def _conn(self) -> sqlite3.Connection | None:
+        """Per-thread connection to the disk store (None when not configured)."""
+        if self.store_path is None:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+            conn = sqlite3.connect(self.store_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS text_embeddings ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (model, query))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _purge_other_models(self, conn: sqlite3.Connection, model_name: str) -> None:
+        # once per model per process: drop vectors left behind by a previous CLIP_MODEL_NAME
+        if model_name in self._purged_models:
+            return
+        self._purged_models.add(model_name)
+        cur = conn.execute("DELETE FROM text_embeddings WHERE model != ?", (model_name,))
+        if cur.rowcount:
+            current_app.logger.info("Text embedding cache: dropped %d rows of other models", cur.rowcount)
+
+    def _disk_get(self, model_name: str, query: str) -> np.ndarray | None:
+        try:
+            conn = self._conn()
+            if conn is None:
+                return None
+            self._purge_other_models(conn, model_name)
+            row = conn.execute(
+                "SELECT dim, vec FROM text_embeddings WHERE model = ? AND query = ?", (model_name, query)
+            ).fetchone()
+        except sqlite3.Error as e:
+            current_app.logger.warning("Text embedding cache read failed: %s", e)
+            return None
+        if row is None or len(row[1]) != int(row[0]) * 4:
+            return None
+        return np.frombuffer(row[1], dtype=np.float32)
+
+    def _disk_put(self, model_name: str, query: str, vec: np.ndarray) -> None:
+        try:
+            conn = self._conn()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO text_embeddings (model, query, dim, vec) VALUES (?, ?, ?, ?)",
+                (model_name, query, int(vec.shape[0]), vec.tobytes()),
+            )
+            self._inserts += 1
+            if self.disk_max_entries > 0 and self._inserts % _PRUNE_EVERY == 0:
+                # rowid grows with insertion order: keep the newest rows
+                conn.execute(
+                    "DELETE FROM text_embeddings WHERE rowid <= "
+                    "(SELECT rowid FROM text_embeddings ORDER BY rowid DESC LIMIT 1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+        except sqlite3.Error as e:
+            current_app.logger.warning("Text embedding cache write failed: %s", e)
+
+    # --- memory LRU ---
+
+    def _remember(self, key: tuple[str, str], vec: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, model_name: str, query: str) -> np.ndarray | None:
+        """Cached embedding of an already normalized query, or None."""
+        if not self.enabled:
+            return None
+        key = (model_name, query)
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vec
+        vec = self._disk_get(model_name, query)
+        if vec is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, vec)
+        with self._lock:
+            self.disk_hits += 1
+        return vec
+
+    def put(self, model_name: str, query: str, vec) -> np.ndarray:
+        """Store the embedding of a normalized query; returns the cached read-only float32 copy."""
+        arr = np.array(vec, dtype=np.float32).reshape(-1)
+        arr.setflags(write=False)
+        if not self.enabled:
+            return arr
+        self._remember((model_name, query), arr)
+        self._disk_put(model_name, query, arr)
+        return arr
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self.store_path is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": ((self.hits + self.disk_hits) / lookups) if lookups else None,
+            }
+
+
+def _initialze_cache() -> TextEmbeddingCache:
+    return TextEmbeddingCache(
+        max_entries=current_app.config.get("TEXT_EMBED_CACHE_SIZE", 4096),
+        store_path=current_app.config.get("TEXT_EMBED_CACHE_PATH") or None,
+        disk_max_entries=current_app.config.get("TEXT_EMBED_CACHE_DISK_MAX_ENTRIES", 100000),
+    )
+
+
+def get_text_cache() -> TextEmbeddingCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = _initialze_cache()
+    return _CACHE
+
+
+def get_text_cache_stats() -> dict | None:
+    if _CACHE is None:
+        return None
+    return _CACHE.stats()
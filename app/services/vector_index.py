@@ -1,19 +1,74 @@
 """FAISS 向量索引封装（按 DESIGN V5 对齐）。
 
 特性：
-- 使用 IndexFlatL2 配合归一化向量，实现余弦等效检索。
+- 使用 L2 度量配合归一化向量，实现余弦等效检索；默认 IndexFlatL2（精确）。
+- 可选 ANN 索引类型：ivf_flat（IVF + 原始向量）、hnsw（HNSW 图）、ivf_pq（IVF + 乘积量化，省内存）。
+  IVF 类在 build 时训练；查询时可调 nprobe / efSearch。数据量不足以训练时自动退回 flat。
+- 可选外部 id：build/push 传入 ids 后，检索直接返回这些 id，reconstruct 按 id 取向量。
+  IVF 类原生存 id（hashtable direct map）；flat / hnsw 包一层 IndexIDMap2。
+- 保存为单个文件：faiss 序列化字节 + 文件尾元数据（dim、model_version、向量数、generation），
+  先写临时文件再 rename 原子替换；faiss.read_index（含 mmap）忽略尾部字节。
+- 可选 mmap 加载（IO_FLAG_MMAP_IFC）：向量/编码直接映射自文件，多进程共享页缓存；映射部分只读，
+  之后 push 的向量进入堆上的 flat 叠加层，检索时合并，save 时写回单个索引文件。
+- 删除：remove(ids) 只记墓碑（O(1)），检索时经 IDSelector 过滤；compacted() / save 时物理删除
+  （flat / IVF 用 remove_ids，HNSW 不支持删除，用保留的向量重建图）。
 - 支持 build / search_topk / search_threshold，与同学提供的实现保持兼容。
 - 延迟导入 numpy 与 faiss，避免在未安装时阻塞应用启动；在调用时给出清晰错误提示。
 """
 from __future__ import annotations
+import math
+import os
+import struct
+import threading
 from typing import List
 
 
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# 训练所需的最少向量数（不足时退回 flat）
+_MIN_TRAIN_SIZE = {"ivf_flat": 1000, "ivf_pq": 10000}
+# 文件尾元数据：meta (dim, count, generation, flags, len(model_version)) + model_version + tail (meta 长度, magic)
+_META_MAGIC = b"WIDXMETA"
+_META = struct.Struct("<IqqBH")
+_META_FLAG_IDS = 1
+_META_TAIL = struct.Struct("<I8s")
+
+
 class FaissVectorIndex:
-    def __init__(self, norm: bool = True):
+    def __init__(
+        self,
+        norm: bool = True,
+        index_type: str = "flat",
+        nlist: int | None = None,
+        pq_m: int | None = None,
+        hnsw_m: int = 32,
+        nprobe: int = 16,
+        ef_search: int = 64,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"不支持的索引类型 {index_type}，可选：{', '.join(INDEX_TYPES)}")
         self.norm = norm
-        self.index = None  # faiss.IndexFlatL2 | None
+        self.index = None  # faiss.Index | None
+        self.mapped = False  # index 是否为只读映射（IO_FLAG_MMAP_IFC）
+        self.overlay = None  # 映射索引之后追加的向量（IndexFlatL2 / IndexIDMap2），位置接在 index 之后
+        self.with_ids = False  # 是否按外部 id 存储（检索返回 id 而非位置）
+        # 已删除但尚未物理移除的 id（未按 id 存储时为位置），检索时过滤
+        self.tombstones: set[int] = set()
+        # 删除后又重新 push 的 id：index 中的旧向量仍过滤，叠加层中的新向量有效（仅按 id 存储时）
+        self.replaced: set[int] = set()
+        self._selector = None  # 墓碑的 IDSelector，墓碑变化后在下次检索时重建
+        self._base_selector = None  # 同上，另含 replaced，用于 index 本身
+        self._tombstone_lock = threading.Lock()
+        # 文件尾元数据（save 写入，load_from_file 读出；无元数据的旧文件 generation 为 None）
+        self.model_version: str | None = None
+        self.generation: int | None = 0
         self.dim: int | None = None
+        self.index_type = index_type
+        self.nlist = nlist  # None: 按数据量自动选择（约 4·sqrt(n)）
+        self.pq_m = pq_m  # None: dim // 8（需整除 dim）
+        self.hnsw_m = hnsw_m
+        # 查询期默认参数，可在每次检索时覆盖
+        self.nprobe = nprobe
+        self.ef_search = ef_search
 
     @staticmethod
     def _need_numpy():
@@ -34,11 +89,12 @@ class FaissVectorIndex:
                 "若使用 pip，可尝试 faiss-cpu，但在 macOS 上推荐 conda-forge。"
             ) from e
 
-    def build(self, vectors) -> None:
+    def build(self, vectors, ids=None) -> None:
         """根据输入向量构建索引。
 
         参数：
         - vectors: 形状为 (n, d) 的二维数组或列表，可被 numpy.asarray 转为 float32。
+        - ids: 可选，长度 n 的整数 id；给出时检索结果为这些 id 而非位置。
         """
         self._need_numpy()
         self._need_faiss()
@@ -55,10 +111,165 @@ class FaissVectorIndex:
             arr = arr / norms
 
         self.dim = int(arr.shape[1])
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.index.add(arr)
+        n = int(arr.shape[0])
+        self.index_type = self.resolve_type(self.index_type, n)
+
+        index = faiss.index_factory(self.dim, self._factory_string(n))
+        if not index.is_trained:
+            # 大库只取样本训练，聚类成本与库大小解耦
+            train = arr
+            max_train = max(self._effective_nlist(n) * 64, 256 * 64)
+            if n > max_train:
+                rng = np.random.default_rng(0)
+                train = arr[rng.choice(n, size=max_train, replace=False)]
+            index.train(train)
+        self.with_ids = ids is not None
+        if self.with_ids:
+            if not self._is_ivf():
+                # IndexIDMap2 只能包装空索引，训练后、add 之前包装
+                index = faiss.IndexIDMap2(index)
+            index.add_with_ids(arr, self._as_ids(ids, n))
+        else:
+            index.add(arr)
+        self.index = index
+        self.overlay = None
+        self.mapped = False
+        self.tombstones = set()
+        self.replaced = set()
+        self._selector = None
+        self._base_selector = None
+        self._prepare_index()
+
+    @staticmethod
+    def resolve_type(index_type: str, n: int) -> str:
+        """n 条向量实际会建成的索引类型（训练数据不足时为 flat）。"""
+        return "flat" if n < _MIN_TRAIN_SIZE.get(index_type, 0) else index_type
+
+    def _effective_nlist(self, n: int) -> int:
+        nlist = self.nlist or int(4 * math.sqrt(max(n, 1)))
+        # 每个聚类至少约 39 个训练点
+        return max(1, min(nlist, n // 39))
+
+    def _effective_pq_m(self) -> int:
+        m = self.pq_m or max(1, self.dim // 8)
+        while self.dim % m:
+            m -= 1
+        return m
+
+    @staticmethod
+    def _as_ids(ids, n: int):
+        import numpy as np
+
+        arr = np.ascontiguousarray(np.asarray(ids, dtype="int64").reshape(-1))
+        if arr.shape[0] != n:
+            raise ValueError(f"ids 数量 {arr.shape[0]} 与向量数 {n} 不一致")
+        return arr
+
+    def _factory_string(self, n: int) -> str:
+        if self.index_type == "ivf_flat":
+            return f"IVF{self._effective_nlist(n)},Flat"
+        if self.index_type == "hnsw":
+            return f"HNSW{int(self.hnsw_m)}"
+        if self.index_type == "ivf_pq":
+            return f"IVF{self._effective_nlist(n)},PQ{self._effective_pq_m()}x8"
+        return "Flat"
+
+    def _is_ivf(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq")
+
+    def _prepare_index(self) -> None:
+        """IVF 类建立 direct map，使 reconstruct 可用（按 id 存储时为 hashtable，可按 id 查找与删除）。"""
+        import faiss
+
+        if self._is_ivf():
+            try:
+                ivf = faiss.extract_index_ivf(self.index)
+                kind = faiss.DirectMap.Hashtable if self.with_ids else faiss.DirectMap.Array
+                if ivf.direct_map.type != kind:
+                    ivf.set_direct_map_type(kind)
+            except Exception:
+                pass
+
+    def _search_params(self, nprobe: int | None = None, ef_search: int | None = None):
+        """按索引类型生成单次检索参数（线程安全，不修改索引本身）；有墓碑时附带过滤器。"""
+        import faiss
+
+        sel = self._tombstone_selector(base=True)
+        extra = {"sel": sel} if sel is not None else {}
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            return faiss.SearchParametersIVF(nprobe=int(nprobe or self.nprobe), **extra)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=int(ef_search or self.ef_search), **extra)
+        return faiss.SearchParameters(**extra) if extra else None
+
+    def _overlay_params(self):
+        import faiss
+
+        sel = self._tombstone_selector()
+        return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+    def _tombstone_selector(self, base: bool = False):
+        """排除墓碑的 IDSelector（无墓碑时为 None）；base=True 时另排除 replaced。按需重建，代价 O(墓碑数)。"""
+        import faiss
+        import numpy as np
+
+        with self._tombstone_lock:
+            dead = self.tombstones | self.replaced if base else self.tombstones
+            if not dead:
+                return None
+            attr = "_base_selector" if base else "_selector"
+            if getattr(self, attr) is None:
+                batch = faiss.IDSelectorBatch(np.fromiter(dead, dtype="int64", count=len(dead)))
+                sel = faiss.IDSelectorNot(batch)
+                sel.referenced_objects = [batch]  # 保持 batch 存活
+                setattr(self, attr, sel)
+            return getattr(self, attr)
+
+    def remove(self, ids) -> int:
+        """标记删除（墓碑）；返回新增墓碑数。向量在 compacted() 时才物理移除。"""
+        with self._tombstone_lock:
+            before = len(self.tombstones)
+            self.tombstones.update(int(i) for i in ids)
+            added = len(self.tombstones) - before
+            if added:
+                self._selector = None
+                self._base_selector = None
+        return added
+
+    def _revive(self, ids) -> None:
+        """重新 push 已删除的 id（调用方随后把新向量写入叠加层）。
+
+        叠加层中的旧向量直接删除（叠加层很小）；index 中的旧向量记入 replaced，检索时继续过滤，
+        compacted() 时物理删除，不必重写 index。
+        """
+        import faiss
+        import numpy as np
+
+        with self._tombstone_lock:
+            if self.overlay is not None and self.overlay.ntotal > 0:
+                self.overlay.remove_ids(faiss.IDSelectorBatch(np.fromiter(ids, dtype="int64", count=len(ids))))
+            self.tombstones.difference_update(ids)
+            self.replaced.update(ids)
+            self._selector = None
+            self._base_selector = None
+
+    @staticmethod
+    def _detect_type(index) -> str:
+        import faiss
 
-    def push(self, vectors) -> None:
+        base = faiss.downcast_index(index)
+        if isinstance(base, faiss.IndexIDMap2):
+            base = faiss.downcast_index(base.index)
+        if isinstance(base, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(base, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(base, faiss.IndexIVF):
+            return "ivf_flat"
+        return "flat"
+
+    def push(self, vectors, ids=None) -> None:
+        """追加向量；IndexIDMap2 索引必须同时给出 ids。"""
         self._need_numpy()
         self._need_faiss()
         import numpy as np
@@ -79,18 +290,84 @@ class FaissVectorIndex:
 
         if self.dim != int(arr.shape[1]):
             raise ValueError("vector 的维度和当前 Index 不符合")
+        if self.with_ids and ids is None:
+            raise ValueError("该索引按 id 存储，push 需要提供 ids")
+
+        revived = set()
+        if self.with_ids and self.tombstones:
+            revived = self.tombstones.intersection(self._as_ids(ids, int(arr.shape[0])).tolist())
+        target = self.index
+        if self.mapped or revived:
+            # 映射的数据不可修改（faiss 在 add 时直接 abort），追加到堆上的叠加层；
+            # 重新 push 的已删除 id 也写入叠加层，与 index 中的旧向量区分
+            import faiss
+
+            if revived:
+                self._revive(revived)
+            if self.overlay is None:
+                self.overlay = faiss.IndexFlatL2(self.dim)
+                if self.with_ids:
+                    self.overlay = faiss.IndexIDMap2(self.overlay)
+            target = self.overlay
+        if self.with_ids:
+            target.add_with_ids(arr, self._as_ids(ids, int(arr.shape[0])))
+        else:
+            target.add(arr)
+
+    def ids(self):
+        """索引中全部 id（int64 数组，含叠加层；IVF 类按倒排表顺序）。"""
+        import faiss
+        import numpy as np
 
-        self.index.add(arr)
+        if not self.with_ids:
+            raise ValueError("索引未按 id 存储")
+        if self._is_ivf():
+            invlists = faiss.extract_index_ivf(self.index).invlists
+            parts = [
+                faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy()
+                for i in range(invlists.nlist)
+                if invlists.list_size(i)
+            ]
+            ids = np.concatenate(parts) if parts else np.empty(0, dtype="int64")
+        else:
+            ids = faiss.vector_to_array(self.index.id_map)
+        if self.overlay is not None and self.overlay.ntotal > 0:
+            ids = np.concatenate([ids, faiss.vector_to_array(self.overlay.id_map)])
+        return ids
+
+    @property
+    def ntotal(self) -> int:
+        """索引中的向量总数（含叠加层）。"""
+        if self.index is None:
+            return 0
+        return int(self.index.ntotal) + (int(self.overlay.ntotal) if self.overlay is not None else 0)
 
-    def search_topk(self, queries, k: int = 10):
+    def _search(self, q, k: int, params):
+        """在 index（及叠加层）上检索并按距离合并，返回 (D, I)。"""
+        import numpy as np
+
+        D, I = self.index.search(q, k, params=params)  # type: ignore[attr-defined]
+        if self.overlay is None or self.overlay.ntotal == 0:
+            return D, I
+        D2, I2 = self.overlay.search(q, min(k, int(self.overlay.ntotal)), params=self._overlay_params())
+        if not self.with_ids:
+            I2 = np.where(I2 >= 0, I2 + int(self.index.ntotal), -1)
+        D = np.hstack([D, D2])
+        I = np.hstack([I, I2])
+        # 缺失位置（-1）的距离为 float 最大值，自然排在最后
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def search_topk(self, queries, k: int = 10, nprobe: int | None = None, ef_search: int | None = None):
         """Top‑K 最近邻检索。
 
         参数：
         - queries: 形状 (nq, d) 的查询矩阵，或一维 (d,) 的单条查询。
         - k: 返回的近邻个数。
+        - nprobe / ef_search: 覆盖 IVF / HNSW 的查询期参数（其他类型忽略）。
 
         返回：
-        - indices: 若 nq>1，形状 (nq, k)；若单条查询，形状 (k,) 的索引数组。
+        - indices: 若 nq>1，形状 (nq, k)；若单条查询，形状 (k,) 的索引数组（按 id 存储时为 id）。
         """
         self._need_numpy()
         self._need_faiss()
@@ -113,13 +390,15 @@ class FaissVectorIndex:
             q = q / norms
 
         # 限制 k 不超过 ntotal
-        k = int(min(k, getattr(self.index, "ntotal", k)))
-        _, I = self.index.search(q, k)  # type: ignore[attr-defined]
+        k = int(min(k, self.ntotal))
+        _, I = self._search(q, k, self._search_params(nprobe, ef_search))
         return I[0] if single else I
 
-    def search_topk_scores(self, queries, k: int = 10):
+    def search_topk_scores(self, queries, k: int = 10, nprobe: int | None = None, ef_search: int | None = None):
         """Top‑K 检索并返回相似度分数（基于归一化余弦）。
 
+        ANN 类型下结果可能少于 k（未命中的位置为 -1），相似度仍按 1 - 0.5·d² 换算；ivf_pq 的距离为量化近似值。
+
         返回：
         - (indices, similarities)
           若单条查询：indices 形状 (k,), similarities 形状 (k,)
@@ -145,37 +424,160 @@ class FaissVectorIndex:
             norms[norms == 0] = 1.0
             q = q / norms
 
-        k = int(min(k, getattr(self.index, "ntotal", k)))
-        D, I = self.index.search(q, k)  # type: ignore[attr-defined]
-        # IndexFlatL2 返回平方 L2 距离；当向量归一化后，cosine = 1 - 0.5 * d2
+        k = int(min(k, self.ntotal))
+        D, I = self._search(q, k, self._search_params(nprobe, ef_search))
+        # L2 类索引返回平方 L2 距离；当向量归一化后，cosine = 1 - 0.5 * d2
         similarities = 1.0 - 0.5 * D
         if single:
             return I[0].astype(int), similarities[0].astype(float)
         return I.astype(int), similarities.astype(float)
 
-    # 持久化（仅索引体；不包含外部的 image_id 映射）
+    # 持久化：单个文件（compacted 后的索引体 + 文件尾元数据），临时文件写完 fsync 后 rename 替换
     def save(self, file_path: str) -> None:
         self._need_faiss()
         if self.index is None:
             raise ValueError("索引尚未构建，无法保存")
         import faiss
-        faiss.write_index(self.index, file_path)
+
+        target = self.compacted()
+        model = (self.model_version or "").encode("utf-8")
+        flags = _META_FLAG_IDS if self.with_ids else 0
+        meta = _META.pack(int(self.dim), target.ntotal, int(self.generation or 0), flags, len(model)) + model
+        tmp_path = f"{file_path}.tmp"
+        faiss.write_index(target.index, tmp_path)
+        with open(tmp_path, "ab") as f:
+            f.write(meta + _META_TAIL.pack(len(meta), _META_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def read_meta(file_path: str) -> dict | None:
+        """读取文件尾元数据（dim、count、generation、with_ids、model_version）；没有元数据时返回 None。"""
+        try:
+            with open(file_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size < _META_TAIL.size:
+                    return None
+                f.seek(size - _META_TAIL.size)
+                meta_len, magic = _META_TAIL.unpack(f.read(_META_TAIL.size))
+                if magic != _META_MAGIC or not _META.size <= meta_len <= size - _META_TAIL.size:
+                    return None
+                f.seek(size - _META_TAIL.size - meta_len)
+                meta = f.read(meta_len)
+        except OSError:
+            return None
+        dim, count, generation, flags, model_len = _META.unpack_from(meta)
+        if _META.size + model_len != meta_len:
+            return None
+        return {
+            "dim": int(dim),
+            "count": int(count),
+            "generation": int(generation),
+            "with_ids": bool(flags & _META_FLAG_IDS),
+            "model_version": meta[_META.size:].decode("utf-8", "replace") or None,
+        }
+
+    def compacted(self) -> "FaissVectorIndex":
+        """叠加层并入、墓碑物理删除后的索引。
+
+        无需处理时返回自身；否则返回新的堆上副本（原索引不变，可继续服务并发检索）。
+        未按 id 存储时，删除会使后续位置前移。
+        """
+        import faiss
+        import numpy as np
+
+        has_overlay = self.overlay is not None and self.overlay.ntotal > 0
+        with self._tombstone_lock:
+            dead = np.fromiter(self.tombstones, dtype="int64", count=len(self.tombstones))
+            replaced = np.fromiter(self.replaced, dtype="int64", count=len(self.replaced))
+        if not has_overlay and dead.size == 0 and replaced.size == 0:
+            return self
+
+        obj = FaissVectorIndex(
+            norm=self.norm,
+            index_type=self.index_type,
+            nlist=self.nlist,
+            pq_m=self.pq_m,
+            hnsw_m=self.hnsw_m,
+            nprobe=self.nprobe,
+            ef_search=self.ef_search,
+        )
+        obj.dim = self.dim
+        obj.with_ids = self.with_ids
+        obj.model_version = self.model_version
+        obj.generation = self.generation
+        # clone_index 仍引用映射内存，序列化往返得到可写副本
+        merged = faiss.deserialize_index(faiss.serialize_index(self.index))
+        base_n = int(merged.ntotal)
+        if replaced.size and self.index_type != "hnsw":
+            # 被替换 id 在 index 中的旧向量（新向量在叠加层，随后并入）
+            self._remove_ids(merged, replaced)
+        if has_overlay:
+            if self.with_ids:
+                flat = faiss.downcast_index(self.overlay.index)
+                merged.add_with_ids(flat.reconstruct_n(0, int(flat.ntotal)), faiss.vector_to_array(self.overlay.id_map))
+            else:
+                merged.add(self.overlay.reconstruct_n(0, int(self.overlay.ntotal)))
+        if self.index_type == "hnsw" and (dead.size or replaced.size):
+            # HNSW 不支持 remove_ids：用保留的向量重建图
+            storage = faiss.downcast_index(merged.index) if self.with_ids else merged  # IndexIDMap2
+            vectors = storage.reconstruct_n(0, int(storage.ntotal))
+            labels = faiss.vector_to_array(merged.id_map) if self.with_ids else np.arange(len(vectors))
+            keep = ~np.isin(labels, dead)
+            keep[:base_n] &= ~np.isin(labels[:base_n], replaced)
+            obj.build(vectors[keep], ids=labels[keep] if self.with_ids else None)
+            return obj
+        if dead.size:
+            self._remove_ids(merged, dead)
+        obj.index = merged
+        obj._prepare_index()
+        return obj
+
+    def _remove_ids(self, index, ids) -> None:
+        """从可写副本 index 中物理删除 ids（HNSW 除外）。"""
+        import faiss
+
+        if self._is_ivf() and self.with_ids:
+            # hashtable direct map 只接受 IDSelectorArray（ids 需在调用期间存活）
+            index.remove_ids(faiss.IDSelectorArray(int(ids.size), faiss.swig_ptr(ids)))
+        else:
+            if self._is_ivf():
+                # array 型 direct map 不支持删除，删后由 _prepare_index 重建
+                faiss.extract_index_ivf(index).make_direct_map(False)
+            index.remove_ids(faiss.IDSelectorBatch(ids))
 
     @classmethod
-    def load_from_file(cls, file_path: str, norm: bool = True):
+    def load_from_file(
+        cls, file_path: str, norm: bool = True, nprobe: int = 16, ef_search: int = 64, mmap: bool = False
+    ):
+        """从文件加载索引（含文件尾元数据；旧格式文件的 generation 为 None）。
+
+        mmap=True 时以 IO_FLAG_MMAP_IFC 映射文件（不拷贝到堆，页缓存在进程间共享）。
+        映射期间文件不可原地改写（save 已使用临时文件 + rename）。
+        """
         cls._need_faiss()
         import faiss
-        idx = faiss.read_index(file_path)
-        obj = cls(norm=norm)
+        idx = faiss.read_index(file_path, faiss.IO_FLAG_MMAP_IFC if mmap else 0)
+        obj = cls(norm=norm, index_type=cls._detect_type(idx), nprobe=nprobe, ef_search=ef_search)
         obj.index = idx
+        obj.mapped = bool(mmap)
+        meta = cls.read_meta(file_path)
+        obj.with_ids = isinstance(idx, faiss.IndexIDMap2) or bool(meta and meta["with_ids"])
+        obj.generation = meta["generation"] if meta else None
+        obj.model_version = meta["model_version"] if meta else None
         # 尝试获取维度
         try:
             obj.dim = int(idx.d)
         except Exception:
             obj.dim = None
+        obj._prepare_index()
         return obj
 
-    def search_threshold(self, queries, threshold: float = 0.8) -> List:
+    def search_threshold(
+        self, queries, threshold: float = 0.8, nprobe: int | None = None, ef_search: int | None = None
+    ) -> List:
         """基于 L2 距离阈值的范围检索。
 
         返回：每个查询对应一个索引数组的列表。
@@ -198,13 +600,47 @@ class FaissVectorIndex:
             norms[norms == 0] = 1.0
             q = q / norms
 
-        lims, D, I = self.index.range_search(q, threshold)  # type: ignore[attr-defined]
+        params = self._search_params(nprobe, ef_search)
+        lims, D, I = self.index.range_search(q, threshold, params=params)  # type: ignore[attr-defined]
         results = []
         for i in range(q.shape[0]):
             start, end = lims[i], lims[i + 1]
             results.append(I[start:end])
+        if self.overlay is not None and self.overlay.ntotal > 0:
+            lims2, _, I2 = self.overlay.range_search(q, threshold, params=self._overlay_params())
+            offset = 0 if self.with_ids else int(self.index.ntotal)
+            for i in range(q.shape[0]):
+                results[i] = np.concatenate([results[i], I2[lims2[i]:lims2[i + 1]] + offset])
         return results
 
+    def reconstruct(self, position: int):
+        """按索引内位置（按 id 存储时为 id）取回已存向量（若 norm=True，则为归一化后的向量）。
+
+        位置越界抛 IndexError；id 不存在抛 KeyError。
+        """
+        self._need_numpy()
+        import numpy as np
+
+        if self.index is None:
+            raise ValueError("索引尚未构建")
+        if int(position) in self.tombstones:
+            raise KeyError(f"{position} 已删除")
+        if self.with_ids:
+            for index in (self.overlay, self.index):
+                if index is None or index.ntotal == 0:
+                    continue
+                try:
+                    return np.asarray(index.reconstruct(int(position)), dtype="float32")
+                except RuntimeError:
+                    continue
+            raise KeyError(f"id {position} 不在索引中")
+        if not 0 <= int(position) < self.ntotal:
+            raise IndexError(f"位置 {position} 超出索引范围")
+        base_n = int(self.index.ntotal)
+        if int(position) >= base_n:
+            return np.asarray(self.overlay.reconstruct(int(position) - base_n), dtype="float32")
+        return np.asarray(self.index.reconstruct(int(position)), dtype="float32")
+
     def get_index(self):
         if self.index is None:
             raise ValueError("索引尚未构建")
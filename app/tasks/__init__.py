@@ -1,12 +1,12 @@
-"""Task registration entrypoint (optional for Celery wiring).
+"""Background task layer.
 
-In a future step, call init_celery(celery_app) to attach tasks.
+Tasks (`process_image`, `compute_embedding`, `run_ocr`, `generate_thumbs`) are plain functions in
+`jobs`. `enqueue(name, *args)` sends them to Celery when `CELERY_BROKER_URL` is reachable and falls
+back to a persistent local SQLite queue with its own worker processes otherwise (see `dispatch`).
+Celery workers: `celery -A app.tasks.celery_worker.celery worker`; `init_celery(celery_app, app)`
+attaches the tasks to an existing Celery app.
 """
+from .celery_app import init_celery
+from .dispatch import enqueue, get_task_stats
 
-try:
-	from .placeholders import init_celery  # type: ignore
-except Exception:  # pragma: no cover - placeholder
-	def init_celery(app):  # type: ignore
-		return None
-
-__all__ = ["init_celery"]
+__all__ = ["init_celery", "enqueue", "get_task_stats"]
@@ -0,0 +1,83 @@
+"""Celery wiring for the tasks in `jobs` (optional dependency).
+
+Workers: `celery -A app.tasks.celery_worker.celery worker --concurrency 2`. Each task runs inside the
+Flask app context, is retried with exponential backoff (`TASK_RETRY_BACKOFF_S`) up to
+`TASK_MAX_ATTEMPTS` attempts, and calls `jobs.task_failed` after the last one. Concurrency is bounded
+by the worker's `--concurrency`; per-task limits can be had by routing tasks to dedicated queues.
+"""
+from __future__ import annotations
+import socket
+from urllib.parse import urlparse
+
+from app.tasks.jobs import TASKS, run_task, task_failed
+
+_DEFAULT_PORTS = {"redis": 6379, "rediss": 6379, "amqp": 5672, "amqps": 5671, "pyamqp": 5672}
+
+
+def broker_reachable(url: str | None, timeout: float = 0.5) -> bool:
+    """True if Celery is installed and a TCP connection to the broker in `url` succeeds."""
+    try:
+        import celery  # noqa: F401
+    except ImportError:
+        return False
+    if not url:
+        return False
+    parsed = urlparse(url)
+    port = parsed.port or _DEFAULT_PORTS.get(parsed.scheme)
+    if not parsed.hostname or port is None:
+        return False
+    try:
+        with socket.create_connection((parsed.hostname, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def init_celery(celery, app=None):
+    """Attach the `jobs` tasks to a Celery app; with `app`, run them inside its app context."""
+    config = app.config if app is not None else {}
+    max_attempts = max(1, int(config.get("TASK_MAX_ATTEMPTS", 3)))
+    backoff = float(config.get("TASK_RETRY_BACKOFF_S", 5.0))
+
+    if app is not None:
+        from app.extensions import db
+
+        class AppContextTask(celery.Task):  # type: ignore[name-defined, misc]
+            def __call__(self, *args, **kwargs):
+                with app.app_context():
+                    try:
+                        return self.run(*args, **kwargs)
+                    finally:
+                        db.session.remove()
+
+        celery.Task = AppContextTask
+
+    def register(name: str):
+        @celery.task(name=name, bind=True, max_retries=max_attempts - 1)  # type: ignore[attr-defined]
+        def task(self, *args):
+            try:
+                return run_task(name, args)
+            except Exception as exc:
+                if self.request.retries >= self.max_retries:
+                    task_failed(name, args, exc)
+                    raise
+                raise self.retry(exc=exc, countdown=backoff * 2 ** self.request.retries)
+
+        return task
+
+    for name in TASKS:
+        register(name)
+    return celery
+
+
+def make_celery(app):
+    """Celery app configured from `CELERY_BROKER_URL` / `CELERY_RESULT_BACKEND`, tasks attached."""
+    from celery import Celery
+
+    celery = Celery(
+        app.import_name,
+        broker=app.config.get("CELERY_BROKER_URL"),
+        backend=app.config.get("CELERY_RESULT_BACKEND"),
+    )
+    celery.conf.update(task_acks_late=True, worker_prefetch_multiplier=1)
+    return init_celery(celery, app)
@@ -0,0 +1,7 @@
+"""Celery worker entrypoint: `celery -A app.tasks.celery_worker.celery worker`."""
+from __future__ import annotations
+from app import create_app
+from app.tasks.celery_app import make_celery
+
+flask_app = create_app()
+celery = make_celery(flask_app)
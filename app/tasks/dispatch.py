@@ -0,0 +1,99 @@
+"""Enqueue tasks on Celery when its broker is reachable, otherwise on the local SQLite queue.
+
+`TASK_BACKEND`: auto (default) | celery | local. With auto the broker check (TCP connect to
+`CELERY_BROKER_URL`, skipped when Celery is not installed) is cached for `TASK_BROKER_CHECK_INTERVAL_S`;
+a failed Celery send falls back to the local queue.
+"""
+from __future__ import annotations
+import os
+import threading
+from time import monotonic
+
+from flask import current_app
+
+from app.tasks.celery_app import broker_reachable, make_celery
+from app.tasks.jobs import TASKS
+from app.tasks.local_queue import LocalTaskQueue, WorkerHost, queue_from_config
+
+
+_STATE_LOCK = threading.Lock()
+_BROKER_CHECK: tuple[float, bool] | None = None
+_CELERY = None
+_QUEUE: LocalTaskQueue | None = None
+_HOST: WorkerHost | None = None
+_HOST_PID: int | None = None
+
+
+def _use_celery() -> bool:
+    global _BROKER_CHECK
+    backend = str(current_app.config.get("TASK_BACKEND", "auto")).lower()
+    if backend in ("local", "celery"):
+        return backend == "celery"
+    interval = float(current_app.config.get("TASK_BROKER_CHECK_INTERVAL_S", 30))
+    now = monotonic()
+    with _STATE_LOCK:
+        if _BROKER_CHECK is not None and now - _BROKER_CHECK[0] < interval:
+            return _BROKER_CHECK[1]
+    reachable = broker_reachable(current_app.config.get("CELERY_BROKER_URL"))
+    with _STATE_LOCK:
+        _BROKER_CHECK = (now, reachable)
+    return reachable
+
+
+def _celery():
+    global _CELERY
+    with _STATE_LOCK:
+        if _CELERY is None:
+            _CELERY = make_celery(current_app._get_current_object())
+        return _CELERY
+
+
+def get_local_queue() -> LocalTaskQueue:
+    global _QUEUE
+    with _STATE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = queue_from_config(current_app.config)
+        return _QUEUE
+
+
+def _ensure_local_workers(queue: LocalTaskQueue) -> None:
+    global _HOST, _HOST_PID
+    if not current_app.config.get("TASK_LOCAL_AUTOSTART", True):
+        return
+    with _STATE_LOCK:
+        # a forked web worker gets its own host object (and competes for the lock like everyone else)
+        if _HOST is None or _HOST_PID != os.getpid():
+            _HOST = WorkerHost(
+                queue,
+                current_app.config.get("TASK_LOCAL_WORKERS", 2),
+                current_app.config,
+                current_app.logger,
+            )
+            _HOST_PID = os.getpid()
+        host = _HOST
+    host.ensure_workers()
+
+
+def enqueue(name: str, *args) -> dict:
+    """Queue task `name(*args)`; returns {"backend", "task_id"}."""
+    if name not in TASKS:
+        raise KeyError(f"unknown task {name!r}")
+    if _use_celery():
+        try:
+            result = _celery().send_task(name, args=list(args))
+            return {"backend": "celery", "task_id": result.id}
+        except Exception as e:
+            current_app.logger.warning("Celery send of %s failed, using the local queue: %s", name, e)
+    queue = get_local_queue()
+    job_id = queue.enqueue(name, args)
+    _ensure_local_workers(queue)
+    return {"backend": "local", "task_id": job_id}
+
+
+def get_task_stats() -> dict | None:
+    if _QUEUE is None:
+        return None
+    stats = {"backend": "local", "jobs": _QUEUE.stats()}
+    if _HOST is not None and _HOST_PID == os.getpid():
+        stats["hosted_workers"] = _HOST.alive()
+    return stats
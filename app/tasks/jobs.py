@@ -0,0 +1,220 @@
+"""Task bodies: plain functions that run inside an app context (Celery task or local queue worker).
+
+A task raises to ask for a retry; `task_failed` is called once the last attempt has failed.
+
+- process_image(image_id): upload pipeline — embed + OCR, then PENDING/PROCESSING → READY in one commit
+  (the index_store status hook pushes the vector into the owner's index).
+- process_images(image_ids): process_image for a chunk of bulk-ingested images (scripts/initialize_base.py),
+  with one batched CLIP and OCR call per chunk.
+- compute_embedding(image_id): (re-)embed one image; READY images are updated in the index in place.
+- run_ocr(image_id): (re-)run OCR and upsert OCRText.
+- generate_thumbs(image_id): JPEG thumbnails under UPLOAD_DIR/thumbs (`THUMB_SIZES`), fills width/height.
+"""
+from __future__ import annotations
+import os
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import Image, Embedding, OCRText
+from app.services.clip_pipeline import embed_image_path, embed_image_path_batch
+from app.services.ocr_pipeline import (
+    get_model_version as get_ocr_model_version,
+    ocr_extract_from_image_path,
+    ocr_extract_from_image_path_batch,
+)
+from app.services.embedding_io import l2_normalize, to_bytes
+from app.services.image_decode import DecodedImage
+from app.services.index_store import push_vector_id_pairs, remove_image_ids
+from app.services.result_reuse import SOURCE_PIPELINE
+from app.services.storage import local_path
+
+
+def _image_file(img: Image) -> str:
+    path = local_path(img.storage_uri or "")
+    if path is None or not os.path.exists(path):
+        raise FileNotFoundError(f"no local file for image {img.id} ({img.storage_uri!r})")
+    return path
+
+
+def _set_embedding(img: Image, vec) -> tuple[Embedding, bool]:
+    """Upsert the image's Embedding row (not committed); returns (row, existed)."""
+    norm_vec = l2_normalize(vec)
+    dtype = current_app.config.get("EMBEDDING_STORAGE_DTYPE", "float32")
+    emb = Embedding.query.filter_by(image_id=img.id).first()
+    existed = emb is not None
+    if emb is None:
+        emb = Embedding(image_id=img.id)
+        db.session.add(emb)
+    emb.vec = to_bytes(norm_vec, dtype)
+    emb.dim = len(norm_vec)
+    emb.dtype = dtype
+    emb.model_version = current_app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+    emb.source = SOURCE_PIPELINE
+    return emb, existed
+
+
+def _set_ocr_text(img: Image, text: str | None) -> None:
+    version = get_ocr_model_version()
+    row = OCRText.query.filter_by(image_id=img.id).first()
+    if row is None:
+        db.session.add(OCRText(image_id=img.id, text=text, avg_confidence=None, model_version=version,
+                               source=SOURCE_PIPELINE))
+    elif text:
+        row.text = text
+        row.model_version = version
+        row.source = SOURCE_PIPELINE
+
+
+def process_image(image_id: int, image: DecodedImage | None = None) -> dict:
+    """Embed + OCR one uploaded image and mark it READY. Idempotent for READY images.
+
+    The file is decoded once and shared by CLIP and OCR; inline callers can pass `image` built from
+    the request bytes to skip reading it back from disk. Stored results of another image with the
+    same checksum are reused instead (services.result_reuse); the file is then never decoded. A missing model only leaves the image without
+    embedding / text (as the synchronous upload did); exceptions are retried and the image is marked
+    FAILED after the last attempt.
+    """
+    img = db.session.get(Image, image_id)
+    if img is None:
+        return {"image_id": image_id, "status": None}
+    if img.status == "READY":
+        return {"image_id": image_id, "status": img.status}
+    img.status = "PROCESSING"
+    db.session.commit()
+
+    try:
+        source = image or DecodedImage(_image_file(img), full=True)
+        # results of an identical file (any owner, same models) are copied without inference
+        vec = embed_image_path(source, checksum=img.checksum)
+        if vec is not None:
+            _set_embedding(img, vec)
+        text = ocr_extract_from_image_path(source, checksum=img.checksum)
+        _set_ocr_text(img, text)
+        # same commit as the rows above: the index hook reads the embedding when the image turns READY
+        img.status = "READY"
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"image_id": image_id, "status": "READY", "has_embedding": vec is not None, "has_ocr_text": text is not None}
+
+
+def process_images(image_ids: list) -> dict:
+    """process_image for a chunk of images: one batched CLIP and OCR call, READY in one commit.
+
+    Images that are gone or already READY are skipped. An exception retries the whole chunk; its images
+    are marked FAILED after the last attempt.
+    """
+    images = [db.session.get(Image, int(i)) for i in image_ids]
+    images = [img for img in images if img is not None and img.status != "READY"]
+    if not images:
+        return {"image_ids": list(image_ids), "processed": 0}
+    for img in images:
+        img.status = "PROCESSING"
+    db.session.commit()
+
+    try:
+        sources = [DecodedImage(_image_file(img), full=True) for img in images]
+        checksums = [img.checksum for img in images]
+        batch_size = current_app.config.get("BASE_UPLOAD_BATCH_SIZE", 32)
+        vecs = embed_image_path_batch(sources, batch_size=batch_size, checksums=checksums) or []
+        texts = ocr_extract_from_image_path_batch(sources, checksums=checksums) or []
+        for j, img in enumerate(images):
+            if j < len(vecs) and vecs[j] is not None:
+                _set_embedding(img, vecs[j])
+            _set_ocr_text(img, texts[j] if j < len(texts) else None)
+            img.status = "READY"
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"image_ids": list(image_ids), "processed": len(images)}
+
+
+def compute_embedding(image_id: int) -> dict:
+    img = db.session.get(Image, image_id)
+    if img is None:
+        return {"image_id": image_id, "skipped": "IMAGE_NOT_FOUND"}
+    vec = embed_image_path(_image_file(img))
+    if vec is None:
+        raise RuntimeError(f"embedding failed for image {image_id}")
+    emb, existed = _set_embedding(img, vec)
+    db.session.commit()
+
+    if img.status == "READY":
+        vector = l2_normalize(vec)
+        if existed:
+            # replace the old vector: tombstone it, the push below revives the id with the new vector
+            # (REMOVE + ADD in the delta log; the base file is rewritten at the next compaction)
+            remove_image_ids(img.owner_id, [img.id])
+        push_vector_id_pairs(img.owner_id, [vector], [img.id], build=False)
+    return {"image_id": image_id, "dim": emb.dim, "replaced": existed}
+
+
+def run_ocr(image_id: int) -> dict:
+    img = db.session.get(Image, image_id)
+    if img is None:
+        return {"image_id": image_id, "skipped": "IMAGE_NOT_FOUND"}
+    text = ocr_extract_from_image_path(_image_file(img))
+    _set_ocr_text(img, text)
+    db.session.commit()
+    return {"image_id": image_id, "has_text": bool(text)}
+
+
+def generate_thumbs(image_id: int) -> dict:
+    from PIL import Image as PILImage, ImageOps
+
+    img = db.session.get(Image, image_id)
+    if img is None:
+        return {"image_id": image_id, "skipped": "IMAGE_NOT_FOUND"}
+    path = _image_file(img)
+    sizes = current_app.config.get("THUMB_SIZES", [256])
+    thumb_dir = os.path.join(current_app.config.get("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads")), "thumbs")
+    os.makedirs(thumb_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    written = []
+    with PILImage.open(path) as src:
+        img.width, img.height = src.size
+        # JPEG: let the decoder downscale by up to 8x while reading
+        src.draft("RGB", (max(sizes), max(sizes)))
+        base = ImageOps.exif_transpose(src).convert("RGB")
+    for size in sorted(sizes, reverse=True):
+        thumb = base.copy()
+        thumb.thumbnail((size, size))
+        out = os.path.join(thumb_dir, f"{stem}_{size}.jpg")
+        thumb.save(out + ".tmp", "JPEG", quality=85)
+        os.replace(out + ".tmp", out)
+        written.append(out)
+    db.session.commit()
+    return {"image_id": image_id, "thumbs": written}
+
+
+TASKS = {
+    "process_image": process_image,
+    "process_images": process_images,
+    "compute_embedding": compute_embedding,
+    "run_ocr": run_ocr,
+    "generate_thumbs": generate_thumbs,
+}
+
+
+def run_task(name: str, args: list | tuple) -> dict:
+    fn = TASKS.get(name)
+    if fn is None:
+        raise KeyError(f"unknown task {name!r}")
+    return fn(*args)
+
+
+def task_failed(name: str, args: list | tuple, exc: BaseException) -> None:
+    """Called once a task has used up its attempts."""
+    current_app.logger.error("Task %s%s failed permanently: %s", name, tuple(args), exc)
+    if name in ("process_image", "process_images") and args:
+        db.session.rollback()
+        image_ids = args[0] if name == "process_images" else [args[0]]
+        for image_id in image_ids:
+            img = db.session.get(Image, int(image_id))
+            if img is not None and img.status != "READY":
+                img.status = "FAILED"
+        db.session.commit()
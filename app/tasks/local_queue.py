@@ -0,0 +1,280 @@
+"""Persistent local task queue (SQLite) with worker processes, retries and concurrency limits.
+
+Used when no Celery broker is reachable. Jobs are rows in `TASK_QUEUE_PATH` (WAL mode), so they
+survive restarts and can be enqueued from every web worker:
+- claim: one `BEGIN IMMEDIATE` transaction picks the oldest due job whose task is below its
+  `TASK_CONCURRENCY` limit (e.g. `run_ocr=1`) and leases it to the worker;
+- failure: the job is re-queued with exponential backoff (`TASK_RETRY_BACKOFF_S` · 2^(attempt-1)) until
+  `TASK_MAX_ATTEMPTS`, then marked failed and `jobs.task_failed` runs;
+- crashed workers: their jobs are re-queued when the worker is respawned, and any lease older than
+  `TASK_LEASE_TIMEOUT_S` is re-queued at the next claim.
+
+`TASK_LOCAL_WORKERS` worker processes (spawn start method, each with its own app and models) are
+hosted by one process per queue file, elected with an flock on `<queue>.lock`: with
+`TASK_LOCAL_AUTOSTART` the first web process that enqueues takes over and respawns dead workers;
+otherwise run `python scripts/run_task_workers.py`.
+"""
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+import multiprocessing as mp
+from time import sleep, time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore[assignment]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_available ON jobs (status, available_at);
+"""
+
+# a job whose worker keeps dying still runs out of attempts
+_REQUEUE_STATUS = "CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END"
+
+_CONFIG_TYPES = (str, int, float, bool, list, tuple, dict, type(None))
+# idle workers poll at this interval (seconds)
+_POLL_INTERVAL = 0.5
+
+
+def parse_concurrency(spec) -> dict[str, int]:
+    """`"run_ocr=1,compute_embedding=2"` (or a dict) → {task: max running jobs}."""
+    if isinstance(spec, dict):
+        return {str(k): int(v) for k, v in spec.items()}
+    limits = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        if sep and name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class LocalTaskQueue:
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+        lease_timeout: float = 900.0,
+        concurrency: dict[str, int] | None = None,
+    ) -> None:
+        self.path = path
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = float(retry_backoff)
+        self.lease_timeout = float(lease_timeout)
+        self.concurrency = dict(concurrency or {})
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, name: str, args: list | tuple = (), max_attempts: int | None = None, delay: float = 0.0) -> int:
+        now = time()
+        cur = self._conn().execute(
+            "INSERT INTO jobs (name, args, max_attempts, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, json.dumps(list(args)), int(max_attempts or self.max_attempts), now + delay, now, now),
+        )
+        return int(cur.lastrowid)
+
+    def claim(self, worker_id: str) -> tuple[int, str, list, int, int] | None:
+        """Lease the next due job to `worker_id`: (id, name, args, attempt, max_attempts) or None."""
+        conn = self._conn()
+        now = time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # expired leases (worker hung or died without its host noticing) go back to the queue
+            conn.execute(
+                f"UPDATE jobs SET status = {_REQUEUE_STATUS}, locked_by = NULL, updated_at = ? "
+                "WHERE status = 'running' AND locked_at < ?",
+                (now, now - self.lease_timeout),
+            )
+            blocked = []
+            if self.concurrency:
+                running = dict(conn.execute(
+                    "SELECT name, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY name"
+                ).fetchall())
+                blocked = [n for n, limit in self.concurrency.items() if running.get(n, 0) >= limit]
+            sql = "SELECT id, name, args, attempts, max_attempts FROM jobs WHERE status = 'queued' AND available_at <= ?"
+            if blocked:
+                sql += f" AND name NOT IN ({','.join('?' * len(blocked))})"
+            row = conn.execute(sql + " ORDER BY available_at, id LIMIT 1", (now, *blocked)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, name, args, attempts, max_attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (worker_id, now, now, job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return int(job_id), name, json.loads(args), int(attempts) + 1, int(max_attempts)
+
+    def complete(self, job_id: int) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', locked_by = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+            (time(), job_id),
+        )
+
+    def fail(self, job_id: int, attempt: int, max_attempts: int, error: str) -> bool:
+        """Record a failed attempt; True if the job was re-queued for another try."""
+        now = time()
+        retry = attempt < max_attempts
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, available_at = ?, locked_by = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+            ("queued" if retry else "failed", now + self.retry_backoff * 2 ** (attempt - 1), error[:2000], now, job_id),
+        )
+        return retry
+
+    def requeue_worker(self, worker_id: str) -> int:
+        """Put the jobs leased by a dead worker back in the queue."""
+        cur = self._conn().execute(
+            f"UPDATE jobs SET status = {_REQUEUE_STATUS}, locked_by = NULL, updated_at = ? "
+            "WHERE status = 'running' AND locked_by = ?",
+            (time(), worker_id),
+        )
+        return cur.rowcount
+
+    def get(self, job_id: int) -> dict | None:
+        row = self._conn().execute(
+            "SELECT id, name, args, status, attempts, max_attempts, last_error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "name", "args", "status", "attempts", "max_attempts", "last_error")
+        job = dict(zip(keys, row))
+        job["args"] = json.loads(job["args"])
+        return job
+
+    def stats(self) -> dict:
+        counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {s: int(counts.get(s, 0)) for s in ("queued", "running", "done", "failed")}
+
+
+# --- worker processes ---
+
+def _worker_main(queue_path: str, config: dict, worker_id: str, parent_pid: int) -> None:
+    from app import create_app
+    from app.extensions import db
+    from app.tasks.jobs import run_task, task_failed
+
+    app = create_app(overrides=config)
+    with app.app_context():
+        queue = queue_from_config(app.config)
+        while os.getppid() == parent_pid:
+            job = queue.claim(worker_id)
+            if job is None:
+                sleep(_POLL_INTERVAL)
+                continue
+            job_id, name, args, attempt, max_attempts = job
+            try:
+                run_task(name, args)
+            except Exception as e:
+                app.logger.warning("Task %s%s attempt %d/%d failed: %s", name, tuple(args), attempt, max_attempts, e)
+                if not queue.fail(job_id, attempt, max_attempts, f"{type(e).__name__}: {e}"):
+                    try:
+                        task_failed(name, args, e)
+                    except Exception:
+                        app.logger.exception("task_failed handler for %s raised", name)
+            else:
+                queue.complete(job_id)
+            finally:
+                db.session.remove()
+
+
+class WorkerHost:
+    """Runs the worker processes for one queue file; at most one host per file (flock)."""
+
+    def __init__(self, queue: LocalTaskQueue, workers: int, config: dict, logger=None) -> None:
+        self.queue = queue
+        self.logger = logger
+        self.workers = max(1, int(workers))
+        self.config = {k: v for k, v in config.items() if isinstance(v, _CONFIG_TYPES)}
+        self.procs: dict[int, tuple[str, mp.process.BaseProcess]] = {}
+        self._spawned = 0
+        self._lock_fd: int | None = None
+        self._pid = os.getpid()
+        self._mutex = threading.Lock()
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return False
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.queue.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def ensure_workers(self) -> bool:
+        """Become the host if nobody is, then (re)start missing workers. False if another process hosts."""
+        with self._mutex:
+            if not self.acquire():
+                return False
+            ctx = mp.get_context("spawn")
+            for slot in range(self.workers):
+                entry = self.procs.get(slot)
+                if entry is not None and entry[1].is_alive():
+                    continue
+                if entry is not None:
+                    requeued = self.queue.requeue_worker(entry[0])
+                    if requeued and self.logger is not None:
+                        self.logger.warning("Task worker %s died; re-queued %d job(s)", entry[0], requeued)
+                self._spawned += 1
+                worker_id = f"{self._pid}-{slot}-{self._spawned}"
+                proc = ctx.Process(
+                    target=_worker_main,
+                    args=(self.queue.path, self.config, worker_id, self._pid),
+                    name=f"task-worker-{slot}",
+                    daemon=True,
+                )
+                proc.start()
+                self.procs[slot] = (worker_id, proc)
+            return True
+
+    def alive(self) -> int:
+        return sum(1 for _, proc in self.procs.values() if proc.is_alive())
+
+
+def queue_from_config(config) -> LocalTaskQueue:
+    return LocalTaskQueue(
+        path=config.get("TASK_QUEUE_PATH") or os.path.join(os.getcwd(), "instance", "tasks.sqlite"),
+        max_attempts=config.get("TASK_MAX_ATTEMPTS", 3),
+        retry_backoff=config.get("TASK_RETRY_BACKOFF_S", 5.0),
+        lease_timeout=config.get("TASK_LEASE_TIMEOUT_S", 900.0),
+        concurrency=parse_concurrency(config.get("TASK_CONCURRENCY", "")),
+    )
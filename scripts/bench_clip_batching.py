@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Load test of CLIP micro-batching: throughput and latency at 1 / 8 / 32 concurrent clients.
+
+Each client thread calls CLIPPipeline.embed_text (unique texts, so no text cache involved) or
+embed_image_path in a loop, once with CLIP_BATCHING off (every call runs its own model.encode)
+and once on (concurrent calls merged into one encode per batch).
+
+--synthetic replaces the model with a stand-in whose encode takes `overhead + per_item * n` ms on one
+serial "device" (sleeping, so the GIL is released like torch kernels do); use it where
+sentence-transformers or the weights are not available. Without it the configured CLIP_MODEL_NAME is loaded.
+
+Usage:
+  python scripts/bench_clip_batching.py --synthetic
+  python scripts/bench_clip_batching.py --clients 1,8,32 --duration 10 --kind image --max-wait-ms 2
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+import threading
+from time import perf_counter, sleep
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="CLIP micro-batching load test")
+    ap.add_argument("--clients", default="1,8,32", help="Comma-separated concurrent client counts")
+    ap.add_argument("--duration", type=float, default=5.0, help="Seconds per (mode, clients) run")
+    ap.add_argument("--kind", default="text", choices=("text", "image"))
+    ap.add_argument("--max-batch-size", type=int, default=32)
+    ap.add_argument("--max-wait-ms", type=float, default=2.0)
+    ap.add_argument("--synthetic", action="store_true", help="Use a simulated model instead of loading CLIP")
+    ap.add_argument("--overhead-ms", type=float, default=8.0, help="Synthetic: fixed cost per encode call")
+    ap.add_argument("--per-item-ms", type=float, default=0.5, help="Synthetic: cost per item in a call")
+    return ap.parse_args()
+
+
+class SyntheticModel:
+    """Stand-in for a SentenceTransformer on one device: calls run one at a time."""
+
+    def __init__(self, overhead_ms: float, per_item_ms: float, dim: int = 512) -> None:
+        self.overhead = overhead_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+        self.dim = dim
+        self._device = threading.Lock()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, items, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = not isinstance(items, list)
+        n = 1 if single else len(items)
+        with self._device:
+            sleep(self.overhead + self.per_item * n)
+        out = np.random.default_rng(n).standard_normal((n, self.dim)).astype(np.float32)
+        return out[0] if single else out
+
+
+def _make_images(n: int) -> list[str]:
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix="bench_batching_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        path = os.path.join(tmp, f"{i}.jpg")
+        Image.fromarray(rng.integers(0, 255, (224, 224, 3), dtype=np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def _run(pipe, clients: int, duration: float, kind: str, images: list[str]) -> tuple[int, list[float]]:
+    stop = threading.Event()
+    latencies: list[list[float]] = [[] for _ in range(clients)]
+    start = threading.Barrier(clients + 1)
+
+    def client(c: int) -> None:
+        start.wait()
+        i = 0
+        while not stop.is_set():
+            st = perf_counter()
+            if kind == "text":
+                out = pipe.embed_text(f"client {c} query {i}")
+            else:
+                out = pipe.embed_image_path(images[(c * 7919 + i) % len(images)])
+            assert out is not None
+            latencies[c].append(perf_counter() - st)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for t in threads:
+        t.start()
+    start.wait()
+    sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    flat = [x for lat in latencies for x in lat]
+    return len(flat), flat
+
+
+def main():
+    args = parse_args()
+    client_counts = [int(c) for c in args.clients.split(",") if c.strip()]
+
+    from app import create_app
+    from app.services.clip_pipeline import CLIPPipeline
+
+    app = create_app()
+    images = _make_images(64) if args.kind == "image" else []
+    with app.app_context():
+        app.config["CLIP_BATCH_MAX_SIZE"] = args.max_batch_size
+        app.config["CLIP_BATCH_MAX_WAIT_MS"] = args.max_wait_ms
+        model = SyntheticModel(args.overhead_ms, args.per_item_ms) if args.synthetic else None
+        if model is None:
+            # load once and share between both modes
+            model = CLIPPipeline(app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")).model
+            if model is None:
+                sys.exit("CLIP model unavailable; try --synthetic")
+        pipes = {}
+        for mode, enabled in (("off", False), ("on", True)):
+            app.config["CLIP_BATCHING"] = enabled
+            pipes[mode] = CLIPPipeline(app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32"), model=model)
+
+        label = f"synthetic {args.overhead_ms:g}+{args.per_item_ms:g}/item ms" if args.synthetic else "model"
+        print(f"kind={args.kind} {label} max_batch={args.max_batch_size} max_wait={args.max_wait_ms:g}ms"
+              f" duration={args.duration:g}s")
+        print(f"{'clients':>7} {'batching':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>10}")
+        for clients in client_counts:
+            for mode in ("off", "on"):
+                pipe = pipes[mode]
+                before = pipe.text_batcher.stats() if pipe.text_batcher else None
+                before_img = pipe.image_batcher.stats() if pipe.image_batcher else None
+                done, lat = _run(pipe, clients, args.duration, args.kind, images)
+                mean_batch = "1.0"
+                if mode == "on":
+                    b0, b1 = (before, pipe.text_batcher.stats()) if args.kind == "text" else (before_img, pipe.image_batcher.stats())
+                    batches = b1["batches"] - b0["batches"]
+                    mean_batch = f"{(b1['items'] - b0['items']) / batches:.1f}" if batches else "-"
+                arr = np.asarray(lat) * 1000.0
+                print(f"{clients:>7} {mode:>8} {done / args.duration:>8.1f} {np.percentile(arr, 50):>8.2f}"
+                      f" {np.percentile(arr, 99):>8.2f} {mean_batch:>10}")
+
+
+if __name__ == "__main__":
+    main()
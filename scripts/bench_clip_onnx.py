@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Throughput and accuracy of the ONNX Runtime CLIP backend against the torch one.
+
+Embeds the same images with `CLIPPipeline.embed_image_path_batch` on each backend (torch, onnx fp32,
+onnx int8) and a set of captions with `embed_texts`, then prints images/s and the cosine similarity of
+every ONNX embedding to the torch embedding of the same input. Exits non-zero when an ONNX backend is
+below its documented tolerance (fp32 >= 0.9999, int8 >= 0.99 minimum cosine).
+
+Exports the towers first when CLIP_ONNX_DIR/<model> does not hold them. Needs torch,
+sentence-transformers, onnx and onnxruntime.
+
+Usage:
+  python scripts/bench_clip_onnx.py
+  python scripts/bench_clip_onnx.py --images data/samples --n 256 --batch-size 32 --threads 8
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+TOLERANCE = {"onnx-fp32": 0.9999, "onnx-int8": 0.99}
+_CAPTIONS = ["a photo of a cat", "a dog on the beach", "sunset over the city", "a receipt with prices",
+             "snowy mountain", "a bowl of noodles", "a red car", "handwritten notes"]
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="ONNX Runtime vs torch CLIP backend")
+    ap.add_argument("--images", default=None, help="Directory of images (default: generated JPEGs)")
+    ap.add_argument("--n", type=int, default=128, help="Images to embed")
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--rounds", type=int, default=3, help="Timed rounds per backend (best is reported)")
+    ap.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = default)")
+    return ap.parse_args()
+
+
+def _image_paths(directory: str | None, n: int) -> list[str]:
+    if directory:
+        names = sorted(f for f in os.listdir(directory) if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))
+        paths = [os.path.join(directory, f) for f in names]
+        return (paths * (n // max(1, len(paths)) + 1))[:n] if paths else []
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix="bench_clip_onnx_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        # smooth random gradients + noise: closer to photos than pure noise
+        base = np.linspace(0, 255, 640, dtype=np.float32)
+        arr = np.stack([np.add.outer(base[:480] * rng.random(), base * rng.random()) / 2 for _ in range(3)], axis=-1)
+        arr += rng.normal(0, 12, arr.shape)
+        path = os.path.join(tmp, f"{i}.jpg")
+        Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def main():
+    args = parse_args()
+    paths = _image_paths(args.images, args.n)
+    if not paths:
+        sys.exit("no images found")
+
+    from app import create_app
+    from app.services.clip_pipeline import CLIPPipeline
+    from app.services.clip_onnx import ONNXCLIPModel, default_model_dir, export_clip_onnx, is_exported
+
+    app = create_app()
+    with app.app_context():
+        app.config["CLIP_BATCHING"] = False
+        model_name = app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+        model_dir = default_model_dir(app.config, model_name)
+        if not is_exported(model_dir, quantized=True):
+            print(f"exporting {model_name} -> {model_dir}")
+            export_clip_onnx(model_name, model_dir, quantize=True)
+
+        pipes = {"torch": CLIPPipeline(model_name)}
+        if pipes["torch"].model is None:
+            sys.exit("torch CLIP model unavailable")
+        for label, quantized in (("onnx-fp32", False), ("onnx-int8", True)):
+            model = ONNXCLIPModel(model_dir, quantized=quantized, num_threads=args.threads)
+            pipes[label] = CLIPPipeline(model_name, model=model)
+
+        print(f"model={model_name} images={len(paths)} batch_size={args.batch_size} rounds={args.rounds}")
+        print(f"{'backend':>10} {'img/s':>8} {'speedup':>8} {'img cos min':>11} {'img cos mean':>12} {'txt cos min':>11}")
+        ref_img = ref_txt = None
+        base_rate = None
+        failed = False
+        for label, pipe in pipes.items():
+            pipe.embed_image_path_batch(paths[: args.batch_size], batch_size=args.batch_size)  # warm-up
+            best = float("inf")
+            for _ in range(args.rounds):
+                st = perf_counter()
+                img = pipe.embed_image_path_batch(paths, batch_size=args.batch_size)
+                best = min(best, perf_counter() - st)
+            img = np.stack(img)
+            txt = pipe.embed_texts(_CAPTIONS)
+            rate = len(paths) / best
+            if label == "torch":
+                ref_img, ref_txt, base_rate = img, txt, rate
+                print(f"{label:>10} {rate:>8.1f} {1.0:>7.2f}x {'-':>11} {'-':>12} {'-':>11}")
+                continue
+            img_cos, txt_cos = _cosine(img, ref_img), _cosine(txt, ref_txt)
+            low = min(img_cos.min(), txt_cos.min())
+            mark = "" if low >= TOLERANCE[label] else f"  < {TOLERANCE[label]} FAIL"
+            failed |= bool(mark)
+            print(f"{label:>10} {rate:>8.1f} {rate / base_rate:>7.2f}x {img_cos.min():>11.5f} {img_cos.mean():>12.5f}"
+                  f" {txt_cos.min():>11.5f}{mark}")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Time saved per image by decoding once and sharing the result between CLIP and OCR.
+
+Per image, the decode work the upload / initialize_base pipelines do before any model runs:
+- separate:       CLIP reads + decodes the file (reduced-resolution decode_for_clip), then OCR reads
+                  and decodes it again at full resolution into a numpy array
+- separate-full:  the same with CLIP also decoding at full resolution (before CLIP_DECODE_DRAFT)
+- shared:         one DecodedImage: file read once, decoded once at full resolution, CLIP view via
+                  Image.reduce, OCR array from the same decode
+
+Usage:
+  python scripts/bench_decode_once.py                      # generated 12 MP and 500x375 JPEGs
+  python scripts/bench_decode_once.py --images ~/Pictures/phone --n 32
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Decode-once (shared CLIP + OCR) vs separate decodes")
+    ap.add_argument("--images", default=None, help="Directory of JPEGs (default: generated)")
+    ap.add_argument("--n", type=int, default=8, help="Images per size")
+    ap.add_argument("--rounds", type=int, default=3, help="Rounds (best per image is kept)")
+    return ap.parse_args()
+
+
+def _make(n: int, w: int, h: int) -> list[str]:
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix=f"bench_decode_once_{w}x{h}_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+        x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+        arr = np.stack([(y * rng.random() + x * rng.random()) * 127 + 64] * 3, axis=-1)
+        arr += rng.normal(0, 6, arr.shape).astype(np.float32)
+        path = os.path.join(tmp, f"{i}.jpg")
+        Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path, quality=92)
+        paths.append(path)
+    return paths
+
+
+def _separate(path: str, draft: bool) -> None:
+    from PIL import Image
+    from app.services.image_decode import decode_for_clip
+
+    decode_for_clip(path, 224 if draft else None)
+    np.array(Image.open(path).convert("RGB"))
+
+
+def _shared(path: str) -> None:
+    from app.services.image_decode import DecodedImage
+
+    with open(path, "rb") as f:
+        image = DecodedImage(path, data=f.read(), full=True)
+    image.for_clip(224)
+    image.array()
+
+
+def _time(fn, paths: list[str], rounds: int) -> float:
+    best = []
+    for p in paths:
+        runs = []
+        for _ in range(rounds):
+            st = perf_counter()
+            fn(p)
+            runs.append(perf_counter() - st)
+        best.append(min(runs))
+    return float(np.mean(best)) * 1000.0
+
+
+def main():
+    args = parse_args()
+    if args.images:
+        names = sorted(f for f in os.listdir(args.images) if f.lower().endswith((".jpg", ".jpeg")))
+        sets = {"input": [os.path.join(args.images, f) for f in names][: args.n]}
+    else:
+        sets = {"4032x3024": _make(args.n, 4032, 3024), "500x375": _make(args.n, 500, 375)}
+
+    print(f"{'images':>10} {'separate-full':>13} {'separate':>9} {'shared':>8} {'saved ms':>9} {'saved':>7}  (ms/image)")
+    for label, paths in sets.items():
+        if not paths:
+            continue
+        _shared(paths[0])  # warm-up
+        full = _time(lambda p: _separate(p, False), paths, args.rounds)
+        sep = _time(lambda p: _separate(p, True), paths, args.rounds)
+        shared = _time(_shared, paths, args.rounds)
+        print(f"{label:>10} {full:>13.1f} {sep:>9.1f} {shared:>8.1f} {sep - shared:>9.1f} {(sep - shared) / sep:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark embeddings.vec storage dtypes (float32 / float16 / int8).
+
+For a synthetic set of normalized vectors (clustered, CLIP-like), reports per dtype:
+- bytes per row stored in embeddings.vec
+- recall@k of exact search over decoded vectors against float32 ground truth
+- index rebuild time through IndexStore._build_from_db (DB read + decode + FAISS build)
+
+Usage:
+  python scripts/bench_embedding_dtype.py
+  python scripts/bench_embedding_dtype.py --n 100000 --queries 1000 --k 10
+
+Runs against a throw-away SQLite DB and INDEX_DIR under a temp directory; no model needed.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Recall and rebuild time per embedding storage dtype")
+    ap.add_argument("--n", type=int, default=100000, help="Library size")
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--clusters", type=int, default=1000, help="Synthetic topic clusters")
+    ap.add_argument("--index-type", default="flat", help="INDEX_TYPE used for the rebuild timing")
+    return ap.parse_args()
+
+
+def _synthetic(n: int, dim: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _topk(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    import faiss
+
+    index = faiss.IndexFlatIP(base.shape[1])
+    index.add(np.ascontiguousarray(base, dtype=np.float32))
+    _, I = index.search(queries, k)
+    return I
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_dtype_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "faiss")
+    os.environ["INDEX_TYPE"] = args.index_type
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding
+    from app.services.embedding_io import EMBEDDING_DTYPES, to_bytes, from_bytes
+    from app.services.index_store import IndexStore
+
+    rng = np.random.default_rng(0)
+    vecs = _synthetic(args.n, args.dim, args.clusters, rng)
+    queries = _synthetic(args.queries, args.dim, args.clusters, np.random.default_rng(1))
+    truth = _topk(vecs, queries, args.k)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        store = IndexStore()
+        print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k}")
+        print(f"{'dtype':>8} {'bytes/row':>10} {'recall@k':>9} {'encode s':>9} {'rebuild s':>10}")
+        for dtype in EMBEDDING_DTYPES:
+            user = User(username=f"bench_{dtype}", password_hash="<bench>")
+            db.session.add(user)
+            db.session.commit()
+            db.session.bulk_insert_mappings(Image, [
+                {"owner_id": user.id, "original_filename": f"{i}.jpg", "storage_uri": f"local://{dtype}_{i}.jpg"}
+                for i in range(args.n)
+            ])
+            db.session.commit()
+            ids = [iid for (iid,) in db.session.query(Image.id).filter(Image.owner_id == user.id).order_by(Image.id)]
+
+            st = perf_counter()
+            payloads = [to_bytes(v, dtype) for v in vecs]
+            encode_s = perf_counter() - st
+            db.session.bulk_insert_mappings(Embedding, [
+                {"image_id": iid, "vec": p, "dim": args.dim, "dtype": dtype, "model_version": "bench"}
+                for iid, p in zip(ids, payloads)
+            ])
+            db.session.commit()
+
+            decoded = np.stack([from_bytes(p, dtype) for p in payloads])
+            found = _topk(decoded, queries, args.k)
+            recall = np.mean([len(set(t) & set(f)) / args.k for t, f in zip(truth, found)])
+
+            db.session.expire_all()
+            st = perf_counter()
+            store._build_from_db(user.id)
+            rebuild_s = perf_counter() - st
+            db.session.rollback()
+            print(f"{dtype:>8} {len(payloads[0]):>10} {recall:>9.4f} {encode_s:>9.2f} {rebuild_s:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
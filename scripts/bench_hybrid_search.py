@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Benchmark hybrid search: CLIP and OCR stages run concurrently vs one after the other.
+
+Fills a throw-away SQLite DB with one user's library (`--n` images with embeddings and OCR text),
+then runs the same queries through `hybrid_search` (stages in parallel) and through the two stages
+in sequence, and prints p50 / p99 of each plus the per-stage timings hybrid_search reports.
+
+Without --clip the text encoder is a stand-in that sleeps `--encode-ms` (roughly the CLIP text tower
+on CPU; sleeping releases the GIL like torch) and returns a random unit vector; with --clip the real
+model is used (sentence-transformers or CLIP_BACKEND=onnx).
+
+Usage:
+  python scripts/bench_hybrid_search.py
+  python scripts/bench_hybrid_search.py --n 200000 --queries 200 --encode-ms 20
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter, sleep
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_CHUNK = 20000
+_WORDS = ["receipt", "taipei", "coffee", "menu", "exit", "station", "harbour", "museum", "ticket", "sale",
+          "长城", "欢迎", "出口", "车站", "咖啡", "菜单", "门票", "博物馆", "港口", "特价"]
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Hybrid search: parallel vs sequential stages")
+    ap.add_argument("--n", type=int, default=100000, help="Images in the user's library")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--encode-ms", type=float, default=15.0, help="Stand-in text encoder latency")
+    ap.add_argument("--clip", action="store_true", help="Use the real CLIP text encoder")
+    return ap.parse_args()
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_hybrid_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "faiss")
+
+    from sqlalchemy import insert
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding, OCRText
+    from app.services.embedding_io import to_bytes
+    from app.services.hybrid_search import _clip_stage, hybrid_search, rrf_fuse
+    from app.services.ocr_search import search_ocr_text
+
+    rng = np.random.default_rng(0)
+    encode = None
+    dim = args.dim
+    if not args.clip:
+        def encode(query: str):
+            sleep(args.encode_ms / 1000.0)
+            v = np.random.default_rng(abs(hash(query)) % 2**32).standard_normal(dim).astype(np.float32)
+            return v / np.linalg.norm(v)
+
+    app = create_app()
+    with app.app_context():
+        if args.clip:
+            from app.services.clip_pipeline import get_embedding_dim
+
+            dim = get_embedding_dim() or dim
+        db.create_all()
+        user = User(username="bench_hybrid", password_hash="<bench>")
+        db.session.add(user)
+        db.session.commit()
+        next_id = (db.session.query(db.func.max(Image.id)).scalar() or 0) + 1
+        for start in range(0, args.n, _CHUNK):
+            ids = list(range(next_id + start, next_id + min(start + _CHUNK, args.n)))
+            vecs = rng.standard_normal((len(ids), dim)).astype(np.float32)
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            db.session.execute(insert(Image), [
+                {"id": iid, "owner_id": user.id, "original_filename": f"{iid}.jpg",
+                 "storage_uri": f"local://bench_{iid}.jpg", "status": "READY", "visibility": "private"}
+                for iid in ids
+            ])
+            db.session.execute(insert(Embedding), [
+                {"image_id": iid, "vec": to_bytes(v), "dim": dim, "model_version": "bench"} for iid, v in zip(ids, vecs)
+            ])
+            db.session.execute(insert(OCRText), [
+                {"image_id": iid, "text": " ".join(rng.choice(_WORDS, size=int(rng.integers(1, 8))))} for iid in ids
+            ])
+            db.session.commit()
+
+        queries = [" ".join(rng.choice(_WORDS, size=int(rng.integers(1, 3)))) for _ in range(args.queries)]
+        hybrid_search(user.id, queries[0], k=args.k, encode=encode)  # warm: index build, FTS backfill, pool
+        db.session.rollback()
+
+        def sequential(query: str):
+            clip = _clip_stage(user.id, query, max(args.k, 50), encode)
+            ocr = search_ocr_text(user.id, query, top_k=max(args.k, 50))
+            return rrf_fuse({"clip": [i for i, _ in clip], "ocr": [h["image_id"] for h in ocr]})
+
+        seq, par, stage_sums = [], [], {}
+        for q in queries:
+            st = perf_counter()
+            sequential(q)
+            seq.append(perf_counter() - st)
+            db.session.rollback()
+            st = perf_counter()
+            _, stages, timings = hybrid_search(user.id, q, k=args.k, encode=encode)
+            par.append(perf_counter() - st)
+            db.session.rollback()
+            for name, ms in timings.items():
+                stage_sums[name] = stage_sums.get(name, 0.0) + ms
+
+        encoder = "CLIP" if args.clip else f"stand-in {args.encode_ms:g} ms"
+        print(f"images={args.n} dim={dim} queries={len(queries)} k={args.k} text encoder={encoder} cpus={os.cpu_count()}")
+        print(f"{'mode':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for label, samples in (("sequential", seq), ("hybrid", par)):
+            p50, p99 = _percentiles(samples)
+            print(f"{label:>10} {p50:>9.2f} {p99:>9.2f}")
+        print("hybrid stage means (ms): " + ", ".join(f"{k} {v / len(queries):.2f}" for k, v in stage_sums.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Decode cost of CLIP preprocessing: full-resolution vs reduced-resolution (draft) JPEG decoding.
+
+For each mode, each in a fresh process:
+- per-image decode time (sequential, p50 / mean ms), and
+- decoding one batch of --batch images held in memory at once (what embed_image_path_batch does)
+  with 1 and --workers threads: wall time and peak RSS above the process baseline.
+
+Modes: `full` = Image.open(path).convert("RGB") (the previous code path, no EXIF handling);
+`draft` = image_decode.decode_for_clip(path, 224) (DCT-scaled decode + EXIF orientation).
+
+Usage:
+  python scripts/bench_image_decode.py                    # generated 12 MP JPEGs (EXIF-rotated)
+  python scripts/bench_image_decode.py --images ~/Pictures/phone --batch 32 --workers 4
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import resource
+import tempfile
+import multiprocessing as mp
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Full vs reduced-resolution JPEG decode for CLIP")
+    ap.add_argument("--images", default=None, help="Directory of JPEGs (default: generated 4032x3024 photos)")
+    ap.add_argument("--n", type=int, default=16, help="Images to generate / use")
+    ap.add_argument("--batch", type=int, default=16, help="Images decoded and held at once")
+    ap.add_argument("--workers", type=int, default=4, help="Decode threads for the parallel run")
+    ap.add_argument("--min-side", type=int, default=224)
+    return ap.parse_args()
+
+
+def _make_photos(n: int) -> list[str]:
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix="bench_decode_")
+    rng = np.random.default_rng(0)
+    h, w = 3024, 4032
+    paths = []
+    for i in range(n):
+        # smooth gradients + mild noise so the JPEG is photo-sized (a few MB), stored rotated (EXIF 6)
+        y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+        x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+        arr = np.stack([(y * rng.random() + x * rng.random()) * 127 + 64] * 3, axis=-1)
+        arr += rng.normal(0, 6, arr.shape).astype(np.float32)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+        exif = img.getexif()
+        exif[0x0112] = 6
+        path = os.path.join(tmp, f"{i}.jpg")
+        img.save(path, quality=92, exif=exif)
+        paths.append(path)
+    return paths
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM belongs to this address space; ru_maxrss also carries the parent's peak across fork+exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
+
+
+def _child(mode: str, paths: list[str], batch: int, workers: int, min_side: int, out) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+    from app.services.image_decode import decode_for_clip
+
+    def decode(p):
+        if mode == "full":
+            return Image.open(p).convert("RGB")
+        return decode_for_clip(p, min_side)
+
+    result = {"size": decode(paths[0]).size}  # also warms up the codec
+    if workers == 1:
+        times = []
+        for p in paths:
+            st = perf_counter()
+            im = decode(p)
+            times.append(perf_counter() - st)
+            del im
+        result["p50"] = float(np.median(times)) * 1000
+        result["mean"] = float(np.mean(times)) * 1000
+    chunk = (paths * (batch // len(paths) + 1))[:batch]
+    base = _peak_rss_mb()
+    st = perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        held = list(pool.map(decode, chunk))
+    result["batch_s"] = perf_counter() - st
+    result["peak_mb"] = _peak_rss_mb() - base
+    del held
+    out.put(result)
+
+
+def _run_child(mode: str, paths: list[str], batch: int, workers: int, min_side: int) -> dict:
+    # fresh process per measurement: the peak is a high-water mark
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(mode, paths, batch, workers, min_side, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def main():
+    args = parse_args()
+    if args.images:
+        names = sorted(f for f in os.listdir(args.images) if f.lower().endswith((".jpg", ".jpeg")))
+        paths = [os.path.join(args.images, f) for f in names][: args.n]
+    else:
+        paths = _make_photos(args.n)
+    if not paths:
+        sys.exit("no JPEGs found")
+
+    from PIL import Image
+
+    with Image.open(paths[0]) as im:
+        src = im.size
+    print(f"images={len(paths)} source={src[0]}x{src[1]} batch={args.batch} workers={args.workers}"
+          f" min_side={args.min_side}")
+    print(f"{'mode':>6} {'decoded':>10} {'p50 ms':>8} {'mean ms':>8} {'batch s (1)':>11}"
+          f" {'batch s (' + str(args.workers) + ')':>11} {'peak MB (1)':>11} {'peak MB (' + str(args.workers) + ')':>11}")
+    w = args.workers
+    for mode in ("full", "draft"):
+        r1 = _run_child(mode, paths, args.batch, 1, args.min_side)
+        rw = _run_child(mode, paths, args.batch, w, args.min_side)
+        print(f"{mode:>6} {r1['size'][0]:>5}x{r1['size'][1]:<4} {r1['p50']:>8.1f} {r1['mean']:>8.1f}"
+              f" {r1['batch_s']:>11.2f} {rw['batch_s']:>11.2f} {r1['peak_mb']:>11.0f} {rw['peak_mb']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Benchmark memory-mapped index loading (INDEX_MMAP) across worker processes.
+
+Persists one user's index, then starts --workers processes (like gunicorn workers) per mode.
+Each worker loads it through IndexStore on its first query and keeps it cached. Reports per mode:
+- load time (IndexStore.ensure_index from INDEX_DIR), first-query latency (load + search) and steady-state p50
+- RSS and PSS per worker after the queries (PSS splits shared pages across the processes mapping them)
+
+By default the index file is evicted from the page cache (posix_fadvise DONTNEED) before each mode,
+so first queries start cold; --warm keeps it cached.
+
+Usage:
+  python scripts/bench_index_mmap.py
+  python scripts/bench_index_mmap.py --n 200000 --dim 512 --workers 4 --index-type flat
+
+Runs against a throw-away INDEX_DIR under a temp directory; no model or DB rows needed.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing as mp
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+USER_ID = 1
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="RSS / PSS and first-query latency, heap load vs mmap")
+    ap.add_argument("--n", type=int, default=200000, help="Vectors in the user's index")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=100, help="Queries per worker after the first one")
+    ap.add_argument("--index-type", default="flat", help="flat | ivf_flat | hnsw | ivf_pq")
+    ap.add_argument("--warm", action="store_true", help="Keep the index file in the page cache between modes")
+    return ap.parse_args()
+
+
+def _memory_kb() -> tuple[int, int]:
+    """(RSS, PSS) of the current process in KiB, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0] in ("Rss:", "Pss:"):
+                fields[parts[0]] = int(parts[1])
+    return fields.get("Rss:", 0), fields.get("Pss:", 0)
+
+
+def _evict(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _worker(env: dict, dim: int, queries: int, start, measured, results) -> None:
+    os.environ.update(env)
+    from app import create_app
+    from app.services.index_store import IndexStore
+
+    app = create_app()
+    rng = np.random.default_rng(os.getpid())
+    qs = rng.standard_normal((queries + 1, dim)).astype(np.float32)
+    import faiss  # noqa: F401  (lazy-imported on first load; keep it out of the timings)
+
+    with app.app_context():
+        store = IndexStore()
+        start.wait()
+        st = perf_counter()
+        store.ensure_index(USER_ID)
+        load_ms = (perf_counter() - st) * 1000.0
+        store.search_topk(USER_ID, qs[0], k=10)
+        first_ms = (perf_counter() - st) * 1000.0
+        samples = []
+        for q in qs[1:]:
+            st = perf_counter()
+            store.search_topk(USER_ID, q, k=10)
+            samples.append((perf_counter() - st) * 1000.0)
+        # every worker holds its index before anyone reads PSS
+        measured.wait()
+        rss, pss = _memory_kb()
+        results.put((load_ms, first_ms, float(np.percentile(samples, 50)) if samples else 0.0, rss, pss))
+        measured.wait()
+
+
+def _run_mode(ctx, env: dict, args) -> list[tuple]:
+    start = ctx.Barrier(args.workers)
+    measured = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(env, args.dim, args.queries, start, measured, results))
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_mmap_")
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "INDEX_DIR": os.path.join(tmp, "faiss"),
+        "INDEX_TYPE": args.index_type,
+        # one user per worker; keep the byte budget out of the way
+        "INDEX_CACHE_MAX_BYTES": "0",
+    }
+    os.environ.update(env)
+
+    from app import create_app
+    from app.services.index_store import IndexStore
+    from app.services.vector_index import FaissVectorIndex
+
+    app = create_app()
+    with app.app_context():
+        store = IndexStore()
+        vecs = np.random.default_rng(0).standard_normal((args.n, args.dim)).astype(np.float32)
+        idx = FaissVectorIndex(norm=True, index_type=store._choose_index_type(args.n), **store.index_params)
+        idx.build(vecs, ids=np.arange(1, args.n + 1))
+        store._persist_base(USER_ID, idx)
+        idx_path = store._user_index_path(USER_ID)
+        del vecs, idx
+
+    size_mb = os.path.getsize(idx_path) / 2**20
+    print(f"n={args.n} dim={args.dim} type={args.index_type} file={size_mb:.0f}MiB workers={args.workers}"
+          f" page_cache={'warm' if args.warm else 'cold'}")
+    print(f"{'mode':>5} {'load ms':>8} {'first ms (mean/max)':>20} {'p50 ms':>7} {'RSS MiB/worker':>15} {'PSS MiB/worker':>15} {'PSS MiB total':>14}")
+    ctx = mp.get_context("spawn")
+    for mode, mmap in (("heap", "false"), ("mmap", "true")):
+        if not args.warm:
+            _evict(idx_path)
+        rows = _run_mode(ctx, dict(env, INDEX_MMAP=mmap), args)
+        load = np.mean([r[0] for r in rows])
+        first = [r[1] for r in rows]
+        p50 = np.mean([r[2] for r in rows])
+        rss = np.mean([r[3] for r in rows]) / 1024
+        pss = [r[4] / 1024 for r in rows]
+        print(f"{mode:>5} {load:>8.1f} {np.mean(first):>10.1f}/{max(first):<9.1f} {p50:>7.2f} {rss:>15.0f} {np.mean(pss):>15.0f} {sum(pss):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark sequential single-image index updates (the upload path).
+
+Compares the legacy update (push into the in-memory index, then rewrite the whole
+index.faiss) with the append-only delta log used by IndexStore.push_vector_id_pairs
+(fsynced append, periodic compaction at INDEX_DELTA_COMPACT_THRESHOLD records).
+
+Usage:
+  python scripts/bench_index_push.py
+  python scripts/bench_index_push.py --uploads 10000 --legacy-uploads 2000 --base 1000
+
+The legacy path is quadratic overall, so by default it only runs the first --legacy-uploads pushes.
+Runs against a throw-away SQLite DB and INDEX_DIR under a temp directory; no model needed.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Sequential upload index update cost (legacy rewrite vs delta log)")
+    ap.add_argument("--uploads", type=int, default=10000, help="Sequential single-vector pushes (delta log)")
+    ap.add_argument("--legacy-uploads", type=int, default=1000, help="Pushes for the legacy full-rewrite path")
+    ap.add_argument("--base", type=int, default=1000, help="Images already indexed before the uploads")
+    ap.add_argument("--dim", type=int, default=512)
+    return ap.parse_args()
+
+
+def _seed_user(db, User, Image, Embedding, to_bytes, username: str, vecs: np.ndarray) -> int:
+    user = User(username=username, password_hash="<bench>")
+    db.session.add(user)
+    db.session.commit()
+    for i, v in enumerate(vecs):
+        img = Image(owner_id=user.id, original_filename=f"{i}.jpg", storage_uri=f"local://{username}_{i}.jpg")
+        db.session.add(img)
+        db.session.flush()
+        db.session.add(Embedding(image_id=img.id, vec=to_bytes(v), dim=len(v), model_version="bench"))
+    db.session.commit()
+    return user.id
+
+
+def _report(label: str, samples: list[float]) -> None:
+    arr = np.asarray(samples) * 1000.0
+    checkpoints = [n for n in (1000, 2000, 5000, 10000) if n <= len(arr)] or [len(arr)]
+    cumulative = ", ".join(f"{n}: {arr[:n].sum() / 1000.0:.2f}s" for n in checkpoints)
+    print(
+        f"{label:>7}: n={len(arr)} p50={np.percentile(arr, 50):.3f}ms p99={np.percentile(arr, 99):.3f}ms "
+        f"last100={arr[-100:].mean():.3f}ms cumulative [{cumulative}]"
+    )
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_push_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "faiss")
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding
+    from app.services.embedding_io import to_bytes
+    from app.services import index_store
+
+    app = create_app()
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        db.create_all()
+        base = rng.standard_normal((args.base, args.dim)).astype(np.float32)
+        uploads = rng.standard_normal((max(args.uploads, args.legacy_uploads), args.dim)).astype(np.float32)
+        legacy_user = _seed_user(db, User, Image, Embedding, to_bytes, "bench_legacy", base)
+        delta_user = _seed_user(db, User, Image, Embedding, to_bytes, "bench_delta", base)
+
+        store = index_store.IndexStore()
+        store.ensure_index(legacy_user)
+        store.ensure_index(delta_user)
+        print(f"base={args.base} dim={args.dim} compact_threshold={store.compact_threshold}")
+
+        samples = []
+        idx = store.ensure_index(legacy_user)
+        idx_path = store._user_index_path(legacy_user)
+        for i in range(args.legacy_uploads):
+            st = perf_counter()
+            idx.push([uploads[i]], ids=[10**9 + i])
+            idx.save(idx_path)
+            samples.append(perf_counter() - st)
+        _report("legacy", samples)
+
+        samples = []
+        for i in range(args.uploads):
+            st = perf_counter()
+            store.push_vector_id_pairs(delta_user, [uploads[i]], [10**9 + i])
+            samples.append(perf_counter() - st)
+        _report("delta", samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Benchmark fuzzy OCR search (services.ocr_fuzzy) on one large library.
+
+Fills a throw-away SQLite DB with `--rows` synthetic OCR texts of one user (upper-case words with
+OCR-style noise), then queries with phrases taken from random rows and corrupted (letters dropped or
+swapped, spaces removed, like "GRTWALLOF"). Reports index build time and size, query latency, and
+recall@k of the source row, against a brute-force rapidfuzz scan over every row for a few queries.
+A query counts as found when the source row is returned, or when all k results score at least as
+well as the source row (common words tie many rows).
+
+Usage:
+  python scripts/bench_ocr_fuzzy.py                    # 500k rows
+  python scripts/bench_ocr_fuzzy.py --rows 100000 --queries 100
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_CHUNK = 20000
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Fuzzy OCR search latency and recall")
+    ap.add_argument("--rows", type=int, default=500_000, help="OCR rows of the user")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--brute-force", type=int, default=5, help="Queries also run as a full rapidfuzz scan")
+    ap.add_argument("--k", type=int, default=20)
+    return ap.parse_args()
+
+
+def _vocab(rng) -> list[str]:
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    return sorted({"".join(rng.choice(letters, size=rng.integers(3, 11))) for _ in range(30000)})
+
+
+def _noisy(rng, phrase: str) -> str:
+    chars = list(phrase)
+    for _ in range(max(1, len(chars) // 8)):
+        i = int(rng.integers(len(chars)))
+        op = rng.random()
+        if op < 0.4:
+            del chars[i]
+        elif op < 0.8:
+            chars[i] = chr(ord("A") + int(rng.integers(26)))
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        if not chars:
+            break
+    out = "".join(chars)
+    return out.replace(" ", "") if rng.random() < 0.5 else out
+
+
+def _found(fuzz, normalize, source_id: int, source: str, query: str, hits: list[dict], k: int) -> bool:
+    if any(h["image_id"] == source_id for h in hits):
+        return True
+    source_score = fuzz.partial_ratio(normalize(query), normalize(source))
+    return len(hits) >= k and min(h["score"] for h in hits) >= source_score - 1e-6
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def main():
+    args = parse_args()
+    if not os.environ.get("DATABASE_URL"):
+        tmp = tempfile.mkdtemp(prefix="bench_ocr_fuzzy_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from rapidfuzz import fuzz, process
+    from sqlalchemy import insert
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, OCRText
+    from app.services.ocr_fuzzy import _user_index, fuzzy_search_ocr_text, normalize
+
+    rng = np.random.default_rng(0)
+    vocab = _vocab(rng)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench_ocr_fuzzy", password_hash="<bench>")
+        db.session.add(user)
+        db.session.commit()
+
+        texts: dict[int, str] = {}
+        next_id = (db.session.query(db.func.max(Image.id)).scalar() or 0) + 1
+        for start in range(0, args.rows, _CHUNK):
+            ids = range(next_id + start, next_id + min(start + _CHUNK, args.rows))
+            for iid in ids:
+                words = [vocab[int(rng.zipf(1.2)) % len(vocab)] for _ in range(int(rng.integers(2, 12)))]
+                texts[iid] = " ".join(words)
+            db.session.execute(insert(Image), [
+                {"id": iid, "owner_id": user.id, "original_filename": f"{iid}.jpg",
+                 "storage_uri": f"local://bench_{iid}.jpg", "status": "READY", "visibility": "private"}
+                for iid in ids
+            ])
+            db.session.execute(insert(OCRText), [{"image_id": iid, "text": texts[iid]} for iid in ids])
+            db.session.commit()
+
+        st = perf_counter()
+        idx = _user_index(user.id)
+        print(f"rows={args.rows} index build {perf_counter() - st:.1f}s, {idx.nbytes / 2**20:.0f} MiB"
+              f" (postings {len(idx.indices)})")
+
+        all_ids = list(texts)
+        queries = []
+        for _ in range(args.queries):
+            iid = all_ids[int(rng.integers(len(all_ids)))]
+            words = texts[iid].split()
+            n = min(len(words), int(rng.integers(1, 4)))
+            s = int(rng.integers(len(words) - n + 1))
+            phrase = " ".join(words[s:s + n])
+            if len(phrase) < 6:
+                phrase = texts[iid][:20]
+            queries.append((iid, _noisy(rng, phrase)))
+
+        samples, found = [], 0
+        for iid, q in queries:
+            st = perf_counter()
+            hits = fuzzy_search_ocr_text(user.id, q, top_k=args.k)
+            samples.append(perf_counter() - st)
+            db.session.rollback()
+            found += _found(fuzz, normalize, iid, texts[iid], q, hits, args.k)
+        p50, p99 = _percentiles(samples)
+        print(f"fuzzy index: p50 {p50:.1f} ms, p99 {p99:.1f} ms, recall@{args.k} {found / len(queries):.1%}")
+
+        if args.brute_force:
+            norms = {iid: normalize(t) for iid, t in texts.items()}
+            bf_samples, agree = [], 0
+            for iid, q in queries[: args.brute_force]:
+                st = perf_counter()
+                best = process.extract(normalize(q), norms, scorer=fuzz.partial_ratio, limit=args.k,
+                                       score_cutoff=app.config.get("OCR_FUZZY_MIN_SCORE", 70))
+                bf_samples.append(perf_counter() - st)
+                hits = [{"image_id": key, "score": score} for _, score, key in best]
+                agree += _found(fuzz, normalize, iid, texts[iid], q, hits, args.k)
+            print(f"brute-force rapidfuzz scan: mean {np.mean(bf_samples) * 1000:.0f} ms,"
+                  f" recall@{args.k} {agree / len(bf_samples):.1%} ({len(bf_samples)} queries)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Batched PaddleOCR (`det_bs` images per predict call, decode on a pool one batch ahead) vs the
+previous loop (decode and `predict` one image at a time).
+
+Both run on the same generated images, a few of which are unreadable, and must return the same
+aligned results (None where a file fails).
+
+--synthetic replaces PaddleOCR with a stand-in whose `predict` takes `overhead + per_image * n` ms
+(sleeping, so the GIL is released like Paddle kernels) and returns one result dict per image; use it
+where paddleocr or its weights are not available.
+
+Usage:
+  python scripts/bench_ocr_paddle.py --synthetic
+  python scripts/bench_ocr_paddle.py --n 300 --batch-size 8 --size 1280x960
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter, sleep
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Batched vs per-image PaddleOCR")
+    ap.add_argument("--n", type=int, default=300, help="Images")
+    ap.add_argument("--batch-size", type=int, default=8, help="Images per predict call (OCR_PADDLE_DET_BATCH_SIZE)")
+    ap.add_argument("--size", default="1280x960", help="Generated image size WxH")
+    ap.add_argument("--broken-every", type=int, default=50, help="Every N-th file is unreadable (0 = none)")
+    ap.add_argument("--synthetic", action="store_true", help="Use a simulated PaddleOCR instead of the real model")
+    ap.add_argument("--overhead-ms", type=float, default=25.0, help="Synthetic: fixed cost per predict call")
+    ap.add_argument("--per-image-ms", type=float, default=15.0, help="Synthetic: cost per image in a call")
+    return ap.parse_args()
+
+
+class SyntheticPaddle:
+    def __init__(self, overhead_ms: float, per_image_ms: float) -> None:
+        self.overhead = overhead_ms / 1000.0
+        self.per_image = per_image_ms / 1000.0
+
+    def predict(self, images):
+        batch = images if isinstance(images, list) else [images]
+        sleep(self.overhead + self.per_image * len(batch))
+        return [{"rec_texts": [f"{img.shape[1]}x{img.shape[0]}"]} for img in batch]
+
+
+def _make_images(n: int, w: int, h: int, broken_every: int) -> list[str]:
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix="bench_ocr_paddle_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        path = os.path.join(tmp, f"{i}.jpg")
+        if broken_every and i % broken_every == broken_every - 1:
+            with open(path, "wb") as f:
+                f.write(b"not an image")
+        else:
+            y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+            x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+            arr = np.stack([(y * rng.random() + x * rng.random()) * 127 + 64] * 3, axis=-1)
+            arr += rng.normal(0, 6, arr.shape).astype(np.float32)
+            Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def per_image(ocr, paths: list[str]) -> list:
+    """The previous process_image_batch loop."""
+    from PIL import Image, ImageOps
+
+    out = []
+    for path in paths:
+        try:
+            img = ImageOps.exif_transpose(Image.open(path).convert("RGB"))
+            result = ocr.model.predict(np.array(img))
+            out.append(ocr._result_text(result[0]) if result else None)
+        except Exception:
+            out.append(None)
+    return out
+
+
+def main():
+    args = parse_args()
+    w, h = (int(x) for x in args.size.lower().split("x"))
+    paths = _make_images(args.n, w, h, args.broken_every)
+
+    from app import create_app
+    from app.services.ocr_pipeline_paddle import OCRPipeline
+
+    app = create_app()
+    with app.app_context():
+        ocr = OCRPipeline(
+            model_name=app.config.get("OCR_PADDLE_MODEL_NAME", "PP-OCRv4"),
+            det_bs=args.batch_size,
+            rec_bs=app.config.get("OCR_PADDLE_REC_BATCH_SIZE", 16),
+            decode_workers=app.config.get("OCR_DECODE_WORKERS", 0),
+            model=SyntheticPaddle(args.overhead_ms, args.per_image_ms) if args.synthetic else None,
+        )
+        if ocr.model is None:
+            sys.exit("PaddleOCR unavailable; try --synthetic")
+
+        ocr.process_image_batch(paths[: args.batch_size])  # warm-up
+        st = perf_counter()
+        old = per_image(ocr, paths)
+        old_s = perf_counter() - st
+        st = perf_counter()
+        new = ocr.process_image_batch(paths)
+        new_s = perf_counter() - st
+        assert len(old) == len(new) == len(paths)
+        mismatched = sum(a != b for a, b in zip(old, new))
+
+        label = f"synthetic {args.overhead_ms:g}+{args.per_image_ms:g}/image ms" if args.synthetic else ocr.model_name
+        print(f"images={len(paths)} (unreadable {old.count(None)}) size={w}x{h} batch={args.batch_size}"
+              f" model={label} decode_workers={ocr.decode_workers} cpus={os.cpu_count()}")
+        print(f"{'mode':>9} {'total s':>8} {'img/s':>7}")
+        print(f"{'per-image':>9} {old_s:>8.2f} {len(paths) / old_s:>7.1f}")
+        print(f"{'batched':>9} {new_s:>8.2f} {len(paths) / new_s:>7.1f}   speedup {old_s / new_s:.2f}x")
+        t = ocr.last_timings
+        print(f"batched stages (s): decode wait {t['decode_wait']:.2f}, inference {t['inference']:.2f}")
+        print(f"results differing from the per-image loop: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
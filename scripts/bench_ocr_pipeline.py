@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Pipelined batch OCR (persistent pools, next batch decoded during inference) vs the previous
+sequential loop (new thread pools per batch; decode, inference and post-processing one after another).
+
+Both run OCRPipeline.extract_from_image_path_batch's work on the same images; the pipelined run also
+prints its per-stage timings (decode wait, prefilter, inference, post wait).
+
+--synthetic replaces doctr with a stand-in whose call takes `overhead + per_image * n` ms (sleeping,
+so the GIL is released like torch kernels) and returns one empty page per image; use it where doctr
+or its weights are not available.
+
+Usage:
+  python scripts/bench_ocr_pipeline.py --synthetic
+  python scripts/bench_ocr_pipeline.py --n 128 --batch-size 8 --size 1600x1200
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter, sleep
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Pipelined vs sequential batch OCR")
+    ap.add_argument("--n", type=int, default=64, help="Images")
+    ap.add_argument("--batch-size", type=int, default=4, help="OCR micro-batch (OCR_DET_BATCH_SIZE)")
+    ap.add_argument("--size", default="1600x1200", help="Generated image size WxH")
+    ap.add_argument("--synthetic", action="store_true", help="Use a simulated OCR model instead of doctr")
+    ap.add_argument("--overhead-ms", type=float, default=20.0, help="Synthetic: fixed cost per model call")
+    ap.add_argument("--per-image-ms", type=float, default=40.0, help="Synthetic: cost per image in a call")
+    return ap.parse_args()
+
+
+class SyntheticOCR:
+    def __init__(self, overhead_ms: float, per_image_ms: float) -> None:
+        self.overhead = overhead_ms / 1000.0
+        self.per_image = per_image_ms / 1000.0
+
+    def __call__(self, images):
+        sleep(self.overhead + self.per_image * len(images))
+        return SimpleNamespace(pages=[SimpleNamespace(blocks=[]) for _ in images])
+
+
+def _make_images(n: int, w: int, h: int) -> list[str]:
+    from PIL import Image
+
+    tmp = tempfile.mkdtemp(prefix="bench_ocr_pipeline_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+        x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+        arr = np.stack([(y * rng.random() + x * rng.random()) * 127 + 64] * 3, axis=-1)
+        arr += rng.normal(0, 6, arr.shape).astype(np.float32)
+        path = os.path.join(tmp, f"{i}.jpg")
+        Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def sequential(ocr, paths: list[str], threshold: float) -> list:
+    """The previous extract_from_image_path_batch loop."""
+    out = []
+    for i in range(0, len(paths), ocr.bs):
+        batch = paths[i:i + ocr.bs]
+        with ThreadPoolExecutor() as ex:
+            images = list(ex.map(ocr._process_image_file, batch))
+        valid = [img for img in images if img is not None]
+        results = ocr.model(valid)
+        with ThreadPoolExecutor() as ex:
+            texts = iter(list(ex.map(lambda p: ocr._process_page_result(p, ocr_threshold=threshold), results.pages)))
+        out.extend(None if img is None else next(texts, None) for img in images)
+    return out
+
+
+def main():
+    args = parse_args()
+    w, h = (int(x) for x in args.size.lower().split("x"))
+    paths = _make_images(args.n, w, h)
+
+    from app import create_app
+    from app.services.ocr_pipeline import OCRPipeline
+
+    app = create_app()
+    with app.app_context():
+        threshold = app.config.get("OCR_THRESHOLD", 0.3)
+        ocr = OCRPipeline(
+            det_arch=app.config.get("OCR_DET_ARCH", "db_mobilenet_v3_large"),
+            reco_arch=app.config.get("OCR_RECO_ARCH", "crnn_mobilenet_v3_large"),
+            det_bs=args.batch_size,
+            decode_workers=app.config.get("OCR_DECODE_WORKERS", 0),
+            post_workers=app.config.get("OCR_POST_WORKERS", 2),
+            model=SyntheticOCR(args.overhead_ms, args.per_image_ms) if args.synthetic else None,
+        )
+        if ocr.model is None:
+            sys.exit("OCR model unavailable; try --synthetic")
+
+        ocr.extract_from_image_path_batch(paths[: args.batch_size], ocr_threshold=threshold)  # warm-up
+        st = perf_counter()
+        seq = sequential(ocr, paths, threshold)
+        seq_s = perf_counter() - st
+        st = perf_counter()
+        pipe = ocr.extract_from_image_path_batch(paths, ocr_threshold=threshold)
+        pipe_s = perf_counter() - st
+        assert len(seq) == len(pipe) == len(paths)
+
+        label = f"synthetic {args.overhead_ms:g}+{args.per_image_ms:g}/image ms" if args.synthetic else "doctr"
+        print(f"images={len(paths)} size={w}x{h} batch={args.batch_size} model={label}"
+              f" decode_workers={ocr.decode_workers} post_workers={ocr.post_workers} cpus={os.cpu_count()}")
+        print(f"{'mode':>10} {'total s':>8} {'img/s':>7}")
+        print(f"{'sequential':>10} {seq_s:>8.2f} {len(paths) / seq_s:>7.1f}")
+        print(f"{'pipelined':>10} {pipe_s:>8.2f} {len(paths) / pipe_s:>7.1f}   speedup {seq_s / pipe_s:.2f}x")
+        t = ocr.last_timings
+        print(f"pipelined stages (s): decode wait {t['decode_wait']:.2f}, prefilter {t['prefilter']:.2f},"
+              f" inference {t['inference']:.2f}, post wait {t['post_wait']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
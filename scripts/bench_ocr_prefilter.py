@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Speedup and false-negative rate of the OCR text-presence prefilter (OCR_PREFILTER).
+
+Ground truth is the teammates' labelled set: `others/imagedrive--OCR-main/ocr_metadata.json` maps each
+file in `image/` to its OCR text (null = no usable text). For every image and mode:
+- off:        full OCR (detection + recognition) on every image;
+- heuristic:  text_score, full OCR only above --min-score;
+- detection:  detection model only, full OCR only when a box scores >= --det-min-score.
+
+Reported per mode: images skipped, false negatives (labelled with text but skipped), seconds per image
+including the prefilter, and speedup over off. Without doctr/torch only the heuristic is evaluated
+(skip / false-negative rates and its own cost). `--sweep` prints the heuristic trade-off over thresholds.
+
+The images are stored with Git LFS; run `git lfs pull` first.
+
+Usage:
+  python scripts/bench_ocr_prefilter.py
+  python scripts/bench_ocr_prefilter.py --modes heuristic --sweep 1,2,3,5,8
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_METADATA = os.path.join(ROOT_DIR, "others", "imagedrive--OCR-main", "ocr_metadata.json")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="OCR prefilter speedup / false-negative benchmark")
+    ap.add_argument("--metadata", default=DEFAULT_METADATA, help="JSON {filename: text | null}")
+    ap.add_argument("--images", default=None, help="Image dir (default: image/ next to the metadata)")
+    ap.add_argument("--modes", default="heuristic,detection", help="Prefilter modes to compare against off")
+    ap.add_argument("--min-score", type=float, default=None, help="Heuristic threshold (default OCR_PREFILTER_MIN_SCORE)")
+    ap.add_argument("--det-min-score", type=float, default=None, help="Detection box score (default OCR_PREFILTER_DET_MIN_SCORE)")
+    ap.add_argument("--sweep", default="", help="Comma-separated heuristic thresholds to tabulate")
+    return ap.parse_args()
+
+
+def _load(metadata: str, image_dir: str) -> tuple[list[str], list[np.ndarray], list[bool], int]:
+    from PIL import Image
+
+    with open(metadata, encoding="utf-8") as f:
+        labels = json.load(f)
+    names, images, has_text, unreadable = [], [], [], 0
+    for name, text in labels.items():
+        try:
+            with Image.open(os.path.join(image_dir, name)) as im:
+                images.append(np.array(im.convert("RGB")))
+        except Exception:
+            # missing, or still a Git LFS pointer
+            unreadable += 1
+            continue
+        names.append(name)
+        has_text.append(bool(text and text.strip()))
+    return names, images, has_text, unreadable
+
+
+def main():
+    args = parse_args()
+    image_dir = args.images or os.path.join(os.path.dirname(args.metadata), "image")
+    names, images, has_text, unreadable = _load(args.metadata, image_dir)
+    if unreadable:
+        print(f"{unreadable} labelled files could not be read (missing or Git LFS pointers: run `git lfs pull`)")
+    if not images:
+        sys.exit("no images to evaluate")
+    truth = np.asarray(has_text)
+    print(f"images={len(images)} with_text={int(truth.sum())} without_text={int((~truth).sum())}")
+
+    from app import create_app
+    from app.services.ocr_prefilter import text_score
+    from app.services.ocr_pipeline import OCRPipeline
+
+    app = create_app()
+    with app.app_context():
+        min_score = args.min_score if args.min_score is not None else app.config.get("OCR_PREFILTER_MIN_SCORE", 3)
+        det_min = args.det_min_score if args.det_min_score is not None else app.config.get("OCR_PREFILTER_DET_MIN_SCORE", 0.3)
+        threshold = app.config.get("OCR_THRESHOLD", 0.3)
+
+        st = perf_counter()
+        scores = np.asarray([text_score(img) for img in images])
+        heuristic_s = (perf_counter() - st) / len(images)
+
+        if args.sweep:
+            print(f"\nheuristic threshold sweep (text_score {heuristic_s * 1000:.1f} ms/image)")
+            print(f"{'min_score':>9} {'skipped':>8} {'false neg':>10}")
+            for t in (float(x) for x in args.sweep.split(",") if x.strip()):
+                skip = scores < t
+                fn = (skip & truth).sum() / max(1, truth.sum())
+                print(f"{t:>9g} {skip.mean():>8.1%} {fn:>10.1%}")
+
+        ocr = OCRPipeline(
+            det_arch=app.config.get("OCR_DET_ARCH", "db_mobilenet_v3_large"),
+            reco_arch=app.config.get("OCR_RECO_ARCH", "crnn_mobilenet_v3_large"),
+            det_bs=1,
+        )
+        model = ocr.model
+
+        def full_ocr(img) -> float:
+            st = perf_counter()
+            ocr._process_page_result(model([img]).pages[0], ocr_threshold=threshold)
+            return perf_counter() - st
+
+        full_times = None
+        if model is not None:
+            full_ocr(images[0])  # warm-up
+            full_times = np.asarray([full_ocr(img) for img in images])
+
+        print(f"\n{'mode':>10} {'skipped':>8} {'false neg':>10} {'prefilter ms':>12} {'s/image':>8} {'speedup':>8}")
+        if full_times is not None:
+            print(f"{'off':>10} {0:>8.1%} {0:>10.1%} {0:>12.1f} {full_times.mean():>8.3f} {1:>7.2f}x")
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            if mode == "heuristic":
+                keep, pre_s = scores >= min_score, np.full(len(images), heuristic_s)
+            elif mode == "detection":
+                if model is None:
+                    print(f"{mode:>10} (OCR model unavailable)")
+                    continue
+                from app.services.ocr_prefilter import _has_boxes
+
+                keep, pre = [], []
+                for img in images:
+                    st = perf_counter()
+                    keep.append(_has_boxes(model.det_predictor([img])[0], det_min))
+                    pre.append(perf_counter() - st)
+                keep, pre_s = np.asarray(keep), np.asarray(pre)
+            else:
+                continue
+            skip = ~keep
+            fn = (skip & truth).sum() / max(1, truth.sum())
+            if full_times is None:
+                print(f"{mode:>10} {skip.mean():>8.1%} {fn:>10.1%} {pre_s.mean() * 1000:>12.1f} {'-':>8} {'-':>8}")
+                continue
+            per_image = (pre_s + np.where(keep, full_times, 0.0)).mean()
+            print(f"{mode:>10} {skip.mean():>8.1%} {fn:>10.1%} {pre_s.mean() * 1000:>12.1f} {per_image:>8.3f}"
+                  f" {full_times.mean() / per_image:>7.2f}x")
+            missed = [n for n, s, t in zip(names, skip, truth) if s and t]
+            if missed:
+                print(f"{'':>10} false negatives: {', '.join(missed[:10])}{' ...' if len(missed) > 10 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmark OCR text search: ILIKE scan vs the full-text index (services.ocr_search).
+
+Fills a throw-away SQLite DB with `--rows` synthetic OCR texts (noisy Latin words and Chinese text)
+spread over `--users` owners, builds the FTS5 index, then times `search_ocr_text` per backend for
+Latin-word and Chinese queries. Run against Postgres by setting DATABASE_URL to an empty database.
+
+Usage:
+  python scripts/bench_ocr_search.py                       # 1M rows, 10 users
+  python scripts/bench_ocr_search.py --rows 100000 --queries 100
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_CHUNK = 20000
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="OCR search latency: ILIKE vs full-text index")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="OCR rows in total")
+    ap.add_argument("--users", type=int, default=10, help="Owners the rows are spread over")
+    ap.add_argument("--queries", type=int, default=200, help="Queries per kind and backend (ILIKE: a tenth)")
+    ap.add_argument("--k", type=int, default=20)
+    return ap.parse_args()
+
+
+def _vocab(rng) -> tuple[list[str], list[str]]:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = sorted({"".join(rng.choice(letters, size=rng.integers(3, 10))) for _ in range(20000)})
+    hanzi = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+    # two- to four-character "words" so that some bigrams are common and others rare
+    zh_words = ["".join(rng.choice(hanzi, size=rng.integers(2, 5))) for _ in range(20000)]
+    return words, zh_words
+
+
+def _text(rng, words, zh_words) -> str:
+    parts = []
+    for _ in range(int(rng.integers(3, 25))):
+        if rng.random() < 0.5:
+            w = words[int(rng.zipf(1.3)) % len(words)]
+            parts.append(w.upper() if rng.random() < 0.3 else w)
+        else:
+            parts.append(zh_words[int(rng.zipf(1.3)) % len(zh_words)])
+    return " ".join(parts)
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def main():
+    args = parse_args()
+    if not os.environ.get("DATABASE_URL"):
+        tmp = tempfile.mkdtemp(prefix="bench_ocr_search_")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from sqlalchemy import insert
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, OCRText
+    from app.services.ocr_search import ensure_ocr_search_index, search_ocr_text
+
+    rng = np.random.default_rng(0)
+    words, zh_words = _vocab(rng)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"bench_ocr_{i}", password_hash="<bench>") for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+
+        st = perf_counter()
+        next_id = (db.session.query(db.func.max(Image.id)).scalar() or 0) + 1
+        for start in range(0, args.rows, _CHUNK):
+            n = min(_CHUNK, args.rows - start)
+            ids = list(range(next_id + start, next_id + start + n))
+            db.session.execute(insert(Image), [
+                {"id": iid, "owner_id": user_ids[iid % len(user_ids)], "original_filename": f"{iid}.jpg",
+                 "storage_uri": f"local://bench_{iid}.jpg", "status": "READY", "visibility": "private"}
+                for iid in ids
+            ])
+            db.session.execute(insert(OCRText), [
+                {"image_id": iid, "text": _text(rng, words, zh_words)} for iid in ids
+            ])
+            db.session.commit()
+        print(f"rows={args.rows} users={args.users} (~{args.rows // args.users} rows/user), filled in {perf_counter() - st:.1f}s")
+
+        st = perf_counter()
+        backend = ensure_ocr_search_index(rebuild=True)
+        print(f"index build ({backend}): {perf_counter() - st:.1f}s")
+
+        kinds = {
+            "latin word": [words[int(rng.zipf(1.3)) % len(words)] for _ in range(args.queries)],
+            "chinese": [zh_words[int(rng.zipf(1.3)) % len(zh_words)] for _ in range(args.queries)],
+            "mixed": [f"{zh_words[int(rng.integers(50))]} {words[int(rng.integers(50))]}" for _ in range(args.queries)],
+        }
+        print(f"{'query':>10} {'backend':>8} {'p50 ms':>9} {'p99 ms':>9} {'avg hits':>9}")
+        for kind, queries in kinds.items():
+            for mode in ("like", "auto"):
+                app.config["OCR_SEARCH_BACKEND"] = mode
+                n = max(5, len(queries) // 10) if mode == "like" else len(queries)
+                samples, hits = [], 0
+                for i in range(n):
+                    owner = user_ids[i % len(user_ids)]
+                    st = perf_counter()
+                    hits += len(search_ocr_text(owner, queries[i], top_k=args.k))
+                    samples.append(perf_counter() - st)
+                    db.session.rollback()
+                p50, p99 = _percentiles(samples)
+                label = "ilike" if mode == "like" else backend
+                print(f"{kind:>10} {label:>8} {p50:>9.2f} {p99:>9.2f} {hits / n:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmark embedding / OCR reuse across users (services.result_reuse).
+
+User A owns `--files` images whose Embedding and OCRText rows are already stored (synthetic vectors
+and text, stamped with the configured CLIP model and OCR architectures). User B then uploads the
+same bytes: `process_image` runs for each of B's images with RESULT_REUSE on, and (when the models
+are installed) once more with it off, in a throw-away SQLite DB and UPLOAD_DIR. Prints p50 / p99 per
+image and the hit counters reported under `result_reuse` in /api/v1/health.
+
+Reuse hits never load the models, so the reuse round runs without torch / doctr installed.
+
+Usage:
+  python scripts/bench_result_reuse.py
+  python scripts/bench_result_reuse.py --files 500 --size 1024
+"""
+from __future__ import annotations
+import io
+import os
+import sys
+import argparse
+import hashlib
+import tempfile
+from importlib.util import find_spec
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="process_image latency with and without result reuse")
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--size", type=int, default=640, help="Image side in pixels")
+    return ap.parse_args()
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def _jpegs(n: int, size: int) -> list[bytes]:
+    from PIL import Image as PILImage
+
+    rng = np.random.default_rng(0)
+    out = []
+    for _ in range(n):
+        pixels = rng.integers(0, 256, (size // 8, size // 8, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        PILImage.fromarray(pixels).resize((size, size)).save(buf, "JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_result_reuse_")
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding, OCRText
+    from app.services.embedding_io import to_bytes
+    from app.services.result_reuse import SOURCE_PIPELINE, get_reuse_stats
+    from app.services.storage import put_blob
+    from app.tasks.jobs import process_image
+
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(tmp, "uploads"),
+    })
+    files = _jpegs(args.files, args.size)
+    rng = np.random.default_rng(1)
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"bench_reuse_{i}", password_hash="<bench>") for i in range(3)]
+        db.session.add_all(users)
+        db.session.commit()
+        clip_version = app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+        ocr_version = f"{app.config.get('OCR_DET_ARCH')} + {app.config.get('OCR_RECO_ARCH')}"
+
+        def add_images(owner_id: int, status: str) -> list[int]:
+            ids = []
+            for i, data in enumerate(files):
+                checksum = hashlib.sha256(data).hexdigest()
+                img = Image(owner_id=owner_id, original_filename=f"img_{i}.jpg", storage_uri=put_blob(data, checksum, ".jpg"),
+                            mime_type="image/jpeg", checksum=checksum, status=status, visibility="private")
+                db.session.add(img)
+                db.session.flush()
+                ids.append(img.id)
+            db.session.commit()
+            return ids
+
+        # user A: already processed
+        for iid in add_images(users[0].id, "READY"):
+            vec = rng.standard_normal(512).astype(np.float32)
+            vec /= np.linalg.norm(vec)
+            db.session.add(Embedding(image_id=iid, vec=to_bytes(vec), dim=512, model_version=clip_version,
+                                     source=SOURCE_PIPELINE))
+            db.session.add(OCRText(image_id=iid, text=f"RECEIPT NO {iid}", model_version=ocr_version,
+                                   source=SOURCE_PIPELINE))
+        db.session.commit()
+
+        rounds = [("reuse", users[1], True)]
+        if find_spec("torch") and find_spec("doctr"):
+            rounds.append(("inference", users[2], False))
+        print(f"files={args.files} size={args.size}px cpus={os.cpu_count()}")
+        print(f"{'round':>10} {'p50 ms':>9} {'p99 ms':>9} {'embedded':>9}")
+        for label, user, reuse in rounds:
+            app.config["RESULT_REUSE"] = reuse
+            samples, embedded = [], 0
+            for iid in add_images(user.id, "PENDING"):
+                st = perf_counter()
+                result = process_image(iid)
+                samples.append(perf_counter() - st)
+                embedded += bool(result.get("has_embedding"))
+            p50, p99 = _percentiles(samples)
+            print(f"{label:>10} {p50:>9.2f} {p99:>9.2f} {embedded:>9}")
+        if len(rounds) == 1:
+            print("inference round skipped: torch / doctr not installed")
+        print(f"result_reuse: {get_reuse_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark POST /api/v1/search/batch against N sequential single-query calls.
+
+Goes through the Flask test client (auth, JSON and response building included). Each round sends
+the same mix of queries both ways:
+- sequential: one /search/vector, /search/image/{id}/similar (or /search/text) request per query
+- batch: a single /search/batch request carrying all of them (one text encode, one FAISS search)
+
+Text queries need the CLIP model (sentence-transformers); they are only mixed in with --text.
+
+Usage:
+  python scripts/bench_search_batch.py
+  python scripts/bench_search_batch.py --n 50000 --batch-sizes 1,8,32,64 --rounds 30 --text
+
+Runs against a throw-away SQLite DB and INDEX_DIR under a temp directory.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+_WORDS = ["cat", "dog", "beach", "sunset", "car", "mountain", "city", "food", "receipt", "snow", "bird", "tree"]
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Batched multi-query search vs sequential calls")
+    ap.add_argument("--n", type=int, default=50000, help="Images in the user's library")
+    ap.add_argument("--dim", type=int, default=512, help="Vector dim (ignored with --text: taken from the model)")
+    ap.add_argument("--batch-sizes", default="1,8,32,64", help="Comma-separated queries per request")
+    ap.add_argument("--rounds", type=int, default=30, help="Rounds per batch size")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--text", action="store_true", help="Mix text queries in (loads the CLIP model)")
+    return ap.parse_args()
+
+
+def _populate(db, User, Image, Embedding, to_bytes, n: int, dim: int, rng) -> tuple[int, list[int]]:
+    user = User(username="bench_batch", password_hash="<bench>")
+    db.session.add(user)
+    db.session.commit()
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    db.session.bulk_insert_mappings(Image, [
+        {
+            "owner_id": user.id,
+            "original_filename": f"{i}.jpg",
+            "storage_uri": f"local://bench_{i}.jpg",
+            "status": "READY",
+            "visibility": "private",
+        }
+        for i in range(n)
+    ])
+    db.session.commit()
+    ids = [iid for (iid,) in db.session.query(Image.id).filter(Image.owner_id == user.id).order_by(Image.id)]
+    db.session.bulk_insert_mappings(Embedding, [
+        {"image_id": iid, "vec": to_bytes(v), "dim": dim, "model_version": "bench"}
+        for iid, v in zip(ids, vecs)
+    ])
+    db.session.commit()
+    return user.id, ids
+
+
+def _make_queries(rng, size: int, dim: int, image_ids: list[int], text: bool) -> list[dict]:
+    kinds = ("vector", "image", "text") if text else ("vector", "image")
+    queries = []
+    for i in range(size):
+        kind = kinds[i % len(kinds)]
+        if kind == "vector":
+            queries.append({"vector": rng.standard_normal(dim).astype(np.float32).tolist()})
+        elif kind == "image":
+            queries.append({"image_id": int(rng.choice(image_ids))})
+        else:
+            queries.append({"text": f"a photo of a {rng.choice(_WORDS)} {i}"})
+    return queries
+
+
+def _sequential(client, headers, queries: list[dict], k: int) -> None:
+    for q in queries:
+        if "vector" in q:
+            resp = client.post("/api/v1/search/vector", json={"vector": q["vector"], "k": k}, headers=headers)
+        elif "image_id" in q:
+            resp = client.get(f"/api/v1/search/image/{q['image_id']}/similar?k={k}", headers=headers)
+        else:
+            resp = client.post("/api/v1/search/text", json={"query": q["text"], "k": k}, headers=headers)
+        assert resp.status_code == 200, resp.get_json()
+
+
+def _batch(client, headers, queries: list[dict], k: int) -> None:
+    resp = client.post("/api/v1/search/batch", json={"queries": queries, "k": k}, headers=headers)
+    assert resp.status_code == 200, resp.get_json()
+    assert all("error" not in r for r in resp.get_json()["data"]["results"])
+
+
+def main():
+    args = parse_args()
+    sizes = [int(s) for s in args.batch_sizes.split(",") if s.strip()]
+    tmp = tempfile.mkdtemp(prefix="bench_batch_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "faiss")
+    os.environ["SEARCH_BATCH_MAX_QUERIES"] = str(max(sizes + [64]))
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding
+    from app.services.embedding_io import to_bytes
+    from app.services.index_store import search_topk
+    from app.services.clip_pipeline import embed_text
+
+    app = create_app()
+    client = app.test_client()
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        db.create_all()
+        dim = args.dim
+        if args.text:
+            probe = embed_text("warm up")
+            if probe is None:
+                sys.exit("CLIP model unavailable; run without --text")
+            dim = int(probe.shape[0])
+        user_id, image_ids = _populate(db, User, Image, Embedding, to_bytes, args.n, dim, rng)
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        search_topk(user_id, rng.standard_normal(dim).astype(np.float32), k=args.k)  # warm: build + persist + cache
+
+    mix = "vector/image/text" if args.text else "vector/image"
+    print(f"n={args.n} dim={dim} k={args.k} mix={mix} rounds={args.rounds}")
+    print(f"{'queries':>8} {'sequential ms':>14} {'batch ms':>9} {'speedup':>8} {'batch ms/query':>15}")
+    for size in sizes:
+        seq, bat = [], []
+        for _ in range(args.rounds):
+            queries = _make_queries(rng, size, dim, image_ids, args.text)
+            st = perf_counter()
+            _sequential(client, headers, queries, args.k)
+            seq.append(perf_counter() - st)
+            st = perf_counter()
+            _batch(client, headers, queries, args.k)
+            bat.append(perf_counter() - st)
+        seq_ms = float(np.median(seq)) * 1000.0
+        bat_ms = float(np.median(bat)) * 1000.0
+        print(f"{size:>8} {seq_ms:>14.2f} {bat_ms:>9.2f} {seq_ms / bat_ms:>7.1f}x {bat_ms / size:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
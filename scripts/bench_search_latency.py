@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark vector / similar search latency against library size.
+
+Compares the legacy request path (load every (Image.id, Embedding.vec, Embedding.dim)
+row of the user and decode each blob on every call, then query the cached index)
+with the current path that answers straight from the cached per-user FAISS index.
+
+Usage:
+  python scripts/bench_search_latency.py
+  python scripts/bench_search_latency.py --sizes 1000,10000,50000 --queries 200
+
+Runs against a throw-away SQLite DB and INDEX_DIR under a temp directory; no model needed.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Search latency vs library size (before/after)")
+    ap.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated library sizes")
+    ap.add_argument("--queries", type=int, default=200, help="Queries per size and path")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--dim", type=int, default=512)
+    return ap.parse_args()
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def _populate(db, User, Image, Embedding, to_bytes, username: str, n: int, dim: int, rng) -> int:
+    user = User(username=username, password_hash="<bench>")
+    db.session.add(user)
+    db.session.commit()
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    db.session.bulk_insert_mappings(Image, [
+        {
+            "owner_id": user.id,
+            "original_filename": f"{i}.jpg",
+            "storage_uri": f"local://{username}_{i}.jpg",
+            "status": "READY",
+            "visibility": "private",
+        }
+        for i in range(n)
+    ])
+    db.session.commit()
+    ids = [iid for (iid,) in db.session.query(Image.id).filter(Image.owner_id == user.id).order_by(Image.id)]
+    db.session.bulk_insert_mappings(Embedding, [
+        {"image_id": iid, "vec": to_bytes(v), "dim": dim, "model_version": "bench"}
+        for iid, v in zip(ids, vecs)
+    ])
+    db.session.commit()
+    return user.id
+
+
+def main():
+    args = parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    tmp = tempfile.mkdtemp(prefix="bench_search_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["INDEX_DIR"] = os.path.join(tmp, "faiss")
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User, Image, Embedding
+    from app.services.embedding_io import from_bytes, to_bytes
+    from app.services.index_store import search_topk, get_vector
+
+    def legacy_rows(user_id: int):
+        rows = (
+            db.session.query(Image.id, Embedding.vec, Embedding.dim)
+            .join(Embedding, Embedding.image_id == Image.id)
+            .filter(Image.owner_id == user_id, Image.status == "READY")
+            .order_by(Image.id.asc())
+            .all()
+        )
+        return [int(iid) for iid, _, _ in rows], [from_bytes(vec_bytes) for _, vec_bytes, _ in rows]
+
+    def legacy_search(user_id: int, query, k: int):
+        legacy_rows(user_id)
+        return search_topk(user_id, query, k=k)
+
+    def legacy_similar(user_id: int, image_id: int, k: int):
+        image_ids, vectors = legacy_rows(user_id)
+        return search_topk(user_id, vectors[image_ids.index(image_id)], k=k + 1)
+
+    def current_similar(user_id: int, image_id: int, k: int):
+        return search_topk(user_id, get_vector(user_id, image_id), k=k + 1)
+
+    app = create_app()
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        db.create_all()
+        print(f"{'size':>8} {'endpoint':>8} {'path':>7} {'p50 ms':>9} {'p99 ms':>9}")
+        for n in sizes:
+            user_id = _populate(db, User, Image, Embedding, to_bytes, f"bench_{n}", n, args.dim, rng)
+            image_ids = [iid for (iid,) in db.session.query(Image.id).filter(Image.owner_id == user_id)]
+            queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+            targets = rng.choice(image_ids, size=args.queries)
+            search_topk(user_id, queries[0], k=args.k)  # warm: build + persist + cache
+
+            cases = [
+                ("vector", "before", lambda i: legacy_search(user_id, queries[i], args.k)),
+                ("vector", "after", lambda i: search_topk(user_id, queries[i], k=args.k)),
+                ("similar", "before", lambda i: legacy_similar(user_id, int(targets[i]), args.k)),
+                ("similar", "after", lambda i: current_similar(user_id, int(targets[i]), args.k)),
+            ]
+            for endpoint, path, fn in cases:
+                samples = []
+                for i in range(args.queries):
+                    st = perf_counter()
+                    fn(i)
+                    samples.append(perf_counter() - st)
+                    db.session.rollback()  # release the read transaction like a request teardown
+                p50, p99 = _percentiles(samples)
+                print(f"{n:>8} {endpoint:>8} {path:>7} {p50:>9.2f} {p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Benchmark content-addressed uploads: first upload vs re-upload of the same file.
+
+Uploads `--files` distinct JPEGs through POST /api/v1/files/upload (test client, inline processing,
+throw-away SQLite DB and UPLOAD_DIR), then uploads them all again as the same owner and once as a
+second owner, and prints p50 / p99 latency per round plus the blobs on disk. Re-uploads by the same
+owner return the existing image; the second owner gets new rows that share the blobs.
+
+First-upload latency includes CLIP / OCR only if their models are installed; without them the gap
+to the duplicate round is mostly the blob write and the PENDING -> READY commits.
+
+Usage:
+  python scripts/bench_upload_dedup.py
+  python scripts/bench_upload_dedup.py --files 500 --size 1024
+"""
+from __future__ import annotations
+import io
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Upload latency: first upload vs duplicate")
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--size", type=int, default=640, help="Image side in pixels")
+    return ap.parse_args()
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    arr = np.asarray(samples) * 1000.0
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def _jpegs(n: int, size: int) -> list[bytes]:
+    from PIL import Image as PILImage
+
+    rng = np.random.default_rng(0)
+    out = []
+    for _ in range(n):
+        pixels = rng.integers(0, 256, (size // 8, size // 8, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        PILImage.fromarray(pixels).resize((size, size)).save(buf, "JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_upload_dedup_")
+    upload_dir = os.path.join(tmp, "uploads")
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "UPLOAD_DIR": upload_dir,
+    })
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    tokens = []
+    for name in ("bench_upload_a", "bench_upload_b"):
+        client.post("/api/v1/auth/register", json={"username": name, "password": "bench-pass"})
+        resp = client.post("/api/v1/auth/login", json={"username": name, "password": "bench-pass"})
+        tokens.append(resp.get_json()["data"]["access_token"])
+
+    files = _jpegs(args.files, args.size)
+
+    def upload(token: str, data: bytes, i: int) -> tuple[float, dict]:
+        st = perf_counter()
+        resp = client.post(
+            "/api/v1/files/upload",
+            data={"file": (io.BytesIO(data), f"img_{i}.jpg", "image/jpeg")},
+            headers={"Authorization": f"Bearer {token}"},
+            content_type="multipart/form-data",
+        )
+        return perf_counter() - st, resp.get_json()["data"]
+
+    print(f"files={args.files} size={args.size}px (~{np.mean([len(f) for f in files]) / 1024:.0f} KiB) cpus={os.cpu_count()}")
+    print(f"{'round':>16} {'p50 ms':>9} {'p99 ms':>9} {'duplicate':>10}")
+    for label, token in (("first upload", tokens[0]), ("same owner", tokens[0]), ("other owner", tokens[1])):
+        samples, dups = [], 0
+        for i, data in enumerate(files):
+            elapsed, payload = upload(token, data, i)
+            samples.append(elapsed)
+            dups += bool(payload.get("duplicate"))
+        p50, p99 = _percentiles(samples)
+        print(f"{label:>16} {p50:>9.2f} {p99:>9.2f} {dups:>10}")
+
+    blobs = [os.path.join(d, f) for d, _, fs in os.walk(os.path.join(upload_dir, "cas")) for f in fs]
+    total = sum(os.path.getsize(p) for p in blobs)
+    print(f"blobs on disk: {len(blobs)} ({total / 2**20:.1f} MiB) for {3 * args.files} uploads")
+
+
+if __name__ == "__main__":
+    main()
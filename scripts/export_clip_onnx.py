@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Export the CLIP vision and text towers to ONNX for CLIP_BACKEND=onnx.
+
+Writes to CLIP_ONNX_DIR/<model> (what the app loads); the app also exports on first load, this
+script lets it happen at deploy time on a machine that has torch.
+
+Usage:
+  python scripts/export_clip_onnx.py
+  python scripts/export_clip_onnx.py --model clip-ViT-B-32 --quantize
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Export CLIP towers to ONNX")
+    ap.add_argument("--model", default=None, help="sentence-transformers model (default CLIP_MODEL_NAME)")
+    ap.add_argument("--out", default=None, help="Output dir (default CLIP_ONNX_DIR/<model>)")
+    ap.add_argument("--quantize", action="store_true", help="Also write int8 dynamically quantized towers")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    from app import create_app
+    from app.services.clip_onnx import default_model_dir, export_clip_onnx
+
+    app = create_app()
+    with app.app_context():
+        model = args.model or app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32")
+        out = args.out or default_model_dir(app.config, model)
+        export_clip_onnx(model, out, quantize=args.quantize, logger=app.logger)
+        print(f"Exported {model} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 import bcrypt
-import uuid
 import hashlib
 from pathlib import Path
 from time import perf_counter
@@ -12,7 +11,11 @@ from app import create_app
 from app.models import User, Image, Embedding, OCRText, db
 from app.services.clip_pipeline import embed_image_path_batch, get_model_name
 from app.services.embedding_io import l2_normalize, to_bytes
-from app.services.ocr_pipeline import ocr_extract_from_image_path_batch  # switchable
+from app.services.image_decode import DecodedImage
+from app.services.ocr_pipeline import ocr_extract_from_image_path_batch, get_model_version as get_ocr_model_version  # switchable
+from app.services.result_reuse import SOURCE_PIPELINE
+from app.services.storage import blob_uris, cas_uri, ensure_blob
+from app.tasks import enqueue
 
 
 _EXAMPLE_USERNAME = "example_user"
@@ -77,10 +80,36 @@ def batch_upload_dataset(user_id) -> None:
     _process_images_in_batches(image_paths, user_id, len_subset=len_subset)
 
 
+def _store_pending(sources, checksums, blobs, owner_id) -> list[int]:
+    """Store the files and add PENDING images for them (committed); returns their ids."""
+    images = []
+    for source, checksum in zip(sources, checksums):
+        original_filename = os.path.basename(source.path)
+        ext = os.path.splitext(secure_filename(original_filename))[-1].lower()
+        storage_uri = blobs.get(checksum) or cas_uri(checksum, ext)
+        ensure_blob(storage_uri, source.data)
+        blobs[checksum] = storage_uri
+        img = Image(
+            owner_id=owner_id,
+            original_filename=original_filename,
+            storage_uri=storage_uri,
+            mime_type="image/" + ext[1:],
+            checksum=checksum,
+            status="PENDING",
+            visibility="private",
+        )
+        db.session.add(img)
+        images.append(img)
+    db.session.commit()
+    return [img.id for img in images]
+
+
 def _process_images_in_batches(image_paths, owner_id, len_subset=None):
     upload_dir = current_app.config.get("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
     os.makedirs(upload_dir, exist_ok=True)
     batch_size = current_app.config.get("BASE_UPLOAD_BATCH_SIZE", 32)
+    storage_dtype = current_app.config.get("EMBEDDING_STORAGE_DTYPE", "float32")
+    upload_async = current_app.config.get("BASE_UPLOAD_ASYNC", False)
     total_images = len_subset or len(image_paths)
     processed_count = 0
     success_count = 0
@@ -95,10 +124,61 @@ def _process_images_in_batches(image_paths, owner_id, len_subset=None):
             current_batch_num, total_batches, len(batch_paths)
         )
 
+        # each file is read once and decoded once, then shared by checksum, blob, CLIP and OCR
+        sources, checksums = [], []
+        for p in batch_paths:
+            try:
+                data = Path(p).read_bytes()
+            except OSError as e:
+                current_app.logger.error("Failed to read image %s: %s", p, e)
+                processed_count += 1
+                continue
+            sources.append(DecodedImage(p, data=data, full=True))
+            checksums.append(hashlib.sha256(data).hexdigest())
+
+        # skip files this owner already has (one query per batch) and repeats within the batch,
+        # before CLIP / OCR run on them
+        known = {
+            c for (c,) in db.session.query(Image.checksum)
+            .filter(Image.owner_id == owner_id, Image.checksum.in_(set(checksums)))
+        }
+        keep = []
+        for j, checksum in enumerate(checksums):
+            if checksum in known:
+                current_app.logger.debug("Image already exists: %s", sources[j].path)
+                processed_count += 1
+                continue
+            known.add(checksum)
+            keep.append(j)
+        sources = [sources[j] for j in keep]
+        checksums = [checksums[j] for j in keep]
+        if not sources:
+            continue
+        blobs = blob_uris(checksums)
+
+        if upload_async:
+            # CLIP / OCR run in the task workers: one batched process_images job per batch
+            try:
+                image_ids = _store_pending(sources, checksums, blobs, owner_id)
+                queued = enqueue("process_images", image_ids)
+            except Exception as e:
+                current_app.logger.error("Failed to queue batch %d: %s", current_batch_num, e)
+                db.session.rollback()
+                processed_count += len(sources)
+                continue
+            processed_count += len(sources)
+            success_count += len(image_ids)
+            current_app.logger.info(
+                "Batch %d/%d queued: %d images (%s task %s)",
+                current_batch_num, total_batches, len(image_ids), queued["backend"], queued["task_id"]
+            )
+            continue
+
         clip_st = perf_counter()  # timing
         clip_embeddings = None
         try:
-            clip_embeddings = embed_image_path_batch(batch_paths, batch_size=batch_size)
+            # files another user already uploaded reuse its stored embedding / text (no inference)
+            clip_embeddings = embed_image_path_batch(sources, batch_size=batch_size, checksums=checksums)
         except Exception as e:
             current_app.logger.error("Failed to batch embed images: %s", e)
         clip_ed = perf_counter()
@@ -106,35 +186,29 @@ def _process_images_in_batches(image_paths, owner_id, len_subset=None):
         ocr_st = perf_counter()
         ocr_texts = None
         try:
-            ocr_texts = ocr_extract_from_image_path_batch(batch_paths)
+            ocr_texts = ocr_extract_from_image_path_batch(sources, checksums=checksums)
         except Exception as e:
             current_app.logger.error("Failed to batch OCR images: %s", e)
         ocr_ed = perf_counter()
 
         upload_st = perf_counter()
         batch_success = 0
-        for j, image_path in enumerate(batch_paths):
+        for j, source in enumerate(sources):
+            image_path = source.path
             try:
                 processed_count += 1
 
-                checksum = _compute_file_checksum(image_path)
-                existing_image = Image.query.filter_by(checksum=checksum).first()
-                if existing_image:
-                    current_app.logger.debug("Image already exists: %s", image_path)
-                    continue
-
+                checksum = checksums[j]
                 original_filename = os.path.basename(image_path)
                 ext = os.path.splitext(secure_filename(original_filename))[-1].lower()
-                new_name = f"{uuid.uuid4().hex}{ext}"
-
-                source = Path(image_path)
-                dest = Path(os.path.join(upload_dir, new_name))
-                dest.write_bytes(source.read_bytes())
+                storage_uri = blobs.get(checksum) or cas_uri(checksum, ext)
+                ensure_blob(storage_uri, source.data)
+                blobs[checksum] = storage_uri
 
                 img = Image(
                     owner_id=owner_id,
                     original_filename=original_filename,
-                    storage_uri=f"local://{new_name}",
+                    storage_uri=storage_uri,
                     mime_type="image/" + ext[1:],
                     checksum=checksum,
                     status="READY",
@@ -147,12 +221,14 @@ def _process_images_in_batches(image_paths, owner_id, len_subset=None):
                     vec = clip_embeddings[j]
                     if vec is not None:
                         norm_vec = l2_normalize(vec)
-                        payload = to_bytes(norm_vec)
+                        payload = to_bytes(norm_vec, storage_dtype)
                         emb = Embedding(
                             image_id=img.id,
                             vec=payload,
                             dim=len(norm_vec),
-                            model_version=get_model_name(),
+                            dtype=storage_dtype,
+                            model_version=get_model_name() or current_app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32"),
+                            source=SOURCE_PIPELINE,
                         )
                         db.session.add(emb)
 
@@ -162,7 +238,9 @@ def _process_images_in_batches(image_paths, owner_id, len_subset=None):
                         ocr_row = OCRText(
                             image_id=img.id,
                             text=text,
-                            avg_confidence=None
+                            avg_confidence=None,
+                            model_version=get_ocr_model_version(),
+                            source=SOURCE_PIPELINE,
                         )
                         db.session.add(ocr_row)
 
@@ -199,19 +277,6 @@ def _process_images_in_batches(image_paths, owner_id, len_subset=None):
     )
 
 
-def _compute_file_checksum(file_path):
-    """compute SHA256 checksum of a file"""
-    sha256_hash = hashlib.sha256()
-    try:
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-    except Exception as e:
-        current_app.logger.error("Failed to compute checksum for %s: %s", file_path, e)
-        return None
-
-
 def main():
     app = create_app()
     with app.app_context():
@@ -226,6 +291,12 @@ def main():
                 current_app.logger.info("Start batch upload base dataset...")
                 batch_upload_dataset(example_user_id)
                 current_app.logger.info("Successfully uploaded base dataset.")
+                if app.config.get("BASE_UPLOAD_ASYNC", False):
+                    # workers started by this process exit with it; queued jobs wait in the queue
+                    current_app.logger.info(
+                        "Images are processed by the task workers (python scripts/run_task_workers.py "
+                        "or a web process with TASK_LOCAL_AUTOSTART)."
+                    )
 
             except Exception as e:
                 current_app.logger.error("Failed to upload base dataset: %s", e)
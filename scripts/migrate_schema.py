@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Bring an existing database up to the current models (idempotent).
+
+`db.create_all()` creates missing tables but never alters existing ones, so a database created before
+a model change lacks its columns and every query on the table fails ("no such column"). Each step
+below checks the live schema and only applies what is missing, so the script is safe to run on every
+deploy (SQLite and Postgres):
+- embeddings.dtype: blob encoding of the vector (float32 for existing rows)
+- ocr_texts.model_version: OCR setup that produced the text (NULL for existing rows, never reused)
+- embeddings.source / ocr_texts.source: "pipeline" | "ingest" (NULL for existing rows, never reused)
+- images: one row per (owner_id, checksum), and storage_uri no longer unique (content-addressed blobs
+  are shared). Duplicate rows of an owner are merged first: the READY (else the oldest) row is kept,
+  the others are deleted through the session like a delete via the API (vector / OCR indexes follow),
+  their tags move to the kept row and their files are released when no other row uses them. SQLite
+  cannot drop a table constraint, so there the table is rebuilt (new table, copy, drop, rename).
+
+Tables that do not exist yet are left to `db.create_all()`.
+
+Usage:
+  python scripts/migrate_schema.py            # apply pending steps
+  python scripts/migrate_schema.py --dry-run  # only list them
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+from typing import Callable
+
+from sqlalchemy import MetaData, func, inspect, text as sql_text
+from sqlalchemy.schema import CreateTable
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Image, Embedding, OCRText, ImageTag  # noqa: E402
+from app.services.storage import release_blob  # noqa: E402
+
+
+def _columns(table: str) -> set[str] | None:
+    insp = inspect(db.engine)
+    if not insp.has_table(table):
+        return None
+    return {c["name"] for c in insp.get_columns(table)}
+
+
+def _add_column(table: str, column: str, ddl: str) -> tuple[Callable[[], bool], Callable[[], None]]:
+    def pending() -> bool:
+        columns = _columns(table)
+        return columns is not None and column not in columns
+
+    def apply() -> None:
+        with db.engine.begin() as conn:
+            conn.execute(sql_text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+    return pending, apply
+
+
+def _unique_sets(table: str) -> set[tuple[str, ...]]:
+    insp = inspect(db.engine)
+    sets = {tuple(sorted(u["column_names"])) for u in insp.get_unique_constraints(table)}
+    sets |= {tuple(sorted(i["column_names"])) for i in insp.get_indexes(table) if i.get("unique")}
+    return sets
+
+
+def _images_pending() -> bool:
+    if _columns("images") is None:
+        return False
+    sets = _unique_sets("images")
+    return ("storage_uri",) in sets or ("checksum", "owner_id") not in sets
+
+
+def _dedup_images() -> list[str]:
+    """Keep one Image per (owner_id, checksum); returns the storage_uris of the deleted rows."""
+    groups = (
+        db.session.query(Image.owner_id, Image.checksum)
+        .filter(Image.checksum.is_not(None))
+        .group_by(Image.owner_id, Image.checksum)
+        .having(func.count(Image.id) > 1)
+        .all()
+    )
+    released = []
+    for owner_id, checksum in groups:
+        rows = Image.query.filter_by(owner_id=owner_id, checksum=checksum).order_by(Image.id).all()
+        keep = next((img for img in rows if img.status == "READY"), rows[0])
+        tag_ids = {t for (t,) in db.session.query(ImageTag.tag_id).filter_by(image_id=keep.id)}
+        for img in rows:
+            if img is keep:
+                continue
+            for tag in ImageTag.query.filter_by(image_id=img.id).all():
+                if tag.tag_id in tag_ids:
+                    db.session.delete(tag)
+                else:
+                    tag.image_id = keep.id
+                    tag_ids.add(tag.tag_id)
+            # dependent rows first (no ON DELETE CASCADE), as in the delete endpoint
+            Embedding.query.filter_by(image_id=img.id).delete()
+            OCRText.query.filter_by(image_id=img.id).delete()
+            released.append(img.storage_uri)
+            db.session.delete(img)
+        db.session.commit()
+    return released
+
+
+def _rebuild_sqlite_table(conn, table) -> None:
+    """Recreate `table` from the model, keeping its rows (SQLite's ALTER TABLE cannot change constraints)."""
+    live = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(c.name for c in table.columns if c.name in live)
+    metadata = MetaData()
+    for fk in table.foreign_keys:
+        # referenced tables must be known to render REFERENCES
+        fk.column.table.to_metadata(metadata)
+    new = table.to_metadata(metadata, name=f"{table.name}__new")
+    conn.execute(sql_text("PRAGMA foreign_keys=OFF"))
+    conn.execute(CreateTable(new))
+    conn.execute(sql_text(f"INSERT INTO {new.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(sql_text(f"DROP TABLE {table.name}"))
+    conn.execute(sql_text(f"ALTER TABLE {new.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _images_apply() -> None:
+    released = _dedup_images()
+    table = Image.__table__
+    with db.engine.begin() as conn:
+        if db.engine.dialect.name == "sqlite":
+            _rebuild_sqlite_table(conn, table)
+        else:
+            for unique in inspect(conn).get_unique_constraints("images"):
+                if unique["column_names"] == ["storage_uri"]:
+                    conn.execute(sql_text(f'ALTER TABLE images DROP CONSTRAINT "{unique["name"]}"'))
+            conn.execute(sql_text("CREATE INDEX IF NOT EXISTS ix_images_storage_uri ON images (storage_uri)"))
+            if ("checksum", "owner_id") not in _unique_sets("images"):
+                conn.execute(sql_text(
+                    "ALTER TABLE images ADD CONSTRAINT uq_images_owner_checksum UNIQUE (owner_id, checksum)"
+                ))
+    for uri in set(released):
+        try:
+            release_blob(uri)
+        except OSError:
+            print(f"[WARN] could not remove file of {uri}")
+
+
+# (name, pending, apply), in order
+STEPS: list[tuple[str, Callable[[], bool], Callable[[], None]]] = [
+    ("embeddings.dtype", *_add_column("embeddings", "dtype", "VARCHAR(16) NOT NULL DEFAULT 'float32'")),
+    ("ocr_texts.model_version", *_add_column("ocr_texts", "model_version", "VARCHAR(64)")),
+    ("embeddings.source", *_add_column("embeddings", "source", "VARCHAR(16)")),
+    ("ocr_texts.source", *_add_column("ocr_texts", "source", "VARCHAR(16)")),
+    # after the column steps: the merge loads Embedding / OCRText rows
+    ("images.uq_owner_checksum", _images_pending, _images_apply),
+]
+
+
+def migrate(dry_run: bool = False) -> list[str]:
+    """Apply the pending steps (inside an app context); returns their names."""
+    applied = []
+    for name, pending, apply in STEPS:
+        if not pending():
+            continue
+        if not dry_run:
+            apply()
+        applied.append(name)
+    return applied
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Add missing columns / constraints to an existing database")
+    ap.add_argument("--dry-run", action="store_true", help="List pending steps without changing the database")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+    with app.app_context():
+        applied = migrate(dry_run=args.dry_run)
+    if not applied:
+        print("Schema is up to date.")
+    for name in applied:
+        print(f"{'pending' if args.dry_run else 'applied'}: {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Build (or rebuild) the OCR full-text search index from the `ocr_texts` table.
+
+The index is also built on the first OCR search; run this after deploying it on a large library (so
+no request pays for the backfill) or after bulk changes that bypass the session hooks.
+
+Usage:
+  python scripts/rebuild_ocr_search.py            # create and backfill if missing
+  python scripts/rebuild_ocr_search.py --rebuild  # drop and rebuild
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+from time import perf_counter
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from app import create_app  # type: ignore
+from app.services.ocr_search import ensure_ocr_search_index  # type: ignore
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Build the OCR full-text search index")
+    ap.add_argument("--rebuild", action="store_true", help="Drop the existing index first")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    app = create_app()
+    with app.app_context():
+        st = perf_counter()
+        backend = ensure_ocr_search_index(rebuild=args.rebuild)
+        if backend == "like":
+            print("OCR search backend is ILIKE (OCR_SEARCH_BACKEND=like or no FTS support); nothing to build.")
+            return 0
+        print(f"OCR search index ready ({backend}) in {perf_counter() - st:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,7 +12,7 @@ Behavior:
 - Optionally wipes existing embeddings (default unless --only-missing).
 - For each selected image (status=READY, storage_uri starting with local://):
   * Loads file, runs embed_image_path -> float list.
-  * L2 normalizes vector (epsilon guarded) and stores bytes.
+  * L2 normalizes vector (epsilon guarded) and stores bytes in EMBEDDING_STORAGE_DTYPE.
 - Skips images with failed embedding silently; prints summary at end.
 
 Return codes:
@@ -36,6 +36,7 @@ from app.extensions import db  # type: ignore
 from app.models import Image, Embedding  # type: ignore
 from app.services.clip_runtime import embed_image_path  # type: ignore
 from app.services.embedding_io import to_bytes  # type: ignore
+from app.services.result_reuse import SOURCE_PIPELINE  # type: ignore
 
 
 def l2_normalize(v: List[float]) -> List[float]:
@@ -80,6 +81,7 @@ def main():
             print(f"Removed {deleted} existing embeddings.")
 
         upload_dir = app.config.get("UPLOAD_DIR")
+        dtype = app.config.get("EMBEDDING_STORAGE_DTYPE", "float32")
         ok_count = 0
         fail_count = 0
         for img in images:
@@ -98,8 +100,9 @@ def main():
                 fail_count += 1
                 continue
             norm = l2_normalize(vec)
-            payload = to_bytes(norm)
-            emb = Embedding(image_id=img.id, vec=payload, dim=len(norm), model_version=app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32"))
+            payload = to_bytes(norm, dtype)
+            emb = Embedding(image_id=img.id, vec=payload, dim=len(norm), dtype=dtype, source=SOURCE_PIPELINE,
+                            model_version=app.config.get("CLIP_MODEL_NAME", "clip-ViT-B-32"))
             db.session.add(emb)
             ok_count += 1
             if ok_count % 50 == 0:
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Run the local task queue workers in the foreground (instead of inside a web process).
+
+Set TASK_LOCAL_AUTOSTART=false for the web processes, then run:
+  python scripts/run_task_workers.py
+  python scripts/run_task_workers.py --workers 4
+
+Takes the queue's host lock (only one host per TASK_QUEUE_PATH), keeps TASK_LOCAL_WORKERS worker
+processes alive (re-queueing the jobs of any that die) and prints queue counts periodically.
+When a Celery broker is used instead, start `celery -A app.tasks.celery_worker.celery worker`.
+"""
+from __future__ import annotations
+import os
+import sys
+import argparse
+from time import sleep
+
+# Ensure project root importable when invoked from scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Local task queue worker host")
+    ap.add_argument("--workers", type=int, default=None, help="Worker processes (default TASK_LOCAL_WORKERS)")
+    ap.add_argument("--interval", type=float, default=10.0, help="Seconds between health checks / status lines")
+    return ap.parse_args()
+
+
+def main():
+    args = parse_args()
+    from app import create_app
+    from app.tasks.local_queue import WorkerHost, queue_from_config
+
+    app = create_app()
+    with app.app_context():
+        queue = queue_from_config(app.config)
+        workers = args.workers or app.config.get("TASK_LOCAL_WORKERS", 2)
+        host = WorkerHost(queue, workers, app.config, app.logger)
+        if not host.ensure_workers():
+            print(f"Another process already hosts the workers of {queue.path}")
+            return 1
+        print(f"Hosting {workers} worker(s) for {queue.path}")
+        try:
+            while True:
+                sleep(args.interval)
+                host.ensure_workers()
+                print(f"workers alive={host.alive()} jobs={queue.stats()}", flush=True)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
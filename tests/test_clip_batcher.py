@@ -0,0 +1,31 @@
+"""MicroBatcher: batching of concurrent calls and isolation of failing items."""
+from __future__ import annotations
+
+import pytest
+
+from app.services.clip_batcher import MicroBatcher
+
+
+def _encode(items: list) -> list:
+    if any(item == "bad" for item in items):
+        raise ValueError("cannot decode")
+    return [item.upper() for item in items]
+
+
+def test_bad_item_fails_only_its_own_future():
+    batcher = MicroBatcher(_encode, max_batch_size=8, max_wait_ms=50)
+    futures = batcher.submit_many(["a", "bad", "c"])
+    assert futures[0].result(timeout=5) == "A"
+    assert futures[2].result(timeout=5) == "C"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert batcher.stats()["split_batches"] == 1
+
+
+def test_good_batch_is_encoded_once():
+    calls = []
+    batcher = MicroBatcher(lambda items: calls.append(len(items)) or _encode(items), max_batch_size=8, max_wait_ms=50)
+    futures = batcher.submit_many(["a", "b", "c"])
+    assert [f.result(timeout=5) for f in futures] == ["A", "B", "C"]
+    assert calls == [3]
+    assert batcher.stats()["split_batches"] == 0
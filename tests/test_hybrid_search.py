@@ -0,0 +1,71 @@
+"""Hybrid CLIP + OCR search: fusion order, and one stage answering when the other has nothing."""
+from __future__ import annotations
+
+import pytest
+
+from app import create_app
+from app.services import hybrid_search as hybrid
+from app.services.hybrid_search import hybrid_search, rrf_fuse, weighted_fuse
+
+# CLIP: (image_id, cosine similarity); OCR: search_ocr_text hits
+_CLIP = [(1, 0.31), (2, 0.30), (3, 0.10)]
+_OCR = [
+    {"image_id": 3, "score": 9.0, "snippet": "TAIPEI", "highlights": [[0, 6]]},
+    {"image_id": 4, "score": 2.0, "snippet": "taipei 101", "highlights": [[0, 6]]},
+]
+
+
+@pytest.fixture()
+def app():
+    app = create_app("test")
+    with app.app_context():
+        yield app
+
+
+def _stages(monkeypatch, clip, ocr) -> None:
+    def clip_stage(user_id, query, depth, encode):
+        if clip is None:
+            raise RuntimeError("text embedding unavailable (CLIP model not loaded)")
+        return clip
+
+    monkeypatch.setattr(hybrid, "_clip_stage", clip_stage)
+    monkeypatch.setattr(hybrid, "_ocr_stage", lambda app, user_id, query, depth, mode: (ocr, 0.0))
+
+
+def test_rrf_and_weighted_fusion_order():
+    rrf = rrf_fuse({"clip": [1, 2, 3], "ocr": [3, 4]}, rrf_k=60)
+    # in both lists beats rank 1 of one list; then by rank
+    assert sorted(rrf, key=lambda i: -rrf[i]) == [3, 1, 2, 4]
+    assert rrf[3] == pytest.approx(1 / 63 + 1 / 61)
+
+    scored = {"clip": _CLIP, "ocr": [(h["image_id"], h["score"]) for h in _OCR]}
+    fused = weighted_fuse(scored, {"clip": 0.8, "ocr": 0.2})
+    assert sorted(fused, key=lambda i: -fused[i]) == [1, 2, 3, 4]
+    assert fused[1] == pytest.approx(0.8) and fused[4] == pytest.approx(0.0)
+    fused = weighted_fuse(scored, {"clip": 0.2, "ocr": 0.8})
+    assert sorted(fused, key=lambda i: -fused[i])[:2] == [3, 1]
+
+
+def test_hybrid_search_fuses_both_stages(app, monkeypatch):
+    _stages(monkeypatch, _CLIP, _OCR)
+    results, stages, timings = hybrid_search(1, "taipei", k=3)
+    assert [r["image_id"] for r in results] == [3, 1, 2]
+    assert stages == {"clip": {"count": 3}, "ocr": {"count": 2}}
+    assert (results[0]["clip_rank"], results[0]["ocr_rank"], results[0]["snippet"]) == (3, 1, "TAIPEI")
+    assert "ocr_rank" not in results[1] and {"clip", "ocr", "fusion", "total"} <= set(timings)
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_one_empty_or_failed_stage_leaves_the_other_ranking(app, monkeypatch, fusion):
+    _stages(monkeypatch, None, _OCR)
+    results, stages, _ = hybrid_search(1, "taipei", k=5, fusion=fusion)
+    assert [r["image_id"] for r in results] == [3, 4]
+    assert "error" in stages["clip"] and stages["ocr"] == {"count": 2}
+
+    _stages(monkeypatch, _CLIP, [])
+    results, stages, _ = hybrid_search(1, "taipei", k=5, fusion=fusion)
+    assert [r["image_id"] for r in results] == [1, 2, 3]
+    assert stages["ocr"] == {"count": 0}
+
+    _stages(monkeypatch, [], [])
+    assert hybrid_search(1, "taipei", k=5, fusion=fusion)[0] == []
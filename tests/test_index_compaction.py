@@ -0,0 +1,74 @@
+"""Index compaction driven by the ORM session hooks (uploads turning READY, deletes)."""
+from __future__ import annotations
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User, Image, Embedding  # noqa: E402
+from app.services import index_store  # noqa: E402
+from app.services.embedding_io import to_bytes  # noqa: E402
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "INDEX_DIR": str(tmp_path / "faiss"),
+        "INDEX_TYPE": "auto",
+        "INDEX_DELTA_COMPACT_THRESHOLD": 3,
+        "INDEX_AUTO_HNSW_MIN_SIZE": 22,
+    })
+    index_store._STORE = None
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _add_ready_image(owner_id: int, rng) -> Image:
+    """Upload-like: PENDING row, then embedding + READY in one commit (the status hook pushes it)."""
+    img = Image(owner_id=owner_id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                status="PENDING")
+    db.session.add(img)
+    db.session.commit()
+    vec = rng.standard_normal(16).astype(np.float32)
+    db.session.add(Embedding(image_id=img.id, vec=to_bytes(vec / np.linalg.norm(vec)), dim=16))
+    img.status = "READY"
+    db.session.commit()
+    return img
+
+
+def test_hook_compaction_switches_index_type(app):
+    rng = np.random.default_rng(0)
+    user = User(username="compaction", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    base = [_add_ready_image(user.id, rng) for _ in range(20)]
+    # first search builds a flat index from the DB
+    assert index_store.search_topk(user.id, rng.standard_normal(16), k=5)
+    store = index_store._STORE
+    assert store.ensure_index(user.id).index_type == "flat"
+
+    # crossing INDEX_AUTO_HNSW_MIN_SIZE through the after_commit hook rebuilds as hnsw at compaction
+    images = [_add_ready_image(user.id, rng) for _ in range(4)]
+    idx = store.ensure_index(user.id)
+    assert idx.index_type == "hnsw"
+    assert idx.ntotal == 24
+    assert store.cursors[user.id].records < 3
+
+    # deletes: the compaction that finds the library below the threshold rebuilds it as flat
+    removed = images + base[:1]
+    for img in removed:
+        Embedding.query.filter_by(image_id=img.id).delete()
+        db.session.delete(img)
+        db.session.commit()
+    idx = store.ensure_index(user.id)
+    assert idx.index_type == "flat"
+    assert idx.ntotal == 19
+    assert not set(idx.ids().tolist()) & {img.id for img in removed}
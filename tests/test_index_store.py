@@ -0,0 +1,143 @@
+"""Per-user index store: LRU cache, delta log replay and re-embeds."""
+from __future__ import annotations
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+import app.tasks.jobs as jobs  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User, Image, Embedding  # noqa: E402
+from app.services import index_store  # noqa: E402
+from app.services.embedding_io import to_bytes  # noqa: E402
+
+
+@pytest.fixture()
+def app(tmp_path, request):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "INDEX_DIR": str(tmp_path / "faiss"),
+        "INDEX_TYPE": "flat",
+        "INDEX_MMAP": getattr(request, "param", False),
+        "INDEX_CACHE_MAX_BYTES": 1300,  # two users of 10 x 16-d float32 vectors (640 bytes each)
+    })
+    index_store._STORE = None
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _unit(rng, dim: int = 16) -> np.ndarray:
+    vec = rng.standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _add_ready_image(owner_id: int, vec: np.ndarray) -> Image:
+    img = Image(owner_id=owner_id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                status="READY")
+    db.session.add(img)
+    db.session.flush()
+    db.session.add(Embedding(image_id=img.id, vec=to_bytes(vec), dim=len(vec), source="pipeline"))
+    db.session.commit()
+    return img
+
+
+def _add_user(name: str) -> User:
+    user = User(username=name, password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_lru_stays_under_the_byte_budget_and_reloads_evicted_users(app):
+    rng = np.random.default_rng(0)
+    users = [_add_user(f"lru{i}") for i in range(3)]
+    for user in users:
+        for _ in range(10):
+            _add_ready_image(user.id, _unit(rng))
+    query = _unit(rng)
+    first = index_store.search_topk(users[0].id, query, k=5)
+    cache = index_store._STORE.cache
+    for user in users[1:]:
+        assert index_store.search_topk(user.id, query, k=5)
+        assert cache.total_bytes <= cache.max_bytes
+
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 1280 and stats["evictions"] == 1
+    assert cache.get(users[0].id) is None
+
+    # the evicted user comes back from INDEX_DIR (no DB read), evicting the least recently used
+    db.session.query(Embedding).delete()
+    db.session.commit()
+    assert index_store.search_topk(users[0].id, query, k=5) == first
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.get(users[1].id) is None and cache.get(users[0].id) is not None
+
+
+def test_delta_log_replays_and_drops_a_torn_tail(app):
+    rng = np.random.default_rng(0)
+    user = _add_user("delta")
+    images = [_add_ready_image(user.id, _unit(rng)) for _ in range(5)]
+    assert index_store.search_topk(user.id, _unit(rng), k=1)  # base file with the 5 images
+    store = index_store._STORE
+    added = [100, 101, 102]
+    store.push_vector_id_pairs(user.id, [_unit(rng) for _ in added], added)
+    store.remove_image_ids(user.id, [images[0].id, 101])
+    delta_path = store._delta_path(user.id)
+    complete = os.path.getsize(delta_path)
+    runs, end, count = index_store._delta_read(delta_path, 16, store.ensure_index(user.id).generation, 0)
+    assert [(op, ids) for op, ids, _ in runs] == [
+        (index_store._OP_ADD, added),
+        (index_store._OP_REMOVE, [images[0].id, 101]),
+    ]
+    assert (end, count) == (complete, 5)
+
+    # crash in the middle of an ADD record: its header and part of the vector
+    with open(delta_path, "ab") as f:
+        f.write(index_store._DELTA_RECORD.pack(index_store._OP_ADD, 103) + b"\0" * 10)
+
+    # another process: base file, then the complete records of the log
+    store = index_store._initialze_store()
+    idx = store.ensure_index(user.id)
+    assert set(idx.ids().tolist()) - idx.tombstones == {img.id for img in images[1:]} | {100, 102}
+    assert os.path.getsize(delta_path) == complete
+    assert store.cursors[user.id].records == 5
+
+
+@pytest.mark.parametrize("app", [False, True], ids=["heap", "mmap"], indirect=True)
+def test_reembed_does_not_rewrite_the_base_file(app, monkeypatch):
+    rng = np.random.default_rng(0)
+    user = _add_user("reembed")
+    images = [_add_ready_image(user.id, _unit(rng)) for _ in range(10)]
+    assert index_store.search_topk(user.id, _unit(rng), k=1)  # builds and persists the base file
+    store = index_store._STORE
+    base_path = store._user_index_path(user.id)
+    base_sig = index_store._file_sig(base_path)
+
+    target = images[3]
+    old = store.get_vector(user.id, target.id)
+    monkeypatch.setattr(jobs, "_image_file", lambda img: "unused.jpg")
+    for _ in range(2):  # the second re-embed replaces a vector that already lives in the overlay
+        new = _unit(rng)
+        monkeypatch.setattr(jobs, "embed_image_path", lambda path, vec=new: vec)
+        assert jobs.compute_embedding(target.id)["replaced"] is True
+    assert index_store._file_sig(base_path) == base_sig
+
+    for reload in (False, True):
+        if reload:
+            # another process: base file, then the REMOVE / ADD records replayed in log order
+            index_store._STORE = None
+        hits = index_store.search_topk(user.id, new, k=3)
+        assert hits[0][0] == target.id and hits[0][1] == pytest.approx(1.0, abs=1e-5)
+        assert [iid for iid, _ in index_store.search_topk(user.id, old, k=10)].count(target.id) == 1
+        np.testing.assert_allclose(index_store.get_vector(user.id, target.id), new, atol=1e-6)
+
+    # compaction drops the old copy and keeps the new one
+    compacted = index_store._STORE.ensure_index(user.id).compacted()
+    assert sorted(compacted.ids().tolist()) == sorted(img.id for img in images)
+    np.testing.assert_allclose(compacted.reconstruct(target.id), new, atol=1e-6)
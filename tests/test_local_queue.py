@@ -0,0 +1,68 @@
+"""Local SQLite task queue: retries with backoff, the last attempt, and reclaimed leases."""
+from __future__ import annotations
+
+import pytest
+
+from app.tasks import local_queue
+from app.tasks.local_queue import LocalTaskQueue, parse_concurrency
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(local_queue, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture()
+def queue(tmp_path, clock):
+    return LocalTaskQueue(str(tmp_path / "tasks.sqlite"), max_attempts=2, retry_backoff=10.0, lease_timeout=60.0)
+
+
+def test_failed_attempt_is_retried_after_backoff_then_fails(queue, clock):
+    job_id = queue.enqueue("run_ocr", [7])
+    assert queue.claim("w1") == (job_id, "run_ocr", [7], 1, 2)
+    assert queue.fail(job_id, 1, 2, "RuntimeError: model crashed") is True
+    assert queue.get(job_id)["status"] == "queued"
+
+    assert queue.claim("w1") is None  # backoff: retry_backoff * 2^0
+    clock[0] += 10.0
+    assert queue.claim("w2") == (job_id, "run_ocr", [7], 2, 2)
+    assert queue.fail(job_id, 2, 2, "RuntimeError: model crashed again") is False
+    job = queue.get(job_id)
+    assert (job["status"], job["attempts"], job["last_error"]) == ("failed", 2, "RuntimeError: model crashed again")
+    clock[0] += 1000.0
+    assert queue.claim("w1") is None
+    assert queue.stats() == {"queued": 0, "running": 0, "done": 0, "failed": 1}
+
+
+def test_expired_and_dead_worker_leases_are_reclaimed(queue, clock):
+    hung = queue.enqueue("compute_embedding", [1])
+    dead = queue.enqueue("compute_embedding", [2])
+    assert queue.claim("hung-worker")[0] == hung
+    assert queue.claim("dead-worker")[0] == dead
+
+    # the host respawns a dead worker: its job goes back to the queue at once
+    assert queue.requeue_worker("dead-worker") == 1
+    assert queue.claim("w1")[0] == dead
+    assert queue.claim("w1") is None  # the hung lease is still valid
+    clock[0] += 61.0
+    assert queue.claim("w2")[:4] == (hung, "compute_embedding", [1], 2)
+    queue.complete(hung)
+
+    # a job whose worker keeps dying runs out of attempts instead of looping
+    clock[0] += 61.0
+    assert queue.claim("w3") is None
+    assert queue.get(dead)["status"] == "failed"
+    assert queue.stats() == {"queued": 0, "running": 0, "done": 1, "failed": 1}
+
+
+def test_concurrency_limit_holds_back_a_task(tmp_path, clock):
+    queue = LocalTaskQueue(str(tmp_path / "tasks.sqlite"), concurrency=parse_concurrency("run_ocr=1"))
+    first, second = queue.enqueue("run_ocr", [1]), queue.enqueue("run_ocr", [2])
+    other = queue.enqueue("generate_thumbs", [1])
+    assert queue.claim("w1")[0] == first
+    assert queue.claim("w2")[0] == other
+    assert queue.claim("w3") is None
+    queue.complete(first)
+    assert queue.claim("w3")[0] == second
@@ -0,0 +1,111 @@
+"""scripts/migrate_schema.py on a database created before the model changes."""
+from __future__ import annotations
+import os
+
+import pytest
+from sqlalchemy import inspect, text as sql_text
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from app.extensions import db
+from app.models import Image, Embedding, OCRText, ImageTag
+from app.services import index_store
+from app.services.storage import cas_uri, ensure_blob, local_path
+from scripts.migrate_schema import migrate
+
+# tables as the baseline models created them
+_OLD_TABLES = [
+    "CREATE TABLE images (id INTEGER PRIMARY KEY, owner_id INTEGER NOT NULL REFERENCES users(id), "
+    "original_filename VARCHAR(255) NOT NULL, storage_uri VARCHAR(512) NOT NULL UNIQUE, mime_type VARCHAR(64), "
+    "width INTEGER, height INTEGER, checksum VARCHAR(64), status VARCHAR(32) NOT NULL, "
+    "visibility VARCHAR(32) NOT NULL, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)",
+    "CREATE INDEX ix_images_owner_id ON images (owner_id)",
+    "CREATE INDEX ix_images_checksum ON images (checksum)",
+    "CREATE TABLE embeddings (id INTEGER PRIMARY KEY, image_id INTEGER NOT NULL UNIQUE REFERENCES images(id), "
+    "vec BLOB NOT NULL, dim INTEGER NOT NULL, model_version VARCHAR(64) NOT NULL, created_at DATETIME NOT NULL)",
+    "CREATE TABLE ocr_texts (id INTEGER PRIMARY KEY, image_id INTEGER NOT NULL UNIQUE REFERENCES images(id), "
+    "text TEXT, avg_confidence FLOAT, created_at DATETIME NOT NULL)",
+]
+_STEPS = ["embeddings.dtype", "ocr_texts.model_version", "embeddings.source", "ocr_texts.source",
+          "images.uq_owner_checksum"]
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'old.db'}",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "INDEX_DIR": str(tmp_path / "faiss"),
+    })
+    index_store._STORE = None
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for ddl in _OLD_TABLES:
+                conn.execute(sql_text(ddl))
+        db.create_all()  # the tables that did not change
+        yield app
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _sql(statement: str) -> None:
+    with db.engine.begin() as conn:
+        conn.execute(sql_text(statement))
+
+
+def _add_user(user_id: int) -> None:
+    _sql("INSERT INTO users (id, username, password_hash, is_active, created_at, updated_at) "
+         f"VALUES ({user_id}, 'old{user_id}', 'x', 1, '2025-01-01', '2025-01-01')")
+
+
+def _add_image(image_id: int, owner_id: int, uri: str, checksum: str | None, status: str = "READY") -> None:
+    checksum = f"'{checksum}'" if checksum else "NULL"
+    _sql("INSERT INTO images (id, owner_id, original_filename, storage_uri, checksum, status, visibility, "
+         f"created_at, updated_at) VALUES ({image_id}, {owner_id}, 'a.jpg', '{uri}', {checksum}, '{status}', "
+         "'private', '2025-01-01', '2025-01-01')")
+
+
+def test_adds_missing_columns_once(app):
+    _add_user(1)
+    _add_image(1, 1, "local://a.jpg", None)
+    _sql("INSERT INTO embeddings (image_id, vec, dim, model_version, created_at) "
+         "VALUES (1, x'0000803f', 1, 'clip-ViT-B-32', '2025-01-01')")
+    _sql("INSERT INTO ocr_texts (image_id, text, created_at) VALUES (1, 'HELLO', '2025-01-01')")
+
+    assert migrate(dry_run=True) == _STEPS
+    assert migrate() == _STEPS
+    assert migrate() == []
+    assert Embedding.query.one().dtype == "float32"
+    assert OCRText.query.one().model_version is None
+
+
+def test_merges_duplicate_uploads_before_adding_the_constraint(app):
+    _add_user(1)
+    _add_user(2)
+    checksum = "c" * 64
+    # legacy per-upload files of the same bytes: the owner's FAILED + READY copies, and another owner's
+    legacy = ["local://one.jpg", "local://two.jpg", "local://three.jpg"]
+    for uri in legacy:
+        ensure_blob(uri, b"same bytes")
+    _add_image(1, 1, legacy[0], checksum, status="FAILED")
+    _add_image(2, 1, legacy[1], checksum)
+    _add_image(3, 2, legacy[2], checksum)
+    _sql("INSERT INTO tags (id, name, created_at) VALUES (1, 'cat', '2025-01-01')")
+    _sql("INSERT INTO image_tags (image_id, tag_id, created_at) VALUES (1, 1, '2025-01-01')")
+
+    assert migrate() == _STEPS
+    assert sorted(i.id for i in Image.query.all()) == [2, 3]
+    assert [t.image_id for t in ImageTag.query.all()] == [2]
+    assert not os.path.exists(local_path(legacy[0]))
+    assert os.path.exists(local_path(legacy[1]))
+
+    sets = {tuple(sorted(u["column_names"])) for u in inspect(db.engine).get_unique_constraints("images")}
+    assert ("checksum", "owner_id") in sets and ("storage_uri",) not in sets
+    indexes = {i["name"] for i in inspect(db.engine).get_indexes("images")}
+    assert {"ix_images_storage_uri", "ix_images_owner_id"} <= indexes
+    # two rows may now share a content-addressed blob, but an owner cannot upload the file twice
+    uri = cas_uri("d" * 64, ".jpg")
+    _add_image(4, 1, uri, "d" * 64)
+    _add_image(5, 2, uri, "d" * 64)
+    with pytest.raises(IntegrityError):
+        _add_image(6, 1, uri, "d" * 64)
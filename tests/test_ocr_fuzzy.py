@@ -0,0 +1,73 @@
+"""Fuzzy OCR index: postings-sized memory and rows written by other processes."""
+from __future__ import annotations
+import os
+
+import pytest
+
+pytest.importorskip("rapidfuzz")
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User, Image, OCRText  # noqa: E402
+from app.services import ocr_fuzzy  # noqa: E402
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}"})
+    ocr_fuzzy._CACHE = None
+    ocr_fuzzy._BUILD_LOCKS.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    ocr_fuzzy._CACHE = None
+
+
+def _add_image(owner_id: int, text: str | None) -> Image:
+    img = Image(owner_id=owner_id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                status="READY")
+    db.session.add(img)
+    db.session.flush()
+    db.session.add(OCRText(image_id=img.id, text=text))
+    db.session.commit()
+    return img
+
+
+def test_small_index_is_sized_by_postings():
+    idx = ocr_fuzzy.TrigramIndex.build([(1, "GREAT WALL OF CHINA"), (2, "receipt total 42.00"), (3, None)])
+    assert idx.nbytes < 4096
+    query = ocr_fuzzy.trigram_buckets(ocr_fuzzy.normalize("great wall"))
+    assert idx.candidates(query, 0.3, 10) == [1]
+
+
+def test_rows_inserted_by_another_process_are_searchable(app):
+    user = User(username="fuzzy", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    _add_image(user.id, "GRTWALLOF CHINA")
+    assert [r["image_id"] for r in ocr_fuzzy.fuzzy_search_ocr_text(user.id, "receipt total")] == []
+
+    # a task worker: its own connection, none of this process's session hooks
+    with db.engine.begin() as conn:
+        image_id = conn.execute(
+            Image.__table__.insert().values(owner_id=user.id, original_filename="y.jpg", storage_uri="local://y.jpg",
+                                            status="READY", visibility="private")
+        ).inserted_primary_key[0]
+        conn.execute(OCRText.__table__.insert().values(image_id=image_id, text="RECEIPT TOTAL 42.00"))
+
+    hits = ocr_fuzzy.fuzzy_search_ocr_text(user.id, "receipt total")
+    assert [r["image_id"] for r in hits] == [image_id]
+
+
+def test_build_locks_leave_with_evicted_users(app):
+    app.config["OCR_FUZZY_CACHE_MAX_BYTES"] = 1  # keeps only the newest entry
+    users = [User(username=f"fuzzy{i}", password_hash="x") for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    for user in users:
+        _add_image(user.id, "GREAT WALL OF CHINA")
+        assert ocr_fuzzy.fuzzy_search_ocr_text(user.id, "great wall")
+
+    assert ocr_fuzzy._CACHE.users() == [users[-1].id]
+    assert set(ocr_fuzzy._BUILD_LOCKS) == {users[-1].id}
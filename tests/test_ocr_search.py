@@ -0,0 +1,51 @@
+"""Exact OCR search: full-text index hits, filled up with substring (ILIKE) matches."""
+from __future__ import annotations
+import os
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Image, OCRText
+from app.services import ocr_search
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}"})
+    with app.app_context():
+        db.create_all()
+        if ocr_search.ensure_ocr_search_index() != "sqlite":
+            pytest.skip("SQLite without FTS5")
+        yield app
+        db.session.remove()
+
+
+def _add_image(owner_id: int, text: str) -> int:
+    img = Image(owner_id=owner_id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                status="READY")
+    db.session.add(img)
+    db.session.flush()
+    db.session.add(OCRText(image_id=img.id, text=text))
+    db.session.commit()
+    return img.id
+
+
+def test_substring_inside_word_fills_up_results(app):
+    user = User(username="ocr", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    word = _add_image(user.id, "THE GREAT WALL OF CHINA")
+    inside = _add_image(user.id, "GRTWALLOF CHINA")
+    _add_image(user.id, "receipt total 42.00")
+
+    hits = ocr_search.search_ocr_text(user.id, "wall", top_k=5)
+    assert [h["image_id"] for h in hits] == [word, inside]
+    assert hits[0]["score"] > 0 and hits[1]["score"] == 0
+    assert hits[1]["snippet"][slice(*hits[1]["highlights"][0])] == "WALL"
+
+    # top_k reached by index hits: no scan
+    assert [h["image_id"] for h in ocr_search.search_ocr_text(user.id, "wall", top_k=1)] == [word]
+
+    app.config["OCR_SEARCH_SUBSTRING_FALLBACK"] = False
+    assert [h["image_id"] for h in ocr_search.search_ocr_text(user.id, "wall", top_k=5)] == [word]
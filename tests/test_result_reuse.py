@@ -0,0 +1,87 @@
+"""Result reuse across images with the same bytes: keyed on the model setup, pipeline rows only."""
+from __future__ import annotations
+import io
+import os
+
+import numpy as np
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Image, Embedding, OCRText
+from app.services import index_store, ocr_pipeline
+from app.services.embedding_io import to_bytes
+from app.services.result_reuse import SOURCE_PIPELINE, find_ocr_texts
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "INDEX_DIR": str(tmp_path / "faiss"),
+    })
+    monkeypatch.setattr(ocr_pipeline, "_PIPELINE", None)
+    monkeypatch.setattr(index_store, "_STORE", None)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def test_prefiltered_empty_text_is_not_reused_with_another_prefilter(app):
+    user = User(username="reuse", password_hash="x")
+    db.session.add(user)
+    db.session.commit()
+    app.config["OCR_PREFILTER"] = "heuristic"
+    img = Image(owner_id=user.id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                checksum="c" * 64, status="READY")
+    db.session.add(img)
+    db.session.flush()
+    # the prefilter skipped it: no text
+    db.session.add(OCRText(image_id=img.id, text=None, model_version=ocr_pipeline.get_model_version(),
+                           source=SOURCE_PIPELINE))
+    db.session.commit()
+
+    assert find_ocr_texts(["c" * 64], ocr_pipeline.get_model_version()) == {"c" * 64: None}
+    app.config["OCR_PREFILTER"] = "off"
+    assert find_ocr_texts(["c" * 64], ocr_pipeline.get_model_version()) == {}
+
+
+def _login(client, name: str) -> dict:
+    client.post("/api/v1/auth/register", json={"username": name, "password": "reuse-pass"})
+    token = client.post("/api/v1/auth/login", json={"username": name, "password": "reuse-pass"}).get_json()
+    return {"Authorization": f"Bearer {token['data']['access_token']}"}
+
+
+def _upload(client, headers: dict, data: bytes) -> dict:
+    resp = client.post("/api/v1/files/upload", data={"file": (io.BytesIO(data), "meme.png", "image/png")},
+                       headers=headers, content_type="multipart/form-data")
+    return resp.get_json()["data"]
+
+
+def test_ingested_vector_is_never_reused_for_another_user(app):
+    from PIL import Image as PILImage
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (32, 32), (10, 200, 30)).save(buf, "PNG")
+    meme = buf.getvalue()
+    client = app.test_client()
+    attacker, victim, other = _login(client, "attacker"), _login(client, "victim"), _login(client, "other")
+
+    planted = _upload(client, attacker, meme)["image_id"]
+    resp = client.post("/api/v1/ingest/embedding", headers=attacker, json={
+        "image_id": planted, "vector": [1.0] + [0.0] * 511, "model_version": app.config["CLIP_MODEL_NAME"],
+    })
+    assert resp.get_json()["data"]["created"]
+    victim_image = _upload(client, victim, meme)["image_id"]
+    assert Embedding.query.filter_by(image_id=victim_image).first() is None
+
+    # a vector the pipeline produced for the same bytes is reused
+    vec = np.random.default_rng(0).standard_normal(512).astype(np.float32)
+    emb = Embedding.query.filter_by(image_id=planted).one()
+    emb.vec, emb.source = to_bytes(vec / np.linalg.norm(vec)), SOURCE_PIPELINE
+    db.session.commit()
+    reused = _upload(client, other, meme)
+    assert reused["has_embedding"]
@@ -0,0 +1,82 @@
+"""POST /api/v1/search/batch: one FAISS search per dimension, errors reported per query."""
+from __future__ import annotations
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+import app.blueprints.search as search_module  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import User, Image, Embedding  # noqa: E402
+from app.services import index_store  # noqa: E402
+from app.services.embedding_io import to_bytes  # noqa: E402
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "INDEX_DIR": str(tmp_path / "faiss"),
+    })
+    index_store._STORE = None
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _headers(client) -> dict:
+    client.post("/api/v1/auth/register", json={"username": "batch", "password": "batch-pass"})
+    token = client.post("/api/v1/auth/login", json={"username": "batch", "password": "batch-pass"}).get_json()
+    return {"Authorization": f"Bearer {token['data']['access_token']}"}
+
+
+def _add_ready_image(owner_id: int, vec: np.ndarray) -> int:
+    img = Image(owner_id=owner_id, original_filename="x.jpg", storage_uri=f"local://{os.urandom(8).hex()}.jpg",
+                status="READY")
+    db.session.add(img)
+    db.session.flush()
+    db.session.add(Embedding(image_id=img.id, vec=to_bytes(vec), dim=len(vec)))
+    db.session.commit()
+    return img.id
+
+
+def test_mixed_dimensions_and_per_query_errors(app, monkeypatch):
+    client = app.test_client()
+    headers = _headers(client)
+    user_id = User.query.filter_by(username="batch").one().id
+    vecs = np.eye(16, dtype=np.float32)[:6]
+    ids = [_add_ready_image(user_id, v) for v in vecs]
+    encoded = []
+
+    def embed_texts(texts):
+        encoded.append(list(texts))
+        return [vecs[4] for _ in texts]
+
+    monkeypatch.setattr(search_module, "embed_texts", embed_texts)
+    resp = client.post("/api/v1/search/batch", headers=headers, json={"k": 2, "queries": [
+        {"vector": vecs[1].tolist()},
+        {"vector": [1.0] * 8},  # another dimension than the index
+        {"image_id": ids[2], "k": 1},
+        {"text": "four"},
+        {"text": "four"},
+        {"image_id": 999_999},
+        {"vector": "oops"},
+        {"nothing": True},
+    ]})
+    assert resp.status_code == 200
+    results = resp.get_json()["data"]["results"]
+    assert [r["index"] for r in results] == list(range(8))
+
+    assert [h["image_id"] for h in results[0]["results"]][0] == ids[1] and results[0]["count"] == 2
+    assert results[1]["error"]["code"] == "VECTOR_DIM_MISMATCH"
+    assert results[2]["count"] == 1 and results[2]["results"][0]["image_id"] != ids[2]
+    assert results[3]["results"][0]["image_id"] == ids[4] and results[4]["results"] == results[3]["results"]
+    assert encoded == [["four"]]  # repeated texts are encoded once
+    assert results[5]["error"]["code"] == "TARGET_NO_EMBED"
+    assert results[6]["error"]["code"] == "INVALID_VECTOR"
+    assert results[7]["error"]["code"] == "INVALID_QUERY"
@@ -0,0 +1,63 @@
+"""Content-addressed blobs: one file per distinct upload, removed with the last image using it."""
+from __future__ import annotations
+import io
+import os
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models import Image
+from app.services import index_store
+from app.services.storage import blob_refcount, local_path
+
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "INDEX_DIR": str(tmp_path / "faiss"),
+    })
+    index_store._STORE = None
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _login(client, name: str) -> dict:
+    client.post("/api/v1/auth/register", json={"username": name, "password": "blob-pass"})
+    token = client.post("/api/v1/auth/login", json={"username": name, "password": "blob-pass"}).get_json()
+    return {"Authorization": f"Bearer {token['data']['access_token']}"}
+
+
+def _upload(client, headers: dict, data: bytes) -> int:
+    resp = client.post("/api/v1/files/upload", data={"file": (io.BytesIO(data), "same.png", "image/png")},
+                       headers=headers, content_type="multipart/form-data")
+    return resp.get_json()["data"]["image_id"]
+
+
+def test_owners_share_one_blob_until_the_last_image_is_deleted(app):
+    from PIL import Image as PILImage
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (32, 32), (30, 30, 200)).save(buf, "PNG")
+    client = app.test_client()
+    alice, bob = _login(client, "alice"), _login(client, "bob")
+    first, second = _upload(client, alice, buf.getvalue()), _upload(client, bob, buf.getvalue())
+
+    uri = db.session.get(Image, first).storage_uri
+    assert db.session.get(Image, second).storage_uri == uri
+    path = local_path(uri)
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+    assert blob_refcount(uri) == 2
+
+    resp = client.delete(f"/api/v1/files/{first}", headers=alice).get_json()["data"]
+    assert resp["deleted"] is True and resp["file_removed"] is False
+    assert os.path.exists(path) and blob_refcount(uri) == 1
+
+    resp = client.delete(f"/api/v1/files/{second}", headers=bob).get_json()["data"]
+    assert resp["file_removed"] is True
+    assert not os.path.exists(path)
@@ -0,0 +1,51 @@
+"""Text-query embedding cache: memory LRU, SQLite store shared across processes, model switches."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app import create_app
+from app.services.text_cache import TextEmbeddingCache, normalize_query
+
+
+@pytest.fixture()
+def app():
+    app = create_app("test")
+    with app.app_context():
+        yield app
+
+
+def test_lru_hits_misses_and_evictions(app):
+    cache = TextEmbeddingCache(max_entries=2)
+    assert cache.get("clip", "cat") is None
+    cat = cache.put("clip", "cat", [1.0, 0.0])
+    cache.put("clip", "dog", [0.0, 1.0])
+    assert cache.get("clip", "cat") is cat  # now the most recently used
+    cache.put("clip", "beach", [1.0, 1.0])
+
+    assert cache.get("clip", "dog") is None
+    assert cache.get("clip", "cat") is cat and not cat.flags.writeable
+    assert cache.get("other-model", "cat") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (2, 3, 1, 2)
+    assert normalize_query("  Ｃat\t PHOTO ") == "cat photo"
+
+
+def test_disk_store_survives_a_restart_and_drops_other_models(app, tmp_path):
+    path = str(tmp_path / "text_cache.sqlite")
+    first = TextEmbeddingCache(max_entries=8, store_path=path)
+    first.put("clip-a", "cat", [1.0, 2.0])
+    first.put("clip-a", "dog", [3.0, 4.0])
+
+    # a new process: empty memory, rows read from SQLite
+    restarted = TextEmbeddingCache(max_entries=8, store_path=path)
+    np.testing.assert_array_equal(restarted.get("clip-a", "cat"), [1.0, 2.0])
+    assert restarted.get("clip-a", "cat") is not None
+    assert (restarted.stats()["disk_hits"], restarted.stats()["hits"]) == (1, 1)
+
+    # switching the model purges the vectors of the previous one from the store
+    switched = TextEmbeddingCache(max_entries=8, store_path=path)
+    assert switched.get("clip-b", "cat") is None
+    switched.put("clip-b", "cat", [5.0, 6.0])
+    rows = switched._conn().execute("SELECT model, query FROM text_embeddings").fetchall()
+    assert rows == [("clip-b", "cat")]
@@ -0,0 +1,66 @@
+"""POST /api/v1/files/upload processed inline (task layer unavailable)."""
+from __future__ import annotations
+import io
+
+import pytest
+
+import app.blueprints.files as files_module
+from app import create_app
+from app.extensions import db
+from app.models import Image
+from app.services import index_store
+
+
+@pytest.fixture()
+def client(tmp_path):
+    app = create_app("test", overrides={
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "INDEX_DIR": str(tmp_path / "faiss"),
+    })
+    index_store._STORE = None
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post("/api/v1/auth/register", json={"username": "uploader", "password": "upload-pass"})
+    resp = client.post("/api/v1/auth/login", json={"username": "uploader", "password": "upload-pass"})
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {resp.get_json()['data']['access_token']}"
+    yield client
+    with app.app_context():
+        db.session.remove()
+    index_store._STORE = None
+
+
+def _upload(client, data: bytes):
+    return client.post(
+        "/api/v1/files/upload",
+        data={"file": (io.BytesIO(data), "x.png", "image/png")},
+        content_type="multipart/form-data",
+    )
+
+
+def _png() -> bytes:
+    from PIL import Image as PILImage
+
+    buf = io.BytesIO()
+    PILImage.new("RGB", (32, 32), (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_inline_failure_marks_failed_and_reupload_retries(client, monkeypatch):
+    def broken(image_id, image=None):
+        db.session.get(Image, image_id).status = "PROCESSING"
+        db.session.commit()
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(files_module, "process_image", broken)
+    resp = _upload(client, _png())
+    assert resp.status_code == 200
+    payload = resp.get_json()["data"]
+    assert payload["status"] == "FAILED"
+    assert payload["has_embedding"] is False
+
+    monkeypatch.undo()
+    payload = _upload(client, _png()).get_json()["data"]
+    assert payload["image_id"] == resp.get_json()["data"]["image_id"]
+    assert payload["status"] == "READY"
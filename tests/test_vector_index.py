@@ -0,0 +1,41 @@
+"""FaissVectorIndex: a memory-mapped base with an in-heap overlay answers like an in-heap index."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.services.vector_index import FaissVectorIndex  # noqa: E402
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_mmap_overlay_and_tombstones_match_the_heap_index(tmp_path, index_type):
+    rng = np.random.default_rng(0)
+    base = rng.standard_normal((400, 16)).astype(np.float32)
+    built = FaissVectorIndex(index_type=index_type, nlist=8)
+    built.build(base, ids=np.arange(400) + 1)
+    path = str(tmp_path / "index.faiss")
+    built.save(path)
+
+    heap = FaissVectorIndex.load_from_file(path, nprobe=8)
+    mapped = FaissVectorIndex.load_from_file(path, nprobe=8, mmap=True)
+    assert mapped.mapped and not heap.mapped
+    added = rng.standard_normal((20, 16)).astype(np.float32)
+    replacement = rng.standard_normal((1, 16)).astype(np.float32)
+    for idx in (heap, mapped):
+        idx.push(added, ids=np.arange(20) + 1000)
+        idx.remove([3, 50, 1005])  # base and overlay ids
+        idx.push(replacement, ids=[50])  # a removed base id comes back with a new vector
+    assert mapped.overlay is not None and mapped.overlay.ntotal == 21
+    assert heap.ntotal == mapped.ntotal
+
+    queries = np.vstack([base[[3, 7, 120]], added[[5, 9]], replacement])
+    labels, sims = heap.search_topk_scores(queries, k=10)
+    mapped_labels, mapped_sims = mapped.search_topk_scores(queries, k=10)
+    np.testing.assert_array_equal(mapped_labels, labels)
+    np.testing.assert_allclose(mapped_sims, sims, atol=1e-5)
+    assert not {3, 1005} & set(labels.ravel().tolist())
+    assert labels[-1][0] == 50 and labels.ravel().tolist().count(50) == 1
+    for iid in (7, 1009, 50):
+        np.testing.assert_allclose(mapped.reconstruct(iid), heap.reconstruct(iid), atol=1e-6)